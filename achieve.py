@@ -0,0 +1,77 @@
+"""
+成就引擎
+
+- 成就定义只在内容包里（content/achievements.yaml）：计数器 + 阈值 + 奖励；这里不再有第二份
+- 计数器在 COUNTERS 里登记一次：名称 → 从用户记录读出当前值的函数；加一种新成就（连续签到、累计玻璃珠……）
+  只需登记计数器、在内容包里写定义，不用改指令
+- 引擎按计数器把成就分组，每组按阈值升序排好，另存该组全部成就的位集：
+  - check(rec, changed) 只看 changed 里的计数器；该组已全部达成（位集全在）时连计数器都不读
+  - 组内按阈值从低往高看，遇到第一个没达到的就停
+- 谁改了计数器谁告诉引擎：彩蛋计数（NOTIFIED）由发放彩蛋处直接传给 check；其余（好感、玻璃珠等）
+  由 main.user_locked 在指令前后各读一次（polled），变了的交给引擎。没有成就依赖的计数器不读；
+  被动掉落不经过 user_locked，发放彩蛋处把彩蛋奖励改到的 favor / marbles 一并传给 check
+- 内容包热重载后 get_engine() 发现包变了就重建（位号不变，用户记录照常可用）
+"""
+from typing import Callable, Iterable
+
+from .catalog import Achievement, AchievementPack
+from .records import ACH_IDS, UserRecord
+
+COUNTERS: dict[str, Callable[[UserRecord], int]] = {
+    "collected": lambda rec: rec.collected.bit_count(),  # 已收集彩蛋数
+    "special": lambda rec: rec.special.bit_count(),      # 已收集特别彩蛋数
+    "favor": lambda rec: rec.favor,                      # 当前好感度
+    "marbles": lambda rec: rec.marbles,                  # 当前玻璃珠
+    "streak": lambda rec: rec.sign_streak,               # 截至最近一次签到的连续天数
+}  # 名称须与 catalog.ACHIEVEMENT_COUNTERS 一致（内容包按那份校验）
+NOTIFIED = frozenset({"collected", "special"})  # 只在发放彩蛋时变化，由发放处直接通知
+
+
+class AchievementEngine:
+    def __init__(self, pack: AchievementPack):
+        self.pack = pack
+        ladders: dict[str, list[tuple[int, int, Achievement]]] = {}
+        for a in pack.items:
+            ladders.setdefault(a.counter, []).append((a.threshold, ACH_IDS.bit(a.key), a))
+        # 计数器 → [(阈值, 位, 成就)]（阈值升序）；计数器 → 该组全部成就的位集
+        self.ladders = {name: sorted(items, key=lambda t: t[0]) for name, items in ladders.items()}
+        self.masks = {name: sum(bit for _, bit, _ in items) for name, items in self.ladders.items()}
+        # 有成就依赖、又不由彩蛋发放处通知的计数器：user_locked 只在指令前后读这些
+        self.polled = tuple(name for name in COUNTERS if name in self.ladders and name not in NOTIFIED)
+
+    def read(self, rec: UserRecord) -> tuple[int, ...]:
+        """polled 各计数器的当前值"""
+        return tuple(COUNTERS[name](rec) for name in self.polled)
+
+    def changed(self, before: tuple[int, ...], after: tuple[int, ...]) -> list[str]:
+        return [name for name, b, a in zip(self.polled, before, after) if a != b]
+
+    def check(self, rec: UserRecord, changed: Iterable[str]) -> list[Achievement]:
+        """把 changed 这些计数器新达到的成就记进 rec.achievements，返回新达成的（发奖励由调用方做）"""
+        unlocked = []
+        for name in changed:
+            ladder = self.ladders.get(name)
+            if ladder is None or not self.masks[name] & ~rec.achievements:
+                continue
+            value = COUNTERS[name](rec)
+            for threshold, bit, a in ladder:
+                if threshold > value:
+                    break
+                if not rec.achievements & bit:
+                    rec.achievements |= bit
+                    unlocked.append(a)
+        return unlocked
+
+    def progress(self, rec: UserRecord, a: Achievement) -> tuple[int, int]:
+        """(当前值, 阈值)，查看成就时展示进度"""
+        return min(COUNTERS[a.counter](rec), a.threshold), a.threshold
+
+
+_engine: AchievementEngine | None = None
+
+
+def get_engine(pack: AchievementPack) -> AchievementEngine:
+    global _engine
+    if _engine is None or _engine.pack is not pack:
+        _engine = AchievementEngine(pack)
+    return _engine
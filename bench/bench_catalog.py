@@ -0,0 +1,107 @@
+"""
+内容目录微基准：对比“每次调用重建内容表”（旧写法）与“查缓存的内容包 + 只渲染选中模板”的单次分配量与耗时。
+
+用法（在插件目录下）：python bench/bench_catalog.py
+"""
+import random
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import load_plugin  # noqa: E402
+
+load_plugin()
+catalog = sys.modules["xiaosui_plugin.catalog"]
+
+
+# ---- 旧写法：每次调用都重新构建整张表（与改造前 main.py 内联写法等价）----
+def old_sign_in(name: str, rank: int) -> str:
+    pool = {
+        period: [t.source.format(rank=rank, name=name) for t in templates]
+        for period, templates in catalog.greetings().sign_in.items()
+    }
+    return random.choice(pool["morning"])
+
+
+def old_divination() -> str:
+    cards = {
+        c.name: {
+            o: {"core": f.core, "type": f.rating, "keywords": list(f.keywords), "interp": f.interp}
+            for o, f in (("upright", c.upright), ("reversed", c.reversed))
+        }
+        for c in catalog.tarot().cards
+    }
+    rating_word = dict(catalog.tarot().rating_word)
+    marble_range = dict(catalog.tarot().marble_range)
+    m = cards[random.choice(list(cards.keys()))]["upright"]
+    return f"{m['core']}{rating_word[m['type']]}{marble_range[m['type']]}"
+
+
+def old_feed() -> str:
+    pool = []
+    pool += [(f.text, f.special) for f in catalog.feed().foods]
+    return random.choice(pool)[0]
+
+
+def old_egg_pools() -> str:
+    pools = [
+        [(e.id, e.title, e.body, e.favor, e.marbles) for e in tier]
+        for tier in (catalog.eggs().normal, catalog.eggs().rare, catalog.eggs().ultra, catalog.eggs().special)
+    ]
+    return random.choice(pools[0])[0]
+
+
+# ---- 新写法：只查表，只渲染被选中的模板 ----
+def new_sign_in(name: str, rank: int) -> str:
+    return random.choice(catalog.greetings().sign_in["morning"]).render(rank=rank, name=name)
+
+
+def new_divination() -> str:
+    deck = catalog.tarot()
+    m = random.choice(deck.cards).upright
+    return f"{m.core}{deck.rating_word[m.rating]}{deck.marble_range[m.rating]}"
+
+
+def new_feed() -> str:
+    return random.choice(catalog.feed().foods).text
+
+
+def new_egg_pools() -> str:
+    return random.choice(catalog.eggs().normal).id
+
+
+CASES = (
+    ("签到问候", lambda: old_sign_in("小明", 7), lambda: new_sign_in("小明", 7)),
+    ("占卜", old_divination, new_divination),
+    ("投喂", old_feed, new_feed),
+    ("彩蛋池", old_egg_pools, new_egg_pools),
+)
+
+
+def peak_alloc(fn, rounds: int = 200) -> float:
+    """单次调用的平均峰值分配（字节）"""
+    total = 0
+    for _ in range(rounds):
+        tracemalloc.start()
+        fn()
+        total += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return total / rounds
+
+
+def main() -> None:
+    errors = catalog.PACKS.validate_all()  # 预先加载，避免首次解析计入结果
+    if errors:
+        raise SystemExit("\n".join(errors))
+    print(f"{'场景':<8}{'旧分配(B)':>12}{'新分配(B)':>12}{'旧耗时(µs)':>14}{'新耗时(µs)':>14}")
+    for name, old, new in CASES:
+        n = 2000
+        t_old = timeit.timeit(old, number=n) / n * 1e6
+        t_new = timeit.timeit(new, number=n) / n * 1e6
+        print(f"{name:<8}{peak_alloc(old):>12.0f}{peak_alloc(new):>12.0f}{t_old:>14.2f}{t_new:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+彩蛋掉落微基准：旧写法（每次 set(collected) + 列表过滤 + 回落重扫）vs 位集 + 别名表引擎
+
+用法（在插件目录下）：python bench/bench_drops.py
+"""
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_astrbot import load_plugin  # noqa: E402
+
+load_plugin()
+from xiaosui_plugin import catalog, drops  # noqa: E402
+
+PACK = catalog.eggs()
+ENGINE = drops.get_engine(PACK)
+
+
+def old_roll(collected: list[str], special_collected: list[str], is_interaction: bool):
+    owned = set(collected)
+    owned_special = set(special_collected)
+    if random.random() < 0.10:
+        avail = [e for e in PACK.special if e.id not in owned_special]
+        if avail:
+            return random.choice(avail)
+    if random.random() >= (0.20 if is_interaction else 0.05):
+        return None
+    mythic = PACK.by_id.get(catalog.MYTHIC_EGG_ID)
+    if mythic.id not in owned and random.random() < 0.005:
+        return mythic
+    roll = random.random()
+    pool = PACK.normal if roll < 0.82 else (PACK.rare if roll < 0.99 else PACK.ultra)
+    avail = [e for e in pool if e.id not in owned]
+    if not avail:
+        for p in (PACK.normal, PACK.rare, PACK.ultra):
+            avail = [e for e in p if e.id not in owned]
+            if avail:
+                break
+    return random.choice(avail) if avail else None
+
+
+def main() -> None:
+    print(f"{'已收集':>6}{'旧写法(µs)':>14}{'位集引擎(µs)':>16}")
+    ids = [e.id for e in ENGINE.eggs]
+    for k in (0, 10, 25, 40, 49):
+        collected = ids[:k]
+        specials = [i for i in collected if i.startswith("s-")]
+        mask = ENGINE.mask_of(collected)  # 插件里按用户缓存，不计入每次开销
+        n = 50000
+        t_old = timeit.timeit(lambda: old_roll(collected, specials, True), number=n) / n * 1e6
+        t_new = timeit.timeit(lambda: ENGINE.roll(mask, True), number=n) / n * 1e6
+        print(f"{k:>6}{t_old:>14.2f}{t_new:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
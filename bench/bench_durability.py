@@ -0,0 +1,261 @@
+"""
+落盘安全检查：模拟崩溃 / 存档损坏后重启，核对数据是否完整；并统计 journal 组提交的 fsync 次数
+
+- 崩溃：跑一批指令（中途落盘一次），等 journal 刷盘后直接取消后台任务（不做最后一次落盘）再重启，
+  核对每位用户的记录与崩溃前完全一致，账本余额与背包一致
+- 写存档时崩溃：在上面的基础上留下一个写了一半的 .tmp 文件与一行写了一半的 journal
+- 账本快照后崩溃：写过账本快照之后的流水仍须记进 journal，重启后账本与背包一致
+- 存档损坏：落盘后再改几位用户，然后把当前存档改坏；json 应退回 .1、sqlite 应退回当天的每日备份，
+  再重放保留的 journal（sqlite 保留备份以来的全部段），结果都与损坏前完全一致，账本余额与背包一致
+- 无可用备份：存档改坏且删掉所有备份，插件照常启动，但不得覆盖损坏的文件
+- 组提交：journal_fsync_interval 内的多条指令共用一次 fsync；对比 journal 开 / 关时的指令吞吐
+
+用法（在插件目录下）：python bench/bench_durability.py [--users 2000] [--commands 5000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import FakeEvent, collect, load_plugin, make_plugin  # noqa: E402
+
+main = load_plugin()
+catalog = sys.modules["xiaosui_plugin.catalog"]
+
+
+class VirtualTime:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FsyncCounter:
+    """统计 os.fsync 调用次数（只在本脚本里替换）"""
+
+    def __init__(self):
+        self.n = 0
+        self._real = os.fsync
+
+    def __enter__(self):
+        def counted(fd):
+            self.n += 1
+            return self._real(fd)
+        os.fsync = counted
+        return self
+
+    def __exit__(self, *exc):
+        os.fsync = self._real
+
+
+async def start(data_dir: Path, kind: str, extra: dict | None = None):
+    config = {"storage_backend": kind, "save_dirty_threshold": 10 ** 9, "journal_fsync_interval": 0.05,
+              **(extra or {})}
+    plugin = make_plugin(main, data_dir, config)
+    vt = VirtualTime()
+    plugin._limiter = main.RateLimiter(clock=vt)
+    await plugin.initialize()
+    return plugin, vt
+
+
+async def crash(plugin) -> None:
+    """模拟进程被杀：后台任务直接取消，不做最后一次落盘"""
+    tasks = [plugin._clock._task, plugin._shards._task]
+    for shard in plugin._shards:
+        tasks.append(shard.persist._task)
+        if shard.journal is not None:
+            tasks.append(shard.journal._task)
+    for task in tasks:
+        if task is not None:
+            task.cancel()
+    await asyncio.gather(*(t for t in tasks if t is not None), return_exceptions=True)
+    for shard in plugin._shards:
+        if shard.backend is not None:
+            shard.backend.close()
+
+
+async def run_commands(plugin, vt: VirtualTime, uids: list[str], n: int, rng: random.Random) -> None:
+    shard = plugin._shards.default
+    for _ in range(n):
+        uid = rng.choice(uids)
+        ev = FakeEvent(uid, name=f"群友{uid}")
+        pick = rng.random()
+        if pick < 0.3:
+            user = shard.users.get(uid)
+            if user is not None:
+                user.last_sign = 0
+            await collect(plugin.sign_in(ev))
+        elif pick < 0.8:
+            vt.now += main.FEED_COOLDOWN + 1
+            await collect(plugin.feed_xiaosui(ev))
+        else:
+            await collect(main.dev_force_egg(plugin, ev))
+
+
+def snapshot(plugin) -> tuple[dict, dict, list]:
+    shard = plugin._shards.default
+    users, eggs = shard.users.export()
+    return users, eggs, list(shard.state.get("signin", {}).get("order", []))
+
+
+def ledger_mismatches(plugin) -> int:
+    shard = plugin._shards.default
+    return sum(shard.ledger.balance(uid) not in (None, (rec.favor, rec.marbles)) for uid, rec in shard.users.items())
+
+
+def report(name: str, ok: bool, detail: str = "") -> bool:
+    print(f"  {'✓' if ok else '✗'} {name}{'：' + detail if detail else ''}")
+    return ok
+
+
+async def scenario(kind: str, n_users: int, n_cmds: int) -> int:
+    failures = 0
+    rng = random.Random(11)
+    uids = [str(200000000 + i) for i in range(n_users)]
+    print(f"[{kind}]")
+
+    # 崩溃（journal 已刷盘）+ 写存档时崩溃留下的残片
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        plugin, vt = await start(data_dir, kind)
+        shard = plugin._shards.default
+        await run_commands(plugin, vt, uids, n_cmds // 2, rng)
+        await shard.persist.flush()
+        await run_commands(plugin, vt, uids, n_cmds // 2, rng)
+        await shard.journal.sync()
+        expected = snapshot(plugin)
+        await crash(plugin)
+        (data_dir / "xiaosui_state.json.tmp").write_bytes(b'{"users": {"1": ')
+        seg = shard.journal.segments()[-1]
+        with open(seg, "ab") as f:
+            f.write(b"deadbeef [99999999,\"u\",\"x\"")
+
+        plugin, vt = await start(data_dir, kind)
+        got = snapshot(plugin)
+        failures += not report("崩溃后重启：用户记录与崩溃前一致", got[:2] == expected[:2],
+                               f"{len(got[0])} 位用户")
+        failures += not report("崩溃后重启：今日签到顺序一致（集合）", set(got[2]) == set(expected[2]))
+        bad = ledger_mismatches(plugin)
+        failures += not report("崩溃后重启：账本余额与背包一致", bad == 0, f"{bad} 人不一致" if bad else "")
+        await run_commands(plugin, vt, uids, 100, rng)
+        expected = snapshot(plugin)
+        await plugin.terminate()
+        plugin, vt = await start(data_dir, kind)
+        failures += not report("正常停用再启动：数据一致", snapshot(plugin)[:2] == expected[:2])
+        await plugin.terminate()
+
+    # 账本写过快照之后崩溃：之后的流水仍须记进 journal，重启后账本与背包一致
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        plugin, vt = await start(data_dir, kind)
+        shard = plugin._shards.default
+        await run_commands(plugin, vt, uids, n_cmds // 4, rng)
+        shard.ledger.request_snapshot()
+        await shard.persist.flush()
+        snapped = shard.ledger.snapshot_path.exists()
+        await run_commands(plugin, vt, uids, n_cmds // 4, rng)
+        await shard.persist.flush()
+        await run_commands(plugin, vt, uids, n_cmds // 4, rng)
+        await shard.journal.sync()
+        expected = snapshot(plugin)
+        await crash(plugin)
+
+        plugin, vt = await start(data_dir, kind)
+        failures += not report("账本快照后崩溃：已写出账本快照", snapped)
+        failures += not report("账本快照后崩溃：用户记录与崩溃前一致", snapshot(plugin)[:2] == expected[:2])
+        bad = ledger_mismatches(plugin)
+        failures += not report("账本快照后崩溃：账本余额与背包一致", bad == 0, f"{bad} 人不一致" if bad else "")
+        await plugin.terminate()
+
+    # 存档损坏
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        plugin, vt = await start(data_dir, kind)
+        shard = plugin._shards.default
+        await run_commands(plugin, vt, uids, n_cmds // 2, rng)
+        await shard.persist.flush()  # 这一轮顺带写了当天的每日备份
+        await run_commands(plugin, vt, uids, n_cmds // 4, rng)
+        await shard.persist.flush()
+        await run_commands(plugin, vt, uids, n_cmds // 4, rng)
+        await shard.journal.sync()
+        expected = snapshot(plugin)
+        await crash(plugin)
+        path = data_dir / ("xiaosui_state.json" if kind == "json" else "xiaosui_state.db")
+        raw = bytearray(path.read_bytes())
+        for i in range(0, min(len(raw), 4096), 7):
+            raw[i] ^= 0x5A
+        path.write_bytes(bytes(raw))
+
+        plugin, vt = await start(data_dir, kind)
+        got = snapshot(plugin)
+        quarantined = list(data_dir.glob(path.name + ".corrupt-*"))
+        failures += not report("损坏的存档已改名挪开", bool(quarantined), quarantined[0].name if quarantined else "")
+        fallback = "退回 .1" if kind == "json" else "退回每日备份"
+        differ = sum(got[0].get(uid) != u for uid, u in expected[0].items()) + len(got[0].keys() - expected[0].keys())
+        failures += not report(f"{fallback} + 重放 journal：用户记录与损坏前一致",
+                               differ == 0 and got[1] == expected[1], f"{differ} 位用户不一致" if differ else "")
+        bad = ledger_mismatches(plugin)
+        failures += not report(f"{fallback} + 重放 journal：账本余额与背包一致", bad == 0,
+                               f"{bad} 人不一致" if bad else "")
+        await plugin.terminate()
+
+    # 无可用备份：不得覆盖损坏的文件
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        plugin, vt = await start(data_dir, kind, {"backup_keep": 0})
+        await run_commands(plugin, vt, uids, 200, rng)
+        await plugin.terminate()
+        path = data_dir / ("xiaosui_state.json" if kind == "json" else "xiaosui_state.db")
+        for p in list((data_dir / "backups").glob("*")):
+            p.unlink()
+        path.write_bytes(b"\x00garbage" * 64)
+        for side in ("-wal", "-shm"):
+            (data_dir / (path.name + side)).unlink(missing_ok=True)
+        damaged = path.read_bytes()
+        plugin, vt = await start(data_dir, kind)
+        await run_commands(plugin, vt, uids, 50, rng)
+        await plugin.terminate()
+        kept = path.exists() and path.read_bytes() == damaged or any(data_dir.glob(path.name + ".corrupt-*"))
+        failures += not report("无可用备份：插件照常启动，损坏的文件没有被覆盖", kept)
+    return failures
+
+
+async def throughput(kind: str, n_users: int, n_cmds: int) -> None:
+    rng = random.Random(5)
+    uids = [str(300000000 + i) for i in range(n_users)]
+    print(f"[{kind}] 组提交（journal_fsync_interval=0.05 s）")
+    for enabled in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            plugin, vt = await start(Path(tmp), kind, {"journal_enabled": enabled})
+            with FsyncCounter() as fs:
+                t0 = time.perf_counter()
+                for _ in range(10):
+                    await run_commands(plugin, vt, uids, n_cmds // 10, rng)
+                    await asyncio.sleep(0.06)  # 让后台 journal 任务刷一次
+                elapsed = time.perf_counter() - t0 - 0.6
+            await plugin.terminate()
+        print(f"  journal {'开' if enabled else '关'}：{n_cmds / elapsed:10,.0f} 条指令/秒，"
+              f"fsync {fs.n} 次（{n_cmds} 条指令）")
+
+
+async def amain(args) -> int:
+    catalog.PACKS.validate_all()
+    failures = 0
+    for kind in ("json", "sqlite"):
+        failures += await scenario(kind, args.users, args.commands)
+    for kind in ("json", "sqlite"):
+        await throughput(kind, args.users, args.commands)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--commands", type=int, default=5000)
+    sys.exit(asyncio.run(amain(ap.parse_args())))
@@ -0,0 +1,160 @@
+"""
+存档读写基准：落盘 / 加载时事件循环被卡住多久，以及写时复制快照是否一致
+
+- 旧写法：事件循环上整份导出 + json.dumps(indent=2) + 写文件（即原来的 _save_state）
+- 新写法：Shard._flush，事件循环上只取快照，导出、编码与写盘在 IO 线程里（编解码见 codec.py）
+- 卡顿：落盘期间另有一个协程每 1 ms 醒一次，记录最长的一次迟到（≈ 事件循环被连续占用的最长时间）
+- 一致性：落盘期间不停给随机用户加好感（模拟指令修改），落盘后读回文件，核对每个人都是开始落盘那一刻的值
+- 另测：启动加载（Shard.open，IO 线程）期间的最长卡顿、各编解码器的编码 / 解码耗时与文件大小
+
+用法（在插件目录下）：python bench/bench_io.py [--users 200000]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import load_plugin, make_plugin  # noqa: E402
+
+main = load_plugin()
+catalog = sys.modules["xiaosui_plugin.catalog"]
+records = sys.modules["xiaosui_plugin.records"]
+codec = sys.modules["xiaosui_plugin.codec"]
+shards_mod = sys.modules["xiaosui_plugin.shards"]
+storage = sys.modules["xiaosui_plugin.storage"]
+
+
+def populate(shard, n: int, rng: random.Random) -> list[str]:
+    eggs = list(catalog.eggs().by_id)
+    uids = []
+    for i in range(n):
+        uid = str(100000000 + i)
+        rec = records.UserRecord(favor=rng.randint(0, 5000), marbles=rng.randint(-300, 20000), name=f"群友{i}")
+        if rng.random() < 0.6:
+            rec.collected = records.EGG_IDS.mask_of(rng.sample(eggs, rng.randrange(1, 20)))
+        shard.users.put(uid, rec)
+        uids.append(uid)
+    return uids
+
+
+class Watchdog:
+    """每 interval 秒醒一次，记录最长迟到"""
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.worst = 0.0
+        self._stop = False
+
+    async def run(self):
+        while not self._stop:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.worst = max(self.worst, time.perf_counter() - t0 - self.interval)
+
+    async def watch(self, coro):
+        self.worst, self._stop = 0.0, False
+        task = asyncio.create_task(self.run())
+        await asyncio.sleep(0)
+        t0 = time.perf_counter()
+        result = await coro
+        elapsed = time.perf_counter() - t0
+        self._stop = True
+        await task
+        return result, elapsed
+
+
+def old_save(shard, path: Path) -> None:
+    users, eggs = shard.users.export()
+    data = json.dumps({"users": users, "eggs": eggs, **shard.state}, ensure_ascii=False, indent=2).encode("utf-8")
+    storage.atomic_write_bytes(path, data)
+
+
+async def mutate(shard, uids: list[str], rng: random.Random, stop: asyncio.Event) -> int:
+    """模拟指令：不停给随机用户加好感，每次改完让出事件循环"""
+    n = 0
+    while not stop.is_set():
+        shard.users.get(rng.choice(uids)).favor += 1
+        n += 1
+        await asyncio.sleep(0)
+    return n
+
+
+async def run(n: int) -> int:
+    rng = random.Random(3)
+    failures = 0
+    catalog.PACKS.validate_all()
+    with tempfile.TemporaryDirectory() as tmp:
+        plugin = make_plugin(main, Path(tmp), {"save_dirty_threshold": 10 ** 9})
+        await plugin.initialize()
+        shard = plugin._shards.default
+        uids = populate(shard, n, rng)
+        dog = Watchdog()
+        print(f"{n:,} 位用户，json 后端，编解码器 {codec.NAME}")
+
+        async def old():
+            old_save(shard, Path(tmp) / "old.json")
+        _, t_old = await dog.watch(old())
+        print(f"  旧写法落盘：{t_old:6.2f} s，事件循环最长卡顿 {dog.worst * 1e3:8.1f} ms，"
+              f"文件 {(Path(tmp) / 'old.json').stat().st_size / 1e6:.1f} MB")
+
+        expected = {uid: rec.favor for uid, rec in shard.users.items()}
+        stop = asyncio.Event()
+
+        async def new():
+            flush = asyncio.create_task(shard._flush({None}))
+            await asyncio.sleep(0)  # 让落盘先取好快照，之后的修改都不应出现在文件里
+            mutator = asyncio.create_task(mutate(shard, uids, rng, stop))
+            await flush
+            stop.set()
+            return await mutator
+        mutations, t_new = await dog.watch(new())
+        path = Path(tmp) / "xiaosui_state.json"
+        print(f"  新写法落盘：{t_new:6.2f} s，事件循环最长卡顿 {dog.worst * 1e3:8.1f} ms，"
+              f"文件 {path.stat().st_size / 1e6:.1f} MB；期间指令修改 {mutations:,} 次")
+
+        saved = codec.loads(path.read_bytes())["users"]
+        wrong = sum(saved[uid]["favor"] != fav for uid, fav in expected.items())
+        failures += bool(wrong)
+        print(f"  快照一致性：{'✓ 全部为开始落盘时的值' if not wrong else f'✗ {wrong} 人不一致'}")
+        await plugin.terminate()
+
+        # 加载：Shard.open 在 IO 线程里读；期间事件循环照常响应
+        fresh = shards_mod.Shard(None, Path(tmp), {}, plugin._clock, main.Metrics(False))
+        _, t_load = await dog.watch(fresh.open())
+        ok = len(fresh.users) == n
+        failures += not ok
+        print(f"  启动加载：  {t_load:6.2f} s，事件循环最长卡顿 {dog.worst * 1e3:8.1f} ms，"
+              f"{len(fresh.users):,} 位用户{'' if ok else ' ✗'}")
+        await fresh.close()
+
+        # 各编解码器
+        state = codec.loads(path.read_bytes())
+        coders = {"json(indent=2)": (lambda o: json.dumps(o, ensure_ascii=False, indent=2).encode(), json.loads),
+                  "json(紧凑)": (lambda o: json.dumps(o, ensure_ascii=False, separators=(",", ":")).encode(),
+                               json.loads)}
+        for name in ("orjson", "msgspec"):
+            try:
+                mod = __import__(name)
+            except ImportError:
+                continue
+            coders[name] = (mod.dumps, mod.loads) if name == "orjson" else (mod.json.encode, mod.json.decode)
+        print(f"  {'编解码器':<16}{'编码(s)':>9}{'解码(s)':>9}{'大小(MB)':>10}")
+        for name, (enc, dec) in coders.items():
+            t0 = time.perf_counter()
+            data = enc(state)
+            t1 = time.perf_counter()
+            dec(data)
+            t2 = time.perf_counter()
+            print(f"  {name:<16}{t1 - t0:>9.2f}{t2 - t1:>9.2f}{len(data) / 1e6:>10.1f}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200_000)
+    sys.exit(asyncio.run(run(ap.parse_args().users)))
@@ -0,0 +1,93 @@
+"""
+排行榜：每次查询全量排序 vs 增量维护的有序索引
+
+N 位合成用户（默认 10 万）分布在 G 个群（默认 200），测：
+- 建榜耗时（启动时一次）
+- 单次余额变化后的增量更新
+- 全服 / 单群 前 10 名查询、查自己名次
+- 对照：每次查询都对全部用户排序
+最后随机改动一批用户，核对增量榜与全量排序结果一致。
+
+运行：python bench/bench_leaderboard.py [--users 100000] [--groups 200]
+"""
+import argparse
+import random
+import sys
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import load_plugin  # noqa: E402
+
+load_plugin()
+records = sys.modules["xiaosui_plugin.records"]
+lb_mod = sys.modules["xiaosui_plugin.leaderboard"]
+
+
+def synth(n: int, groups: int, rng: random.Random):
+    table = records.UserTable()
+    for i in range(n):
+        rec = table.get_or_create(str(100000000 + i))
+        rec.favor = rng.randint(0, 5000)
+        rec.marbles = rng.randint(-300, 20000)
+        rec.collected = rng.getrandbits(50)
+        for _ in range(rng.choice((1, 1, 1, 2, 3))):
+            rec.add_group(f"g{rng.randrange(groups)}")
+    return table
+
+
+def full_sort_top(table, metric: str, group, n: int = 10):
+    """同分按用户顺序（合成数据里与入榜先后一致）"""
+    k = lb_mod.METRICS.index(metric)
+    rows = [(lb_mod.scores_of(r)[k], i, uid) for i, (uid, r) in enumerate(table.items())
+            if group is None or (r.groups and group in r.groups)]
+    rows.sort(key=lambda x: (-x[0], x[1]))
+    return [(score, uid) for score, _, uid in rows[:n]]
+
+
+def us(fn, number: int) -> float:
+    return timeit.timeit(fn, number=number) / number * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--groups", type=int, default=200)
+    args = ap.parse_args()
+    rng = random.Random(11)
+
+    table = synth(args.users, args.groups, rng)
+    uids = [uid for uid, _ in table.items()]
+
+    t0 = time.perf_counter()
+    boards = lb_mod.Leaderboards.build(table)
+    print(f"{args.users} 位用户 / {args.groups} 个群：建榜 {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    def bump():
+        uid = rng.choice(uids)
+        rec = table.get(uid)
+        rec.favor += rng.randint(-20, 50)
+        rec.marbles += rng.randint(-50, 50)
+        boards.update(uid, rec)
+
+    print(f"  增量更新（好感+玻璃珠变化）：{us(bump, 20000):8.2f} µs/次")
+    print(f"  全服前 10 名：              {us(lambda: boards.top('favor', None, 10), 20000):8.2f} µs/次")
+    print(f"  单群前 10 名：              {us(lambda: boards.top('marbles', 'g7', 10), 20000):8.2f} µs/次")
+    print(f"  查自己名次（全服）：        {us(lambda: boards.rank('favor', rng.choice(uids)), 20000):8.2f} µs/次")
+    print(f"  对照：每次全量排序取前 10： {us(lambda: full_sort_top(table, 'favor', None), 5) / 1000:8.2f} ms/次")
+
+    for _ in range(5000):
+        bump()
+    errors = 0
+    for metric in lb_mod.METRICS:
+        for group in (None, "g0", "g7", f"g{args.groups - 1}"):
+            if boards.top(metric, group, 10) != full_sort_top(table, metric, group):
+                errors += 1
+                print(f"  ✗ {metric} / {group or '全服'} 与全量排序不一致")
+    print("增量榜与全量排序一致 ✓" if not errors else f"共 {errors} 处不一致")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+指标埋点开销：metered 包装在 不包装 / 指标关闭 / 指标开启 三种情况下每次调用多花的时间
+
+- 包装开销：用一个只 yield 一条回复的空处理函数，三种情况轮流测、各取最好的一轮，避免被指令本身的耗时和抖动淹没
+- 真实指令：好感榜（只读、无随机、无落盘）在指标关闭 / 开启下的耗时，作为量级参照
+- 另测直方图 observe 的单次耗时与一次 Prometheus 文本导出，并打印导出内容核对格式
+指标关闭时包装开销超过 --budget-us（默认 1 µs）时以非零状态退出。
+
+用法（在插件目录下）：python bench/bench_metrics.py [--calls 50000] [--users 1000]
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import FakeEvent, collect, load_plugin, make_plugin  # noqa: E402
+
+main = load_plugin()
+metrics_mod = sys.modules["xiaosui_plugin.metrics"]
+
+
+async def _noop(self, event):
+    yield "ok"
+
+
+async def timed_us(fn, events: list, calls: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(calls):
+        await collect(fn(events[i % len(events)]))
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+async def best_of(variants: dict, events: list, calls: int, rounds: int = 7) -> dict:
+    """各变体轮流测 rounds 轮，取每个变体最好的一轮"""
+    best = dict.fromkeys(variants, float("inf"))
+    for _ in range(rounds):
+        for label, (setup, fn) in variants.items():
+            setup()
+            best[label] = min(best[label], await timed_us(fn, events, calls))
+    return best
+
+
+async def run(calls: int, users: int, budget_us: float) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        plugin = make_plugin(main, Path(tmp))
+        await plugin.initialize()
+        events = [FakeEvent(str(i)) for i in range(users)]
+        for ev in events:
+            await collect(plugin.sign_in(ev))
+
+        m = plugin._metrics
+        wrapped = main.metered(_noop)
+        on = lambda: setattr(m, "enabled", True)  # noqa: E731
+        off = lambda: setattr(m, "enabled", False)  # noqa: E731
+        wrap = await best_of({
+            "不包装": (off, lambda ev: _noop(plugin, ev)),
+            "指标关闭": (off, lambda ev: wrapped(plugin, ev)),
+            "指标开启": (on, lambda ev: wrapped(plugin, ev)),
+        }, events, calls)
+        real = await best_of({
+            "指标关闭": (off, plugin.favor_board),
+            "指标开启": (on, plugin.favor_board),
+        }, events, calls // 10, rounds=3)
+        on()
+
+        base = wrap["不包装"]
+        print(f"空处理函数 × {calls} 次")
+        for label, us in wrap.items():
+            print(f"  {label:<8}{us:8.3f} µs/次  {us - base:+.3f}")
+        print(f"好感榜 × {calls // 10} 次（{users} 位用户）")
+        for label, us in real.items():
+            print(f"  {label:<8}{us:8.2f} µs/次")
+
+        t0 = time.perf_counter()
+        for _ in range(calls):
+            m.command_seconds.observe(("favor_board",), 1e-4)
+        print(f"  直方图 observe：{(time.perf_counter() - t0) / calls * 1e9:.0f} ns/次")
+        t0 = time.perf_counter()
+        text = m.render()
+        print(f"  导出 {len(text.splitlines())} 行：{(time.perf_counter() - t0) * 1e3:.2f} ms")
+        await plugin.terminate()
+
+    print("\n".join(line for line in text.splitlines() if "xiaosui_command_seconds" not in line))
+    overhead = wrap["指标关闭"] - wrap["不包装"]
+    ok = overhead <= budget_us
+    print(f"指标关闭时的包装开销 {overhead:+.3f} µs（预算 {budget_us} µs）：{'✓ 达标' if ok else '✗ 超出'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=50000)
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--budget-us", type=float, default=1.0)
+    args = ap.parse_args()
+    sys.exit(asyncio.run(run(args.calls, args.users, args.budget_us)))
@@ -0,0 +1,68 @@
+"""
+群消息被动彩蛋基准：模拟大量群消息经过 passive_egg，统计每条消息的平均开销
+
+- 未命中（约 95%）：只做一次随机数比较就返回
+- 全部消息平均：含命中后的查用户、掉落判定与结算
+超过预算（默认平均 20 µs/条）时以非零状态退出。
+
+用法（在插件目录下）：python bench/bench_passive.py [--messages 200000] [--users 500] [--budget-us 20]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_astrbot import FakeEvent, load_plugin, make_plugin  # noqa: E402
+
+main = load_plugin()
+
+
+async def drain(gen) -> int:
+    n = 0
+    async for _ in gen:
+        n += 1
+    return n
+
+
+async def run(messages: int, users: int, budget_us: float) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        plugin = make_plugin(main, Path(tmp))
+        await plugin.initialize()
+        events = [FakeEvent(str(random.randrange(users)), text="随便聊聊") for _ in range(1000)]
+
+        # 未命中路径：关闭掉落，只测“判定 + 返回”
+        plugin._passive_egg = False
+        t0 = time.perf_counter()
+        for i in range(messages):
+            await drain(plugin.passive_egg(events[i % 1000]))
+        reject_us = (time.perf_counter() - t0) / messages * 1e6
+
+        # 真实分布：5% 命中后走完整掉落流程
+        plugin._passive_egg = True
+        drops = 0
+        t0 = time.perf_counter()
+        for i in range(messages):
+            drops += await drain(plugin.passive_egg(events[i % 1000]))
+        avg_us = (time.perf_counter() - t0) / messages * 1e6
+        await plugin.terminate()
+
+    print(f"{messages} 条群消息 / {users} 位用户")
+    print(f"  未命中路径：{reject_us:.2f} µs/条")
+    print(f"  全部平均：  {avg_us:.2f} µs/条（掉落 {drops} 次，{drops / messages:.2%}）")
+    ok = avg_us <= budget_us
+    print(f"  预算 {budget_us} µs/条：{'✓ 达标' if ok else '✗ 超出'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=200000)
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--budget-us", type=float, default=20.0)
+    args = ap.parse_args()
+    sys.exit(asyncio.run(run(args.messages, args.users, args.budget_us)))
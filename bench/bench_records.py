@@ -0,0 +1,95 @@
+"""
+用户记录内存占用：旧版嵌套字典 vs records.UserTable
+
+生成 N 位合成用户（默认 10 万），先按旧存档格式 json.dumps 再 json.loads（与插件启动时读到的对象一致），
+分别用 tracemalloc 统计：
+- 旧写法：users / eggs 两个字典原样常驻
+- 新写法：UserTable.load() 转成 __slots__ 记录后常驻（转换完即丢弃中间字典）
+最后核对 export() 能还原出同样的存档内容。
+
+运行：python bench/bench_records.py [--users 100000]
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import load_plugin  # noqa: E402
+
+load_plugin()
+records = sys.modules["xiaosui_plugin.records"]
+catalog = sys.modules["xiaosui_plugin.catalog"]
+
+
+def synth_state(n: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    pack = catalog.eggs()
+    all_eggs = [e.id for e in pack.normal + pack.rare + pack.ultra]
+    specials = [e.id for e in pack.special]
+    ach = [a.key for a in catalog.achievements().items]
+    today = date.today()
+    users, eggs = {}, {}
+    for i in range(n):
+        uid = str(100000000 + i)
+        u = {"favor": rng.randint(0, 5000), "marbles": rng.randint(-300, 20000)}
+        for key in ("last_sign", "last_divine", "last_extra_sign"):
+            if rng.random() < 0.8:
+                u[key] = (today - timedelta(days=rng.randrange(60))).isoformat()
+        if rng.random() < 0.3:
+            u["name"] = f"群友{i}"
+        users[uid] = u
+        if rng.random() < 0.7:
+            col = rng.sample(all_eggs, rng.randrange(1, 20))
+            sp = rng.sample(specials, rng.randrange(0, 3))
+            eggs[uid] = {"collected": col + sp, "achievements": ach[: rng.randrange(0, 3)], "special_collected": sp}
+    return {"users": users, "eggs": eggs}
+
+
+def measure(build) -> tuple[int, object]:
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, obj
+
+
+def canon(users: dict, eggs: dict) -> tuple:
+    """忽略列表顺序（导出按位号排序）比较存档内容"""
+    return users, {uid: {k: sorted(v) for k, v in e.items()} for uid, e in eggs.items()}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=100_000)
+    args = ap.parse_args()
+
+    raw = json.dumps(synth_state(args.users), ensure_ascii=False)
+    old_size, old = measure(lambda: json.loads(raw))
+
+    def build_table():
+        state = json.loads(raw)
+        return records.UserTable.load(state["users"], state["eggs"])
+
+    new_size, table = measure(build_table)
+
+    mb = 1024 * 1024
+    print(f"{args.users} 位用户")
+    print(f"  旧版嵌套字典：{old_size / mb:8.1f} MiB（{old_size / args.users:6.0f} B/人）")
+    print(f"  UserTable：   {new_size / mb:8.1f} MiB（{new_size / args.users:6.0f} B/人）")
+    print(f"  节省 {1 - new_size / old_size:.0%}")
+
+    users, eggs = table.export()
+    ok = canon(users, eggs) == canon(old["users"], old["eggs"])
+    print("导出与原存档一致 ✓" if ok else "导出与原存档不一致 ✗")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+回复渲染微基准：签到与占卜的回复文本，旧写法 vs 预编译模板
+
+- 签到：旧写法把当前时间段的全部问候都 format 一遍再挑一条，回复再拼一次 f-string；
+  新写法先选模板再渲染（templates.Template），回复与余额行用预编译模板
+- 占卜：旧写法是处理函数里的多行 f-string + 内部定义的符号格式化函数；新写法是 DIVINE_RESULT 模板
+- 重复提示：同一人反复签到时“今天已经签过到啦”走 LRU 缓存 vs 每次 format
+两种写法的输出逐字核对一致。
+
+用法（在插件目录下）：python bench/bench_render.py
+"""
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import load_plugin  # noqa: E402
+
+load_plugin()
+catalog = sys.modules["xiaosui_plugin.catalog"]
+templates = sys.modules["xiaosui_plugin.templates"]
+
+
+class _User:
+    favor = 1234
+    marbles = -56
+
+
+USER = _User()
+
+
+# ---- 签到 ----
+def old_sign_in(rng: random.Random, name: str, rank: int) -> str:
+    pool = [t.source.format(rank=rank, name=name) for t in catalog.greetings().sign_in["morning"]]
+    greet = rng.choice(pool)
+    favor_inc, marbles_inc = 17, 23
+    return (
+        f"{greet}\n"
+        f"签到成功啦～小碎好感度 +{favor_inc}，小碎赠予你 {marbles_inc} 颗玻璃珠。\n"
+        f"当前好感度：{USER.favor}｜玻璃珠：{USER.marbles}"
+    )
+
+
+def new_sign_in(rng: random.Random, name: str, rank: int) -> str:
+    greet = rng.choice(catalog.greetings().sign_in["morning"]).render(rank=rank, name=name)
+    return templates.SIGN_IN_OK.render(
+        greet=greet, favor_inc=17, marbles_inc=23, favor=USER.favor, marbles=USER.marbles,
+    )
+
+
+# ---- 占卜 ----
+def _draw(rng: random.Random):
+    deck = catalog.tarot()
+    card = rng.choice(deck.cards)
+    upright = rng.random() < 0.5
+    m = card.upright if upright else card.reversed
+    return deck, card.name, "正位" if upright else "逆位", m, rng.choice(deck.moods[m.rating])
+
+
+def old_divination(rng: random.Random) -> str:
+    deck, card_name, orient_cn, m, mood_line = _draw(rng)
+    fee, favor_inc, marble_delta, bonus, bonus_text = 20, 31, -12, 0, ""
+
+    def fmt_signed(n: int) -> str:
+        return f"+{n}" if n >= 0 else f"{n}"
+    rating = m.rating
+    rating_word = deck.rating_word[rating]
+    keywords = "、".join(m.keywords[:6])
+    return (
+        f"🔮 我收取了 **{fee}** 枚玻璃珠作为占卜费用……\n"
+        f"✨ 本次是 **{card_name}·{orient_cn}**\n"
+        f"等级：**{rating}（{rating_word}）**\n"
+        f"核心：**{m.core}**｜其它：{keywords}\n"
+        f"🔎 解析：{m.interp}\n"
+        f"{mood_line}\n"
+        f"💗 小碎好感度 {fmt_signed(favor_inc)}，"
+        f"🫧 玻璃珠 {fmt_signed(marble_delta + bonus)}{bonus_text}\n"
+        f"📦 当前背包｜好感度：{USER.favor}｜玻璃珠：{USER.marbles}"
+    )
+
+
+def new_divination(rng: random.Random) -> str:
+    deck, card_name, orient_cn, m, mood_line = _draw(rng)
+    return templates.DIVINE_RESULT.render(
+        fee=20, card=card_name, orient=orient_cn,
+        rating=m.rating, rating_word=deck.rating_word[m.rating],
+        core=m.core, keywords=m.keywords_line, interp=m.interp, mood=mood_line,
+        favor_inc=31, marble_delta=-12, bonus_text="",
+        favor=USER.favor, marbles=USER.marbles,
+    )
+
+
+def us(fn, number: int = 20000) -> float:
+    return timeit.timeit(fn, number=number) / number * 1e6
+
+
+def main() -> int:
+    errors = catalog.PACKS.validate_all()  # 预先加载，避免首次解析计入结果
+    if errors:
+        raise SystemExit("\n".join(errors))
+
+    mismatches = 0
+    for seed in range(200):
+        if old_sign_in(random.Random(seed), "小明", seed) != new_sign_in(random.Random(seed), "小明", seed):
+            mismatches += 1
+        if old_divination(random.Random(seed)) != new_divination(random.Random(seed)):
+            mismatches += 1
+
+    rng = random.Random(1)
+    names = [f"群友{i}" for i in range(50)]
+    done = templates.SIGN_IN_DONE
+    print(f"{'场景':<10}{'旧写法(µs)':>12}{'模板(µs)':>12}")
+    for label, old, new in (
+        ("签到回复", lambda: old_sign_in(rng, rng.choice(names), 7), lambda: new_sign_in(rng, rng.choice(names), 7)),
+        ("占卜回复", lambda: old_divination(rng), lambda: new_divination(rng)),
+        ("重复签到提示", lambda: done.source.format(name="小明", favor=USER.favor, marbles=USER.marbles),
+         lambda: done.render(name="小明", favor=USER.favor, marbles=USER.marbles)),
+    ):
+        print(f"{label:<10}{us(old):>12.2f}{us(new):>12.2f}")
+    print("两种写法输出一致 ✓" if not mismatches else f"✗ {mismatches} 处输出不一致")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
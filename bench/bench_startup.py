@@ -0,0 +1,158 @@
+"""
+启动基准：百万用户存档下插件从 initialize() 到能响应指令要多久、占多少内存
+
+- 数据：合成 N 位用户（部分收集了彩蛋、分布在若干群里），同一份数据各写成 xiaosui_state.json 与 xiaosui_state.db
+- 对比（每项在独立的子进程里跑，内存互不影响；每次先把存档复制到新的临时目录）：
+  - json.loads：标准库一次性解析整个文件（原来的启动方式，只算解析，不建记录）
+  - json 后端：插件照常启动（codec 解码 + 建全部记录 + 建榜）
+  - sqlite 后端（lazy_load=false）：读全表建全部记录 + 建榜
+  - sqlite 后端（lazy_load=true）：只读顶层状态与用户数，记录按需取，排行榜在后台建
+- 每项报告：initialize() 耗时、随后第一条指令（签到）的延迟、排行榜可用的时刻、常驻内存
+- 今天的每日备份预先放好，避免启动后立刻整份备份一次干扰测量
+
+用法（在插件目录下）：python bench/bench_startup.py [--sizes 10000,1000000]
+"""
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import FakeEvent, collect, load_plugin, make_plugin  # noqa: E402
+
+main = load_plugin()
+catalog = sys.modules["xiaosui_plugin.catalog"]
+storage = sys.modules["xiaosui_plugin.storage"]
+durability = sys.modules["xiaosui_plugin.durability"]
+metrics = sys.modules["xiaosui_plugin.metrics"]
+clock_mod = sys.modules["xiaosui_plugin.clock"]
+
+MODES = ("json.loads", "json", "sqlite", "sqlite-lazy")
+GROUPS = 200
+
+
+def synth_state(n: int, rng: random.Random) -> dict:
+    eggs = list(catalog.eggs().by_id)
+    users, egg_state = {}, {}
+    for i in range(n):
+        uid = str(100000000 + i)
+        users[uid] = {"favor": rng.randint(0, 5000), "marbles": rng.randint(-300, 20000), "name": f"群友{i}",
+                      "last_sign": "2024-01-01", "groups": [f"g{rng.randrange(GROUPS)}"]}
+        if rng.random() < 0.6:
+            egg_state[uid] = {"collected": rng.sample(eggs, rng.randrange(1, 8)), "achievements": [],
+                              "special_collected": []}
+    return {"users": users, "eggs": egg_state}
+
+
+def build(root: Path, n: int) -> None:
+    """把同一份合成数据写成 json 与 sqlite 两份存档（只做一次）"""
+    root.mkdir(parents=True, exist_ok=True)
+    state = synth_state(n, random.Random(n))
+    t0 = time.perf_counter()
+    storage.JsonBackend(root / "xiaosui_state.json", keep=0).save(state, {None})
+    backend = storage.open_backend("sqlite", root)
+    backend.save(state, {None})
+    backend.close()
+    print(f"  生成 {n:,} 位用户：{time.perf_counter() - t0:.1f} s，"
+          f"json {(root / 'xiaosui_state.json').stat().st_size / 1e6:.0f} MB，"
+          f"sqlite {(root / 'xiaosui_state.db').stat().st_size / 1e6:.0f} MB")
+
+
+def prepare(src: Path, dest: Path, name: str) -> None:
+    shutil.copy2(src / name, dest / name)
+    today = clock_mod.DayClock(0).today_iso
+    backup = durability.daily_backup_path(dest, name, today)
+    backup.parent.mkdir(parents=True, exist_ok=True)
+    backup.touch()
+
+
+def rss_mb() -> float:
+    rss = metrics.rss_bytes()
+    return rss / 1e6 if rss else float("nan")
+
+
+async def measure(mode: str, src: Path, n: int) -> dict:
+    """在当前（子）进程里测一项，返回结果字典"""
+    catalog.PACKS.validate_all()  # 内容包先加载好，不计入启动
+    base = rss_mb()
+    name = "xiaosui_state.json" if mode.startswith("json") else "xiaosui_state.db"
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        prepare(src, data_dir, name)
+        if mode == "json.loads":
+            t0 = time.perf_counter()
+            state = json.loads((data_dir / name).read_bytes())
+            init = time.perf_counter() - t0
+            return {"init": init, "rss": rss_mb() - base, "users": len(state["users"])}
+
+        config = {"storage_backend": "json" if mode == "json" else "sqlite", "lazy_load": mode == "sqlite-lazy",
+                  "save_interval": 3600}
+        plugin = make_plugin(main, data_dir, config)
+        t0 = time.perf_counter()
+        await plugin.initialize()
+        init = time.perf_counter() - t0
+        rss_init = rss_mb() - base
+        shard = plugin._shards.default
+
+        uid = str(100000000 + n // 2)
+        t1 = time.perf_counter()
+        await collect(plugin.sign_in(FakeEvent(uid, name="测试")))
+        first = time.perf_counter() - t1
+
+        await shard.boards_ready()
+        boards = time.perf_counter() - t0
+        ok = shard.boards.size("favor") == n and len(shard.users) == n
+        out = {"init": init, "first": first, "boards": boards, "rss_init": rss_init, "rss": rss_mb() - base,
+               "users": len(shard.users), "ok": ok}
+        if shard.users.lazy:
+            out["cached"] = shard.users.resident
+        return out  # 不做收尾落盘（json 会整份重写一次），临时目录直接丢掉
+
+
+def run_child(mode: str, src: Path, n: int) -> dict:
+    out = subprocess.run([sys.executable, __file__, "--child", mode, "--src", str(src), "--n", str(n)],
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        raise SystemExit(out.stderr)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main_(args) -> int:
+    failures = 0
+    sizes = [int(s) for s in args.sizes.split(",")]
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            print(f"== {n:,} 位用户 ==")
+            src = Path(tmp) / str(n)
+            build(src, n)
+            print(f"  {'方式':<22}{'启动(s)':>9}{'首条指令(ms)':>14}{'排行榜可用(s)':>15}{'内存(MB)':>10}")
+            for mode in MODES:
+                r = run_child(mode, src, n)
+                label = {"json.loads": "json.loads（仅解析）", "json": "json 后端",
+                         "sqlite": "sqlite（全量加载）", "sqlite-lazy": "sqlite（按需加载）"}[mode]
+                first = f"{r['first'] * 1e3:.2f}" if "first" in r else "-"
+                boards = f"{r['boards']:.2f}" if "boards" in r else "-"
+                mark = "" if r.get("ok", True) else " ✗"
+                failures += mark != ""
+                extra = f"（内存中 {r['cached']:,} 位）" if "cached" in r else ""
+                print(f"  {label:<22}{r['init']:>9.2f}{first:>14}{boards:>15}{r['rss']:>10.0f}{mark}{extra}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,1000000")
+    ap.add_argument("--child", choices=MODES)
+    ap.add_argument("--src")
+    ap.add_argument("--n", type=int)
+    a = ap.parse_args()
+    if a.child:
+        print(json.dumps(asyncio.run(measure(a.child, Path(a.src), a.n))))
+        sys.exit(0)
+    sys.exit(main_(a))
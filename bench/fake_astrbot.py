@@ -0,0 +1,122 @@
+"""
+本地替身：在没有 AstrBot 的环境里加载插件并模拟消息事件（仅供 bench/ 下的脚本使用）
+
+- install()：往 sys.modules 注入最小可用的 astrbot.api / astrbot.api.event / astrbot.api.star
+- load_plugin()：把插件目录当作包导入，返回 main 模块
+- make_plugin()：实例化插件，并把数据目录（含各分片与账本）指到给定的临时目录
+- FakeEvent：提供插件用到的 get_sender_name / get_sender_id / get_group_id / message_str / plain_result
+"""
+import importlib
+import logging
+import sys
+import types
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).resolve().parents[1]
+PACKAGE = "xiaosui_plugin"
+
+
+class _Filter:
+    """filter.command 等装饰器：原样返回被装饰函数"""
+
+    class EventMessageType:
+        ALL = "all"
+        GROUP_MESSAGE = "group_message"
+
+    class PermissionType:
+        ADMIN = "admin"
+        MEMBER = "member"
+
+    def _passthrough(self, *args, **kwargs):
+        return lambda fn: fn
+
+    command = event_message_type = permission_type = _passthrough
+
+
+class AstrMessageEvent:
+    pass
+
+
+class MessageEventResult(str):
+    pass
+
+
+class Context:
+    pass
+
+
+class Star:
+    def __init__(self, context, *args, **kwargs):
+        self.context = context
+
+
+def register(*args, **kwargs):
+    return lambda cls: cls
+
+
+class FakeEvent(AstrMessageEvent):
+    def __init__(self, user_id: str, name: str | None = None, text: str = "", group_id: str = "g1"):
+        self.user_id = user_id
+        self.name = name or f"用户{user_id}"
+        self.message_str = text
+        self.group_id = group_id
+
+    def get_sender_name(self) -> str:
+        return self.name
+
+    def get_sender_id(self) -> str:
+        return self.user_id
+
+    def get_group_id(self) -> str:
+        return self.group_id
+
+    def get_messages(self) -> list:
+        return []
+
+    @property
+    def unified_msg_origin(self) -> str:
+        return f"fake:GroupMessage:{self.group_id}"
+
+    def plain_result(self, text: str) -> MessageEventResult:
+        return MessageEventResult(text)
+
+
+def install() -> None:
+    if "astrbot.api" in sys.modules:
+        return
+    api = types.ModuleType("astrbot.api")
+    api.logger = logging.getLogger("astrbot")
+    api.AstrBotConfig = dict
+    event = types.ModuleType("astrbot.api.event")
+    event.filter = _Filter()
+    event.AstrMessageEvent = AstrMessageEvent
+    event.MessageEventResult = MessageEventResult
+    star = types.ModuleType("astrbot.api.star")
+    star.Context, star.Star, star.register = Context, Star, register
+    root = types.ModuleType("astrbot")
+    root.api = api
+    api.event, api.star = event, star
+    sys.modules.update({"astrbot": root, "astrbot.api": api, "astrbot.api.event": event, "astrbot.api.star": star})
+
+
+def load_plugin():
+    install()
+    if PACKAGE not in sys.modules:
+        pkg = types.ModuleType(PACKAGE)
+        pkg.__path__ = [str(PLUGIN_DIR)]
+        sys.modules[PACKAGE] = pkg
+    return importlib.import_module(f"{PACKAGE}.main")
+
+
+def make_plugin(main, data_dir: Path, config: dict | None = None):
+    """插件默认把数据写在自身目录下；基准脚本一律改到临时目录，避免污染插件目录"""
+    config = {"save_interval": 3600, **(config or {})}
+    plugin = main.MyPlugin(main.Context(), config)
+    plugin._data_dir = data_dir
+    plugin._shards = main.ShardManager(data_dir, config, plugin._clock, plugin._metrics, plugin._locks.held)
+    return plugin
+
+
+async def collect(gen) -> list:
+    """把指令（异步生成器）产出的回复收集成列表"""
+    return [res async for res in gen]
@@ -0,0 +1,292 @@
+"""
+经济蒙特卡洛模拟：N 位用户 × D 天，用 NumPy 按“轮”整批抽样，预测好感 / 玻璃珠的通胀与彩蛋收集进度
+
+规则表全部从插件读取，不在这里另抄一份：
+- 签到区间与连续签到奖励、勤勉签到九段运势区间（catalog.LUCK_LEVELS）、占卜费用 / 好感区间 / SSS 大奖、
+  玻璃珠裁切、投喂区间、运势 0 / 满分的奖励（都是 catalog 里的规则常量，指令用的是同一份）
+- 各牌面等级区间（content/tarot）、特别食物占比（content/feed）
+- 彩蛋掉落概率与回落顺序（drops.py）、各彩蛋奖励（content/eggs）、成就阈值与奖励（content/achievements）
+
+每天按 签到 → 勤勉签到 → 占卜 → 投喂 → 运势 → 群消息 的顺序处理；每一轮只对当轮参与的用户整批抽样，
+掉落时在“未拥有的同档位彩蛋”里等概率挑一个（与插件一致），随后检查成就。
+每位用户每天是否参与各指令按给定概率抽取，投喂 / 运势 / 群消息次数按泊松分布抽取；--fixed 时人人每天
+签到、占卜各一次并投喂恰好 --feeds 次，其余都不做（与 simulate_events.py 的回放口径相同，便于对照）。
+
+输出：按来源汇总的流入流出、检查点上的余额分位数与彩蛋收集曲线、各成就的解锁比例与解锁天数。
+
+需要 numpy。用法（在插件目录下）：
+  python bench/simulate_economy.py [--users 100000] [--days 10] [--seed 1] [--p-sign 0.9] [--p-extra 0.6]
+                                   [--p-divine 0.7] [--feeds 2] [--fortunes 1] [--messages 20] [--fixed]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    raise SystemExit("simulate_economy.py 需要 numpy：pip install numpy")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import load_plugin  # noqa: E402
+
+main = load_plugin()
+catalog = sys.modules["xiaosui_plugin.catalog"]
+drops = sys.modules["xiaosui_plugin.drops"]
+
+TAKEN = 2.0  # 挑选彩蛋时已拥有的列填这个值（随机键都在 [0, 1)）
+
+
+class Tables:
+    """从插件读出的规则表，整理成数组"""
+
+    def __init__(self):
+        pack = catalog.eggs()
+        self.eggs = pack.normal + pack.rare + pack.ultra + pack.special
+        self.egg_favor = np.array([e.favor for e in self.eggs], dtype=np.int64)
+        self.egg_marbles = np.array([e.marbles for e in self.eggs], dtype=np.int64)
+        self.tier_cols = {t: np.array([i for i, e in enumerate(self.eggs) if e.tier == t], dtype=np.int64)
+                          for t in catalog.TIERS}
+        self.is_special = np.array([e.tier == "special" for e in self.eggs])
+        self.mythic = next(i for i, e in enumerate(self.eggs) if e.id == catalog.MYTHIC_EGG_ID)
+        self.tiers = [t for t, _ in drops.TIER_WEIGHTS]
+        self.tier_cum = np.cumsum([w for _, w in drops.TIER_WEIGHTS])
+        self.tier_cum /= self.tier_cum[-1]
+
+        deck = catalog.tarot()
+        faces = [f for c in deck.cards for f in (c.upright, c.reversed)]
+        self.face_lo = np.array([deck.marble_range[f.rating][0] for f in faces], dtype=np.int64)
+        self.face_hi = np.array([deck.marble_range[f.rating][1] for f in faces], dtype=np.int64)
+        self.face_sss = np.array([f.rating == "SSS" for f in faces])
+
+        self.luck_lo = np.array([lv.marbles[0] for lv in catalog.LUCK_LEVELS], dtype=np.int64)
+        self.luck_hi = np.array([lv.marbles[1] for lv in catalog.LUCK_LEVELS], dtype=np.int64)
+
+        foods = catalog.feed().foods
+        self.special_food_p = sum(f.special for f in foods) / len(foods)
+
+        self.achievements = catalog.achievements().items
+
+
+class Economy:
+    def __init__(self, tables: Tables, users: int, seed: int):
+        self.t = tables
+        self.n = users
+        self.rng = np.random.default_rng(seed)
+        self.favor = np.zeros(users, dtype=np.int64)
+        self.marbles = np.zeros(users, dtype=np.int64)
+        self.owned = np.zeros((users, len(tables.eggs)), dtype=bool)
+        self.n_collected = np.zeros(users, dtype=np.int64)
+        self.n_special = np.zeros(users, dtype=np.int64)
+        self.last_sign = np.full(users, -1, dtype=np.int32)  # 最近一次签到的天
+        self.streak = np.zeros(users, dtype=np.int64)
+        self.unlock_day = np.full((users, len(tables.achievements)), -1, dtype=np.int32)
+        self.flows: dict[str, list[int]] = {}
+        self.day = 0
+
+    # ---- 记账 ----
+    def credit(self, source: str, rows: np.ndarray, favor=0, marbles=0) -> None:
+        """rows 为不重复的用户下标；favor / marbles 为标量或与 rows 等长的数组"""
+        if not len(rows):
+            return
+        self.favor[rows] += favor
+        self.marbles[rows] += marbles
+        agg = self.flows.setdefault(source, [0, 0])
+        agg[0] += int(np.sum(favor)) if np.ndim(favor) else int(favor) * len(rows)
+        agg[1] += int(np.sum(marbles)) if np.ndim(marbles) else int(marbles) * len(rows)
+
+    def randint(self, lo, hi, size) -> np.ndarray:
+        """闭区间 [lo, hi] 的整数；lo / hi 可以是数组"""
+        return self.rng.integers(lo, np.asarray(hi) + 1, size=size)
+
+    # ---- 彩蛋 ----
+    def grant(self, rows: np.ndarray, cols: np.ndarray) -> None:
+        if not len(rows):
+            return
+        self.owned[rows, cols] = True
+        self.n_collected[rows] += 1
+        self.n_special[rows] += self.t.is_special[cols]
+        self.credit("彩蛋", rows, self.t.egg_favor[cols], self.t.egg_marbles[cols])
+        self.unlock(rows)
+
+    def unlock(self, rows: np.ndarray) -> None:
+        """判定 rows 这些用户的成就（与 achieve.py 的计数器同名）；只在发彩蛋时判定，好感 / 玻璃珠类成就会略晚一点解锁"""
+        counters = {"collected": self.n_collected, "special": self.n_special,
+                    "favor": self.favor, "marbles": self.marbles, "streak": self.streak}
+        for k, a in enumerate(self.t.achievements):
+            new = (counters[a.counter][rows] >= a.threshold) & (self.unlock_day[rows, k] < 0)
+            if new.any():
+                hit = rows[new]
+                self.unlock_day[hit, k] = self.day
+                self.credit("成就", hit, a.favor, a.marbles)
+
+    def pick(self, rows: np.ndarray, cols: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """每行在 cols 里等概率挑一个未拥有的彩蛋；返回 (有得挑的行, 挑中的列)"""
+        if not len(rows):
+            return rows, rows
+        keys = self.rng.random((len(rows), len(cols)))
+        keys[self.owned[np.ix_(rows, cols)]] = TAKEN
+        j = keys.argmin(axis=1)
+        ok = keys[np.arange(len(rows)), j] < TAKEN
+        return rows[ok], cols[j[ok]]
+
+    def roll(self, rows: np.ndarray, is_interaction: bool, gated: bool = False) -> None:
+        """一轮掉落判定（rows 内不重复），步骤与 DropEngine.roll 一致"""
+        if not len(rows):
+            return
+        u = self.rng.random((len(rows), 3))
+        special = self.t.tier_cols["special"]
+        sp = (u[:, 0] < drops.SPECIAL_P) & (self.n_special[rows] < len(special))
+        self.grant(*self.pick(rows[sp], special))
+
+        rest = ~sp
+        if not gated:
+            rest &= u[:, 1] < (drops.INTERACTION_P if is_interaction else drops.MESSAGE_P)
+        myth = rest & ~self.owned[rows, self.t.mythic] & (u[:, 2] < drops.MYTHIC_P)
+        self.grant(rows[myth], np.full(int(myth.sum()), self.t.mythic))
+        rows = rows[rest & ~myth]
+        if not len(rows):
+            return
+
+        # 别名表抽稀有度与按累计概率抽等价；已集齐则按 FALLBACK_ORDER 回落
+        drawn = np.searchsorted(self.t.tier_cum, self.rng.random(len(rows)), side="right")
+        chosen = np.full(len(rows), -1)
+        avail = {t: ~self.owned[np.ix_(rows, self.t.tier_cols[t])].all(axis=1) for t in self.t.tiers}
+        for i, t in enumerate(self.t.tiers):
+            chosen[(drawn == i) & avail[t]] = i
+        for t in drops.FALLBACK_ORDER:
+            chosen[(chosen < 0) & avail[t]] = self.t.tiers.index(t)
+        for i, t in enumerate(self.t.tiers):
+            self.grant(*self.pick(rows[chosen == i], self.t.tier_cols[t]))
+
+    # ---- 指令 ----
+    def sign_in(self, rows: np.ndarray) -> None:
+        self.credit("签到", rows, self.randint(*catalog.SIGN_FAVOR_RANGE, len(rows)),
+                    self.randint(*catalog.SIGN_MARBLE_RANGE, len(rows)))
+        s = np.where(self.last_sign[rows] == self.day - 1, self.streak[rows] + 1, 1)
+        self.streak[rows] = s
+        self.last_sign[rows] = self.day
+        # 与 catalog.streak_bonus 相同的规则，按整批算
+        weekly = (s % 7 == 0) & (s > 0)
+        favor = np.where(weekly, catalog.STREAK_WEEKLY[0], 0)
+        marbles = np.minimum((s - 1) * catalog.STREAK_DAILY_MARBLES, catalog.STREAK_DAILY_CAP)
+        marbles += np.where(weekly, catalog.STREAK_WEEKLY[1], 0)
+        self.credit("连续签到", rows, favor, marbles)
+        self.unlock(rows)
+        self.roll(rows, True)
+
+    def extra_sign_in(self, rows: np.ndarray) -> None:
+        lv = self.rng.integers(0, len(self.t.luck_lo), len(rows))
+        delta = np.clip(self.randint(self.t.luck_lo[lv], self.t.luck_hi[lv], len(rows)),
+                        -catalog.MARBLE_CLIP, catalog.MARBLE_CLIP)
+        self.credit("我还要签到", rows, 0, delta)
+        self.roll(rows, True)
+
+    def divination(self, rows: np.ndarray) -> None:
+        self.credit("占卜费用", rows, 0, -catalog.DIVINE_FEE)
+        face = self.rng.integers(0, len(self.t.face_lo), len(rows))
+        delta = np.clip(self.randint(self.t.face_lo[face], self.t.face_hi[face], len(rows)),
+                        -catalog.MARBLE_CLIP, catalog.MARBLE_CLIP)
+        self.credit("占卜", rows, self.randint(*catalog.DIVINE_FAVOR_RANGE, len(rows)), delta)
+        bonus = self.t.face_sss[face] & (self.rng.random(len(rows)) < catalog.SSS_BONUS_P)
+        self.credit("占卜大奖", rows[bonus], 0, catalog.SSS_BONUS)
+        self.roll(rows, True)
+
+    def feed(self, rows: np.ndarray) -> None:
+        favor = self.randint(*catalog.FEED_FAVOR_RANGE, len(rows))
+        special = self.rng.random(len(rows)) < self.t.special_food_p
+        favor[special] += self.randint(*catalog.SPECIAL_FOOD_RANGE, int(special.sum()))
+        self.credit("投喂", rows, favor, 0)
+        self.roll(rows, True)
+
+    def fortune(self, counts: np.ndarray) -> None:
+        """运势只有 0 / 满分两个分支改余额，按次数直接抽二项分布"""
+        n = catalog.FORTUNE_MAX + 1
+        zeros = self.rng.binomial(counts, 1 / n)
+        tops = self.rng.binomial(counts - zeros, 1 / (n - 1))
+        for hits, (favor, marbles) in ((zeros, catalog.FORTUNE_ZERO), (tops, catalog.FORTUNE_HUNDRED)):
+            rows = np.flatnonzero(hits)
+            self.credit("运势", rows, favor * hits[rows], marbles * hits[rows])
+
+    def rounds(self, counts: np.ndarray, action) -> None:
+        """每位用户做 counts[i] 次 action：按轮处理，第 r 轮是次数 > r 的用户"""
+        for r in range(int(counts.max(initial=0))):
+            action(np.flatnonzero(counts > r))
+
+
+def simulate(args, tables: Tables) -> tuple[Economy, list, float]:
+    eco = Economy(tables, args.users, args.seed)
+    rng = eco.rng
+    checkpoints = sorted({max(1, args.days // 4), max(1, args.days // 2), args.days})
+    curve = []
+    t0 = time.perf_counter()
+    for day in range(1, args.days + 1):
+        eco.day = day
+        n = args.users
+        if args.fixed:
+            every = np.arange(n)
+            eco.sign_in(every)
+            eco.divination(every)
+            eco.rounds(np.full(n, args.feeds), eco.feed)
+        else:
+            eco.sign_in(np.flatnonzero(rng.random(n) < args.p_sign))
+            eco.extra_sign_in(np.flatnonzero(rng.random(n) < args.p_extra))
+            eco.divination(np.flatnonzero(rng.random(n) < args.p_divine))
+            eco.rounds(rng.poisson(args.feeds, n), eco.feed)
+            eco.fortune(rng.poisson(args.fortunes, n))
+            # 群消息：先按 5% 门槛抽出命中次数，再逐轮做跳过门槛的掉落判定
+            hits = rng.binomial(rng.poisson(args.messages, n), drops.MESSAGE_P)
+            eco.rounds(hits, lambda rows: eco.roll(rows, False, gated=True))
+        if day in checkpoints:
+            curve.append((day, eco.favor.copy(), eco.marbles.copy(), eco.n_collected.copy()))
+    return eco, curve, time.perf_counter() - t0
+
+
+def report(args, eco: Economy, curve: list, elapsed: float) -> None:
+    total = len(eco.t.eggs)
+    user_days = args.users * args.days
+    print(f"{args.users} 位用户 × {args.days} 天 = {user_days} 用户日：{elapsed:.2f} s"
+          f"（{user_days / elapsed:,.0f} 用户日/秒）")
+
+    print("流入流出（全体合计 / 人均每天）：")
+    print(f"  {'来源':<10}{'好感':>14}{'玻璃珠':>14}{'好感/人日':>12}{'珠/人日':>10}")
+    for src, (df, dm) in sorted(eco.flows.items(), key=lambda kv: -abs(kv[1][1])):
+        print(f"  {src:<10}{df:>14,}{dm:>14,}{df / user_days:>12.2f}{dm / user_days:>10.2f}")
+
+    qs = (1, 10, 50, 90, 99)
+    print("余额分布（分位数）：")
+    for day, favor, marbles, _ in curve:
+        print(f"  第 {day:>3} 天  好感 " + " ".join(f"P{q}={v:.0f}" for q, v in zip(qs, np.percentile(favor, qs)))
+              + "  |  珠 " + " ".join(f"P{q}={v:.0f}" for q, v in zip(qs, np.percentile(marbles, qs))))
+
+    print(f"彩蛋收集（共 {total} 个）：")
+    for day, _, _, collected in curve:
+        print(f"  第 {day:>3} 天  平均 {collected.mean():5.1f} 个，≥25 个 {np.mean(collected >= 25):6.2%}，"
+              f"≥40 个 {np.mean(collected >= 40):6.2%}，集齐 {np.mean(collected >= total):6.2%}")
+
+    print("成就解锁：")
+    for k, a in enumerate(eco.t.achievements):
+        days = eco.unlock_day[:, k]
+        got = days[days >= 0]
+        when = (f"中位第 {np.median(got):.0f} 天，P90 第 {np.percentile(got, 90):.0f} 天" if len(got) else "—")
+        print(f"  {a.key:<12}{len(got) / args.users:8.2%}  {when}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--days", type=int, default=10)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--p-sign", type=float, default=0.9)
+    ap.add_argument("--p-extra", type=float, default=0.6)
+    ap.add_argument("--p-divine", type=float, default=0.7)
+    ap.add_argument("--feeds", type=float, default=2, help="每人每天平均投喂次数")
+    ap.add_argument("--fortunes", type=float, default=1, help="每人每天平均运势次数")
+    ap.add_argument("--messages", type=float, default=20, help="每人每天平均群消息条数")
+    ap.add_argument("--fixed", action="store_true", help="人人每天签到、占卜各一次并投喂恰好 --feeds 次（与 simulate_events.py 口径相同）")
+    args = ap.parse_args()
+    if args.fixed:
+        args.feeds = int(args.feeds)
+    tables = Tables()
+    report(args, *simulate(args, tables))
@@ -0,0 +1,175 @@
+"""
+离线事件回放模拟：固定随机数种子，让大量合成的 签到 / 占卜 / 投喂 事件走一遍真实的指令处理函数
+
+- 每位用户每天：签到、占卜各一次，投喂 --feeds 次（虚拟时钟每次前进 181 秒，正好过冷却）；
+  每天开始时用虚拟日期翻页（签到 / 占卜的每日一次照常生效），用户顺序每天打乱
+- 统计：各指令的彩蛋掉落率、按来源汇总的好感 / 玻璃珠流入流出（读账本）、最终余额分布、平均收集数
+- 掉落率核对：直接用随机流对空收集位集做 --rolls 次掉落判定，各档位频率与理论概率比较（4σ 以内算通过）
+- --check-repro：用同一种子再跑一遍，核对最终存档逐字一致；换一个种子则应当不同
+
+用法（在插件目录下）：python bench/simulate_events.py [--users 1000] [--days 30] [--feeds 3] [--seed 42]
+                                                     [--rolls 1000000] [--check-repro]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import FakeEvent, collect, load_plugin, make_plugin  # noqa: E402
+
+main = load_plugin()
+drops = sys.modules["xiaosui_plugin.drops"]
+catalog = sys.modules["xiaosui_plugin.catalog"]
+rng_mod = sys.modules["xiaosui_plugin.rng"]
+
+START = datetime(2024, 1, 1, 12, 0)
+
+
+class VirtualTime:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def replay(users: int, days: int, feeds: int, seed: int, data_dir: Path) -> dict:
+    config = {"rng_seed": seed, "save_dirty_threshold": 10 ** 9}
+    plugin = make_plugin(main, data_dir, config)
+    vt = VirtualTime()
+    plugin._limiter = main.RateLimiter(clock=vt)
+    await plugin.initialize()
+
+    order_rng = random.Random(seed)  # 只决定每天的用户顺序，与插件内部的随机流无关
+    events = [FakeEvent(str(100000 + i), name=f"群友{i}") for i in range(users)]
+    sent = Counter()
+    dropped = Counter()
+    n_events = 0
+    t0 = time.perf_counter()
+    for day in range(days):
+        plugin._clock.tick(START + timedelta(days=day))
+        order_rng.shuffle(events)
+        for k, (label, handler) in enumerate(
+            [("签到", plugin.sign_in), ("占卜", plugin.divination)] + [("投喂", plugin.feed_xiaosui)] * feeds
+        ):
+            vt.now = day * 86400.0 + k * 181.0
+            for ev in events:
+                replies = await collect(handler(ev))
+                sent[label] += 1
+                dropped[label] += sum("彩蛋*" in r and "已经拥有" not in r for r in replies)
+        n_events += users * (2 + feeds)
+    elapsed = time.perf_counter() - t0
+
+    shard = plugin._shards.default
+    await shard.persist.flush()
+    users_out, eggs_out = shard.users.export()
+    collected = [rec.collected.bit_count() for _, rec in shard.users.items()]
+    favor = [rec.favor for _, rec in shard.users.items()]
+    marbles = [rec.marbles for _, rec in shard.users.items()]
+    await plugin.terminate()
+
+    flows: dict[str, list[int]] = {}
+    with open(data_dir / "ledger.jsonl", encoding="utf-8") as f:
+        for line in f:
+            _, _, src, df, dm = json.loads(line)[:5]
+            if src == "期初":
+                continue
+            agg = flows.setdefault(src.split(":")[0], [0, 0])
+            agg[0] += df
+            agg[1] += dm
+    return {
+        "events": n_events, "elapsed": elapsed, "sent": sent, "dropped": dropped, "flows": flows,
+        "favor": favor, "marbles": marbles, "collected": collected,
+        "state": json.dumps({"users": users_out, "eggs": eggs_out}, sort_keys=True, ensure_ascii=False),
+    }
+
+
+def expected_tags(is_interaction: bool) -> dict[str, float]:
+    """空收集位集时一次掉落判定的各档位理论概率"""
+    base = (1 - drops.SPECIAL_P) * (drops.INTERACTION_P if is_interaction else drops.MESSAGE_P)
+    weights = dict(drops.TIER_WEIGHTS)
+    mythic = base * drops.MYTHIC_P
+    rest = base * (1 - drops.MYTHIC_P)
+    tag = catalog.TIER_TAG
+    return {
+        tag["special"]: drops.SPECIAL_P,
+        tag["normal"]: rest * weights["normal"],
+        tag["rare"]: rest * weights["rare"],
+        tag["ultra"]: rest * weights["ultra"] + mythic,
+    }
+
+
+def check_rolls(rolls: int, seed: int) -> int:
+    engine = drops.get_engine(catalog.eggs())
+    stream = rng_mod.RngService(seed).for_user("drop-check")
+    failures = 0
+    for is_interaction in (True, False):
+        seen = Counter()
+        t0 = time.perf_counter()
+        for _ in range(rolls):
+            d = engine.roll(0, is_interaction, rng=stream)
+            if d is not None:
+                seen[d.tag] += 1
+        dt = time.perf_counter() - t0
+        print(f"  {'互动指令' if is_interaction else '群消息'}：{rolls} 次判定，{dt:.1f} s")
+        for tag, p in expected_tags(is_interaction).items():
+            got = seen[tag] / rolls
+            sigma = math.sqrt(p * (1 - p) / rolls)
+            ok = abs(got - p) <= 4 * sigma
+            failures += not ok
+            print(f"    {tag:<6} 理论 {p:8.4%}  实测 {got:8.4%}  {'✓' if ok else '✗'}")
+    return failures
+
+
+def report(r: dict, users: int, days: int) -> None:
+    print(f"{users} 位用户 × {days} 天：{r['events']} 条事件，{r['elapsed']:.1f} s"
+          f"（{r['events'] / r['elapsed']:.0f} 条/秒）")
+    print("  彩蛋掉落率：" + "，".join(
+        f"{k} {r['dropped'][k] / r['sent'][k]:.2%}" for k in r["sent"]))
+    print("  流入流出（好感 / 玻璃珠）：")
+    for src, (df, dm) in sorted(r["flows"].items(), key=lambda kv: -abs(kv[1][1])):
+        print(f"    {src:<8}{df:>12}{dm:>14}")
+    for label, values in (("好感", r["favor"]), ("玻璃珠", r["marbles"])):
+        q = statistics.quantiles(values, n=100)
+        print(f"  {label}：平均 {statistics.fmean(values):.0f}，中位 {q[49]:.0f}，"
+              f"P1 {q[0]:.0f}，P99 {q[98]:.0f}，人均每天 {statistics.fmean(values) / days:+.1f}")
+    print(f"  平均收集彩蛋：{statistics.fmean(r['collected']):.1f} 个")
+
+
+async def amain(args) -> int:
+    print(f"随机数实现：{rng_mod.BACKEND}，种子 {args.seed}")
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        r = await replay(args.users, args.days, args.feeds, args.seed, Path(tmp) / "a")
+        report(r, args.users, args.days)
+        if args.check_repro:
+            again = await replay(args.users, args.days, args.feeds, args.seed, Path(tmp) / "b")
+            other = await replay(args.users, args.days, args.feeds, args.seed + 1, Path(tmp) / "c")
+            same, differs = again["state"] == r["state"], other["state"] != r["state"]
+            print(f"  同种子重放：{'存档一致 ✓' if same else '✗ 存档不一致'}；"
+                  f"换种子：{'结果不同 ✓' if differs else '✗ 结果相同'}")
+            failures += (not same) + (not differs)
+    if args.rolls:
+        print("掉落率核对：")
+        failures += check_rolls(args.rolls, args.seed)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--feeds", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--rolls", type=int, default=1_000_000)
+    ap.add_argument("--check-repro", action="store_true")
+    sys.exit(asyncio.run(amain(ap.parse_args())))
@@ -0,0 +1,111 @@
+"""
+并发压力测试：同时投递数千条模拟指令，检查按用户加锁后的不变量
+
+- 每位用户每天只成功签到 / 占卜 / 勤勉签到一次，冷却期内只成功投喂一次，签到名次唯一且连续
+- 每位用户收到的彩蛋掉落条数 == 收集到的彩蛋数（没有重复发奖），收集列表无重复
+- 空闲超时后锁表被清空
+为了让竞争真实发生，彩蛋结算前会插入一次 await（模拟 IO）。
+加 --no-lock 可关闭按用户加锁，用于对比不变量被破坏的情况。
+
+用法（在插件目录下）：python bench/stress_locks.py [--events 5000] [--users 200] [--no-lock]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_astrbot import FakeEvent, collect, load_plugin, make_plugin  # noqa: E402
+
+main = load_plugin()
+
+
+class _NoLocks:
+    @asynccontextmanager
+    async def lock(self, key):
+        yield
+
+
+def _with_io_gap(award):
+    async def wrapper(*args, **kwargs):
+        await asyncio.sleep(0)
+        return await award(*args, **kwargs)
+    return wrapper
+
+
+async def run(events: int, users: int, use_lock: bool) -> int:
+    main._award_egg_and_achievements = _with_io_gap(main._award_egg_and_achievements)
+    with tempfile.TemporaryDirectory() as tmp:
+        plugin = make_plugin(main, Path(tmp))
+        await plugin.initialize()
+        if not use_lock:
+            plugin._locks = _NoLocks()
+
+        commands = {
+            "签到": lambda ev: plugin.sign_in(ev),
+            "占卜": lambda ev: plugin.divination(ev),
+            "我还要签到": lambda ev: main.extra_sign_in(plugin, ev),
+            "投喂": lambda ev: plugin.feed_xiaosui(ev),
+            "程序员彩蛋测试": lambda ev: main.dev_force_egg(plugin, ev),
+        }
+        plan = [(random.choice(list(commands)), str(random.randrange(users))) for _ in range(events)]
+
+        t0 = time.perf_counter()
+        replies = await asyncio.gather(*(collect(commands[cmd](FakeEvent(uid))) for cmd, uid in plan))
+        elapsed = time.perf_counter() - t0
+
+        ok = Counter()
+        drops = Counter()
+        for (cmd, uid), outs in zip(plan, replies):
+            for text in outs:
+                if "彩蛋*" in text and "已经拥有" not in text:
+                    drops[uid] += 1
+                elif cmd == "签到" and "签到成功" in text:
+                    ok[(cmd, uid)] += 1
+                elif cmd == "占卜" and "占卜费用" in text:
+                    ok[(cmd, uid)] += 1
+                elif cmd == "我还要签到" and "今日运势" in text:
+                    ok[(cmd, uid)] += 1
+                elif cmd == "投喂" and " 投喂：" in text:
+                    ok[(cmd, uid)] += 1
+
+        errors = []
+        for (cmd, uid), n in ok.items():
+            if n > 1:
+                errors.append(f"用户 {uid} 的「{cmd}」成功了 {n} 次")
+        order = plugin._shards.default.state["signin"]["order"]
+        if len(order) != len(set(order)):
+            errors.append("今日签到顺序表里有重复用户")
+        for uid, u in plugin._shards.default.users.items():
+            n = u.collected.bit_count()
+            if drops[uid] != n:
+                errors.append(f"用户 {uid} 收到 {drops[uid]} 次彩蛋奖励，但只收集了 {n} 个")
+
+        if use_lock:
+            live = len(plugin._locks)
+            plugin._locks.sweep(now=time.monotonic() + plugin._locks.idle_ttl)
+            if len(plugin._locks):
+                errors.append(f"空闲锁未被清理：剩余 {len(plugin._locks)} 把")
+        await plugin.terminate()
+
+    print(f"{events} 条指令 / {users} 位用户 / {'按用户加锁' if use_lock else '不加锁'}：{elapsed * 1000:.0f} ms"
+          + (f"，峰值锁数 {live}（空闲后全部清理）" if use_lock else ""))
+    for e in errors[:20]:
+        print("  ✗", e)
+    print("不变量全部成立 ✓" if not errors else f"共 {len(errors)} 处违反不变量")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=5000)
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--no-lock", action="store_true")
+    args = ap.parse_args()
+    sys.exit(asyncio.run(run(args.events, args.users, not args.no_lock)))
@@ -0,0 +1,233 @@
+"""
+基准套件：每条指令在不同存档规模下的延迟与吞吐，结果按次追加到历史文件并与之前的结果比较
+
+- 规模：默认 10 / 1 万 / 100 万 位用户（合成记录，分布在若干群里，部分用户已收集彩蛋）
+- 指令：签到、我还要签到、占卜、投喂、运势、查看成就、彩蛋掉落（程序员彩蛋测试，强制掉落）、群消息（被动彩蛋）、好感榜；
+  每次调用随机挑一位用户、新建一条 FakeEvent。每日一次的指令调用前先清掉该用户当天的记录，投喂 / 运势用虚拟时钟跳过冷却
+- 落盘：json（整份重写）与 sqlite（只写被修改的行）两种后端各测一次全量落盘与“改一位用户后落盘”
+- 每项报告 p50 / p99 延迟与吞吐；结果连同提交号、主机名、Python 版本追加到 --history（JSONL）
+- 与同一主机、同一 Python 版本最近 5 次结果的 p50 中位数比较，慢了超过 --tolerance（且多于 5 µs）标为回退；
+  加 --fail-on-regression 时有回退就以非零状态退出
+
+用法（在插件目录下）：python bench/suite.py [--sizes 10,10000,1000000] [--budget 0.5] [--only 签到,投喂]
+                                         [--history bench/results/history.jsonl] [--fail-on-regression]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_astrbot import FakeEvent, collect, load_plugin, make_plugin  # noqa: E402
+
+main = load_plugin()
+catalog = sys.modules["xiaosui_plugin.catalog"]
+records = sys.modules["xiaosui_plugin.records"]
+lb_mod = sys.modules["xiaosui_plugin.leaderboard"]
+
+HERE = Path(__file__).resolve().parent
+GROUPS = 200
+NOISE_US = 5.0
+
+
+class VirtualTime:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def populate(shard, n: int, rng: random.Random) -> list[str]:
+    """往分片里灌 n 位合成用户，返回用户 ID 列表"""
+    eggs = list(catalog.eggs().by_id)
+    uids = []
+    for i in range(n):
+        uid = str(100000000 + i)
+        rec = records.UserRecord(favor=rng.randint(0, 5000), marbles=rng.randint(-300, 20000), name=f"群友{i}")
+        if rng.random() < 0.6:
+            rec.collected = records.EGG_IDS.mask_of(rng.sample(eggs, rng.randrange(1, 20)))
+        rec.add_group(f"g{rng.randrange(GROUPS)}")
+        shard.users.put(uid, rec)
+        uids.append(uid)
+    shard.boards = lb_mod.Leaderboards.build(shard.users)
+    return uids
+
+
+def commands(plugin, vt: VirtualTime) -> dict:
+    """指令名 -> (准备函数(user), 调用函数(event))"""
+    def reset(field):
+        return lambda user: setattr(user, field, 0)
+
+    def tick(seconds):
+        def step(_user):
+            vt.now += seconds
+        return step
+
+    keep = lambda _user: None  # noqa: E731
+    return {
+        "签到": (reset("last_sign"), plugin.sign_in),
+        "我还要签到": (reset("last_extra_sign"), lambda ev: main.extra_sign_in(plugin, ev)),
+        "占卜": (reset("last_divine"), plugin.divination),
+        "投喂": (tick(main.FEED_COOLDOWN + 1), plugin.feed_xiaosui),
+        "运势": (tick(60), lambda ev: main.fortune(plugin, ev)),
+        "查看成就": (keep, lambda ev: main.check_achievements(plugin, ev)),
+        "彩蛋掉落": (keep, lambda ev: main.dev_force_egg(plugin, ev)),
+        "群消息": (keep, plugin.passive_egg),
+        "好感榜": (keep, plugin.favor_board),
+    }
+
+
+def summarize(samples: list[float], wall: float) -> dict:
+    samples.sort()
+    return {
+        "p50_us": round(samples[len(samples) // 2] * 1e6, 2),
+        "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6, 2),
+        "ops": round(len(samples) / wall, 1),
+        "n": len(samples),
+    }
+
+
+async def bench_commands(n: int, budget: float, only: set | None, rng: random.Random) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # 指令本身不碰磁盘；用 sqlite 后端只是让收尾落盘只写被改过的行，不必整份重写百万用户。
+        # 合成用户直接放进内存表、不经落盘，所以关掉按需加载（启动耗时见 bench_startup.py）
+        plugin = make_plugin(main, Path(tmp), {"storage_backend": "sqlite", "save_dirty_threshold": 10 ** 9,
+                                               "lazy_load": False})
+        vt = VirtualTime()
+        plugin._limiter = main.RateLimiter(clock=vt)
+        await plugin.initialize()
+        shard = plugin._shards.default
+        uids = populate(shard, n, rng)
+        for name, (prepare, call) in commands(plugin, vt).items():
+            if only and name not in only:
+                continue
+            samples = []
+            wall_start = time.perf_counter()
+            while time.perf_counter() - wall_start < budget or len(samples) < 20:
+                uid = rng.choice(uids)
+                user = shard.users.get(uid)
+                prepare(user)
+                ev = FakeEvent(uid, text=name, group_id=user.groups[0])  # 在用户自己的群里发
+                t0 = time.perf_counter()
+                await collect(call(ev))
+                samples.append(time.perf_counter() - t0)
+            results[name] = summarize(samples, sum(samples))
+        await plugin.terminate()
+    return results
+
+
+async def bench_save(n: int, budget: float, rng: random.Random) -> dict:
+    results = {}
+    for kind in ("json", "sqlite"):
+        with tempfile.TemporaryDirectory() as tmp:
+            plugin = make_plugin(main, Path(tmp), {"storage_backend": kind, "save_dirty_threshold": 10 ** 9,
+                                                   "lazy_load": False})
+            await plugin.initialize()
+            shard = plugin._shards.default
+            uids = populate(shard, n, rng)
+            least = 3 if n <= 100_000 else 1  # 百万用户整份重写一次就要几十秒
+
+            samples = []
+            wall_start = time.perf_counter()
+            while time.perf_counter() - wall_start < budget or len(samples) < least:
+                t0 = time.perf_counter()
+                await shard._flush({None})
+                samples.append(time.perf_counter() - t0)
+            results[f"全量落盘({kind})"] = summarize(samples, sum(samples))
+
+            samples = []
+            wall_start = time.perf_counter()
+            while time.perf_counter() - wall_start < budget or len(samples) < least:
+                uid = rng.choice(uids)
+                shard.users.get(uid).favor += 1
+                t0 = time.perf_counter()
+                await shard._flush({uid})
+                samples.append(time.perf_counter() - t0)
+            results[f"改一人落盘({kind})"] = summarize(samples, sum(samples))
+            await plugin.terminate()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True)
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def load_history(path: Path) -> list[dict]:
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def baseline(history: list[dict], host: str, py: str, size: str, name: str, k: int = 5) -> float | None:
+    vals = [h["results"][size][name]["p50_us"] for h in history
+            if h.get("host") == host and h.get("python") == py and name in h["results"].get(size, {})]
+    return statistics.median(vals[-k:]) if vals else None
+
+
+async def amain(args) -> int:
+    errors = catalog.PACKS.validate_all()  # 预先加载内容包，避免首次解析计入结果
+    if errors:
+        raise SystemExit("\n".join(errors))
+    sizes = [int(s) for s in args.sizes.split(",")]
+    only = set(args.only.split(",")) if args.only else None
+    rng = random.Random(args.seed)
+    host, py = platform.node(), platform.python_version()
+    history_path = Path(args.history)
+    history = load_history(history_path)
+
+    run = {"ts": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+           "host": host, "python": py, "results": {}}
+    regressions = []
+    for n in sizes:
+        res = await bench_commands(n, args.budget, only, rng)
+        if not only or "落盘" in only:
+            res.update(await bench_save(n, args.budget, rng))
+        run["results"][str(n)] = res
+        print(f"\n== {n:,} 位用户 ==")
+        print(f"  {'项目':<14}{'p50(µs)':>12}{'p99(µs)':>12}{'吞吐(次/秒)':>14}{'对比基线':>12}")
+        for name, r in res.items():
+            base = baseline(history, host, py, str(n), name)
+            mark = ""
+            if base:
+                change = r["p50_us"] / base - 1
+                mark = f"{change:+.0%}"
+                if change > args.tolerance and r["p50_us"] - base > NOISE_US:
+                    mark += " ✗"
+                    regressions.append(f"{n} 位用户 / {name}：p50 {base:.1f} → {r['p50_us']:.1f} µs")
+            print(f"  {name:<14}{r['p50_us']:>12.1f}{r['p99_us']:>12.1f}{r['ops']:>14,.0f}{mark:>12}")
+
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run, ensure_ascii=False) + "\n")
+    print(f"\n结果已追加到 {history_path}（提交 {run['commit']}）")
+    if regressions:
+        print("性能回退：")
+        for r in regressions:
+            print("  ✗", r)
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,10000,1000000")
+    ap.add_argument("--budget", type=float, default=0.5, help="每项测量的大致时长（秒）")
+    ap.add_argument("--only", default="", help="只测这些项目，逗号分隔（落盘项用“落盘”）")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--history", default=str(HERE / "results" / "history.jsonl"))
+    ap.add_argument("--tolerance", type=float, default=0.25, help="p50 比基线慢多少算回退")
+    ap.add_argument("--fail-on-regression", action="store_true")
+    sys.exit(asyncio.run(amain(ap.parse_args())))
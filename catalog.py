@@ -0,0 +1,483 @@
+"""
+小碎内容目录
+
+- 内容包（content/ 目录，YAML 或 JSON）：塔罗牌 tarot、投喂 feed、问候语 greetings、彩蛋 eggs、成就 achievements
+  - 第一次用到某个包时才解析，校验通过后构建为元组 / 冻结 dataclass / 只读映射并缓存
+  - 文件 mtime 变化时自动热重载（最多每 check_interval 秒检查一次）；新内容校验失败则继续使用旧版本
+- 规则常量与少量固定文案（占卜费用、投喂冷却、运势、九段运势）直接写在本模块，导入时构建一次
+
+模板占位统一使用 str.format 风格：{name} 昵称，{rank} 今日签到名次；问候语加载时预编译为 templates.Template。
+"""
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable
+
+try:
+    import yaml
+except ImportError:  # 未安装 PyYAML 时只能读取 .json 内容包
+    yaml = None
+
+from astrbot.api import logger
+
+from .templates import Template, TemplateError
+
+
+def _freeze(d: dict) -> MappingProxyType:
+    return MappingProxyType(d)
+
+
+class ContentError(ValueError):
+    """内容包格式或数据有误（缺字段、类型不对、id 重复……）"""
+
+
+# ==== 规则常量 ========================================================
+# 指令与经济模拟（bench/simulate_economy.py）共用这些值，改这里两边一起变；区间均为闭区间
+SIGN_FAVOR_RANGE = (0, 30)    # 签到：好感度
+SIGN_MARBLE_RANGE = (0, 30)   # 签到：玻璃珠
+DIVINE_FEE = 20
+DIVINE_FAVOR_RANGE = (0, 50)  # 占卜：好感度（与牌面无关）
+SSS_BONUS = 999               # 占卜抽到 SSS 牌时以 SSS_BONUS_P 的概率额外给的玻璃珠
+SSS_BONUS_P = 0.10
+MARBLE_CLIP = 266             # 占卜 / 勤勉签到的玻璃珠增减裁切到 ±MARBLE_CLIP
+FEED_COOLDOWN = 180  # 3分钟
+FEED_FAVOR_RANGE = (0, 10)    # 投喂：基础好感度
+SPECIAL_FOOD_RANGE = (5, 20)  # 投喂：吃到特别食物时额外的好感度
+# 连续签到：连续第 N 天（N ≥ 2）起每天额外给 (N-1)*2 颗玻璃珠，封顶 12 颗；每满 7 天再给一次周奖励
+STREAK_DAILY_MARBLES = 2
+STREAK_DAILY_CAP = 12
+STREAK_WEEKLY = (10, 30)  # (好感, 玻璃珠)
+
+
+def streak_bonus(streak: int) -> tuple[int, int]:
+    """连续签到第 streak 天的额外奖励 (好感, 玻璃珠)"""
+    favor, marbles = 0, min(max(streak - 1, 0) * STREAK_DAILY_MARBLES, STREAK_DAILY_CAP)
+    if streak and streak % 7 == 0:
+        favor += STREAK_WEEKLY[0]
+        marbles += STREAK_WEEKLY[1]
+    return favor, marbles
+
+
+# ==== 运势（百分制）===================================================
+
+FORTUNE_MAX = 100              # 运势取 0~FORTUNE_MAX
+FORTUNE_ZERO = (0, 3)          # 运势为 0 时的安慰 (好感, 玻璃珠)
+FORTUNE_HUNDRED = (10, 50)     # 运势满分时的祝福 (好感, 玻璃珠)
+
+FORTUNE_FACES = (
+    "(๑•̀ㅂ•́)و✧", "(つ´ω`)つ", "(*/ω＼*)", "(๑ᵔ⤙ᵔ๑)", "(=^･ω･^=)",
+    "( ੭ ˙ᗜ˙ )੭", "(≧▽≦)/", "ヾ(•ω•`)o", "(｡•̀ᴗ-)✧", "(ง •̀_•́)ง",
+    "(˶ᵔ ᵕ ᵔ˶)", "(•̀ᴗ•́)و ̑̑", "(*´∀`*)", "(｡˃ ᵕ ˂ )b", "(　＾∀＾)",
+)
+FORTUNE_ENCOURAGE = (
+    "低谷是弹射的起点，慢慢来会好起来的～",
+    "别担心，休整一下再出发，风会转向你这边。",
+    "把情绪放下半步，路就会出现。加油！",
+)
+FORTUNE_BLESS = (
+    "愿你所想皆如愿、所行皆坦途！",
+    "万事顺遂，灵感与好运一起到访～",
+    "今天你发光，世界都在为你让路！",
+)
+
+
+# ==== 我还要签到（九段运势，仅玻璃珠）==================================
+
+DILIGENT_LINES = (
+    "今天也是勤勉的一天～",
+    "记录一下扎实的努力！",
+    "稳步前进就是胜利～",
+    "打卡！小目标正在靠近你～",
+    "今天的你也很棒哦~！",
+    "有在认真生活的味道～",
+    "努力被宇宙看见啦！",
+    "悄悄耕耘，静待花开～",
+    "积跬步以至千里！",
+    "继续保持，好状态在线～",
+    "今日功课√ 给自己点个赞！",
+    "进度条+1，能量值+1！",
+    "你在变好，小碎看得见～",
+    "今天也在认真打卡吗~（小碎鼓励的眼神）",
+    "坚持的人自带闪光～",
+)
+
+_LUCK_BLESS = (
+    "🌟 好运加身，今天注定闪闪发光～",
+    "🌟 顺风顺水，连星星都在帮你许愿！",
+    "🌟 阳光正好，心想事成～",
+)
+_LUCK_NEUTRAL = (
+    "🧭 平稳是另一种幸福，慢慢走也能到达。",
+    "🧭 不焦不躁，保持节奏就是好兆头。",
+    "🧭 静水流深，平日的积累最可贵。",
+)
+_LUCK_ENCOURAGE = (
+    "🛡️ 乌云只是暂时的，下一刻就是晴天。",
+    "🛡️ 先休息一下，明天会更顺。",
+    "🛡️ 困难是运气积蓄的前奏，撑一撑就见光。",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class LuckLevel:
+    name: str
+    desc: str
+    marbles: tuple[int, int]
+    moods: tuple[str, ...]
+
+
+LUCK_LEVELS = (
+    LuckLevel("大吉", "群星加护", (180, 266), _LUCK_BLESS),
+    LuckLevel("吉", "好运相随", (120, 200), _LUCK_BLESS),
+    LuckLevel("中吉", "顺水顺心", (80, 160), _LUCK_BLESS),
+    LuckLevel("小吉", "稳步向前", (40, 100), _LUCK_BLESS),
+    LuckLevel("平", "风平浪静", (0, 60), _LUCK_NEUTRAL),
+    LuckLevel("小凶", "略有波折", (-20, 20), _LUCK_ENCOURAGE),
+    LuckLevel("中凶", "阴云未散", (-60, 0), _LUCK_ENCOURAGE),
+    LuckLevel("凶", "注意节奏", (-120, -40), _LUCK_ENCOURAGE),
+    LuckLevel("大凶", "谨慎行事", (-200, -100), _LUCK_ENCOURAGE),
+)
+
+
+# ==== 内容包数据结构 ==================================================
+@dataclass(frozen=True, slots=True)
+class TarotFace:
+    core: str
+    rating: str
+    keywords: tuple[str, ...]
+    interp: str
+    keywords_line: str  # 展示用：前 6 个关键词以顿号连接，加载时拼好
+
+
+@dataclass(frozen=True, slots=True)
+class TarotCard:
+    name: str
+    upright: TarotFace
+    reversed: TarotFace
+
+
+@dataclass(frozen=True, slots=True)
+class TarotPack:
+    cards: tuple[TarotCard, ...]
+    rating_word: MappingProxyType   # 等级 -> 形容词
+    marble_range: MappingProxyType  # 等级 -> (最小, 最大)，最终会裁切到 ±266
+    moods: MappingProxyType         # 等级 -> 祝福/提醒/安慰文案
+
+
+@dataclass(frozen=True, slots=True)
+class Food:
+    text: str
+    special: bool
+
+
+@dataclass(frozen=True, slots=True)
+class FeedPack:
+    foods: tuple[Food, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class GreetingPack:
+    hello: tuple[Template, ...]
+    sign_in: MappingProxyType  # 时间段 -> Template 元组
+
+
+@dataclass(frozen=True, slots=True)
+class Egg:
+    id: str
+    title: str
+    body: str
+    favor: int
+    marbles: int
+    tier: str  # normal / rare / ultra / special
+
+
+TIERS = ("normal", "rare", "ultra", "special")
+TIER_TAG = _freeze({
+    "normal": "普通彩蛋",
+    "rare": "稀有彩蛋",
+    "ultra": "超稀有彩蛋",
+    "special": "特别彩蛋",
+})
+MYTHIC_EGG_ID = "u00"  # 传说彩蛋（最难）
+
+
+@dataclass(frozen=True, slots=True)
+class EggPack:
+    normal: tuple[Egg, ...]
+    rare: tuple[Egg, ...]
+    ultra: tuple[Egg, ...]
+    special: tuple[Egg, ...]
+    by_id: MappingProxyType
+
+    @property
+    def total(self) -> int:
+        return len(self.by_id)
+
+    @property
+    def total_special(self) -> int:
+        return len(self.special)
+
+
+# 成就可依赖的计数器；从用户记录读值的函数登记在 achieve.COUNTERS
+ACHIEVEMENT_COUNTERS = ("collected", "special", "favor", "marbles", "streak")
+
+
+@dataclass(frozen=True, slots=True)
+class Achievement:
+    key: str
+    counter: str  # collected / special：已收集（特别）彩蛋数；favor / marbles：当前好感度 / 玻璃珠；streak：连续签到天数
+    threshold: int
+    favor: int
+    marbles: int
+    title: str
+    exclaim: str = ""  # 非空时用更激动的恭喜语
+
+
+@dataclass(frozen=True, slots=True)
+class AchievementPack:
+    items: tuple[Achievement, ...]
+    by_key: MappingProxyType
+
+
+# ==== 校验与构建 ======================================================
+def _need(obj: dict, key: str, typ: type | tuple, where: str) -> Any:
+    if not isinstance(obj, dict) or key not in obj:
+        raise ContentError(f"{where} 缺少字段 {key}")
+    val = obj[key]
+    if typ is int and isinstance(val, bool) or not isinstance(val, typ):
+        raise ContentError(f"{where}.{key} 类型错误：{val!r}")
+    return val
+
+
+def _strings(val: Any, where: str) -> tuple[str, ...]:
+    if not isinstance(val, list) or not val or not all(isinstance(x, str) for x in val):
+        raise ContentError(f"{where} 必须是非空字符串列表")
+    return tuple(val)
+
+
+def _templates(val: Any, where: str, allowed: set[str], cache: int = 0) -> tuple[Template, ...]:
+    out = []
+    for i, src in enumerate(_strings(val, where)):
+        try:
+            t = Template(src, cache)
+        except TemplateError as e:
+            raise ContentError(f"{where}[{i}] {e}") from None
+        unknown = set(t.fields) - allowed
+        if unknown:
+            raise ContentError(f"{where}[{i}] 含未知占位符：{'、'.join(sorted(unknown))}")
+        out.append(t)
+    return tuple(out)
+
+
+def _range(val: Any, where: str) -> tuple[int, int]:
+    if not (isinstance(val, list) and len(val) == 2 and all(isinstance(x, int) for x in val) and val[0] <= val[1]):
+        raise ContentError(f"{where} 必须是 [最小, 最大] 整数区间")
+    return val[0], val[1]
+
+
+def _build_tarot(raw: dict) -> TarotPack:
+    ratings = _need(raw, "ratings", dict, "tarot")
+    moods_raw = _need(raw, "moods", dict, "tarot")
+    moods = {k: _strings(v, f"tarot.moods.{k}") for k, v in moods_raw.items()}
+    rating_word, marble_range, rating_mood = {}, {}, {}
+    for r, spec in ratings.items():
+        rating_word[r] = _need(spec, "word", str, f"tarot.ratings.{r}")
+        marble_range[r] = _range(_need(spec, "marbles", list, f"tarot.ratings.{r}"), f"tarot.ratings.{r}.marbles")
+        mood = _need(spec, "mood", str, f"tarot.ratings.{r}")
+        if mood not in moods:
+            raise ContentError(f"tarot.ratings.{r}.mood 未定义：{mood}")
+        rating_mood[r] = moods[mood]
+
+    def face(obj: dict, where: str) -> TarotFace:
+        rating = _need(obj, "rating", str, where)
+        if rating not in ratings:
+            raise ContentError(f"{where}.rating 未定义：{rating}")
+        keywords = _strings(_need(obj, "keywords", list, where), f"{where}.keywords")
+        return TarotFace(
+            _need(obj, "core", str, where), rating, keywords,
+            _need(obj, "interp", str, where), "、".join(keywords[:6]),
+        )
+
+    cards, seen = [], set()
+    for i, c in enumerate(_need(raw, "cards", list, "tarot")):
+        name = _need(c, "name", str, f"tarot.cards[{i}]")
+        if name in seen:
+            raise ContentError(f"tarot 牌名重复：{name}")
+        seen.add(name)
+        cards.append(TarotCard(name, face(c.get("upright"), f"tarot.{name}.upright"),
+                               face(c.get("reversed"), f"tarot.{name}.reversed")))
+    if not cards:
+        raise ContentError("tarot.cards 不能为空")
+    return TarotPack(tuple(cards), _freeze(rating_word), _freeze(marble_range), _freeze(rating_mood))
+
+
+def _build_feed(raw: dict) -> FeedPack:
+    foods = []
+    for i, f in enumerate(_need(raw, "foods", list, "feed")):
+        foods.append(Food(_need(f, "text", str, f"feed.foods[{i}]"), bool(f.get("special", False))))
+    if not foods:
+        raise ContentError("feed.foods 不能为空")
+    return FeedPack(tuple(foods))
+
+
+def _build_greetings(raw: dict) -> GreetingPack:
+    sign_in = _need(raw, "sign_in", dict, "greetings")
+    periods = ("morning", "noon", "afternoon", "evening", "midnight")
+    missing = [p for p in periods if p not in sign_in]
+    if missing:
+        raise ContentError(f"greetings.sign_in 缺少时间段：{'、'.join(missing)}")
+    return GreetingPack(
+        _templates(_need(raw, "hello", list, "greetings"), "greetings.hello", {"name"}),
+        _freeze({p: _templates(sign_in[p], f"greetings.sign_in.{p}", {"name", "rank"}) for p in periods}),
+    )
+
+
+def _build_eggs(raw: dict) -> EggPack:
+    tiers, by_id = {}, {}
+    for tier in TIERS:
+        eggs = []
+        for i, e in enumerate(_need(raw, tier, list, "eggs")):
+            where = f"eggs.{tier}[{i}]"
+            egg = Egg(
+                _need(e, "id", str, where), _need(e, "title", str, where), _need(e, "body", str, where),
+                _need(e, "favor", int, where), _need(e, "marbles", int, where), tier,
+            )
+            if egg.id in by_id:
+                raise ContentError(f"彩蛋 id 重复：{egg.id}（{where}）")
+            by_id[egg.id] = egg
+            eggs.append(egg)
+        tiers[tier] = tuple(eggs)
+    if MYTHIC_EGG_ID not in by_id:
+        raise ContentError(f"缺少传说彩蛋 {MYTHIC_EGG_ID}")
+    return EggPack(by_id=_freeze(by_id), **tiers)
+
+
+def _build_achievements(raw: dict) -> AchievementPack:
+    items, by_key = [], {}
+    for i, a in enumerate(_need(raw, "achievements", list, "achievements")):
+        where = f"achievements[{i}]"
+        ach = Achievement(
+            _need(a, "key", str, where), _need(a, "counter", str, where), _need(a, "threshold", int, where),
+            _need(a, "favor", int, where), _need(a, "marbles", int, where), _need(a, "title", str, where),
+            str(a.get("exclaim", "")),
+        )
+        if ach.counter not in ACHIEVEMENT_COUNTERS:
+            raise ContentError(f"{where}.counter 未知：{ach.counter}")
+        if ach.key in by_key:
+            raise ContentError(f"成就 key 重复：{ach.key}")
+        by_key[ach.key] = ach
+        items.append(ach)
+    return AchievementPack(tuple(items), _freeze(by_key))
+
+
+BUILDERS: dict[str, Callable[[dict], Any]] = {
+    "tarot": _build_tarot,
+    "feed": _build_feed,
+    "greetings": _build_greetings,
+    "eggs": _build_eggs,
+    "achievements": _build_achievements,
+}
+
+
+# ==== 懒加载 + 热重载 =================================================
+class ContentPacks:
+    """
+    get(name) 返回构建好的内容包：
+    - 首次访问才读文件并校验（启动时不解析任何包）
+    - 之后每 check_interval 秒最多 stat 一次；mtime 变化则重载
+    - 重载失败时记录错误并继续使用旧版本（同一版文件只记一次，文件再改过才重试）；首次加载失败则抛 ContentError
+    """
+
+    SUFFIXES = (".yaml", ".yml", ".json")
+
+    def __init__(self, root: Path, check_interval: float = 2.0):
+        self.root = root
+        self.check_interval = check_interval
+        # name -> [pack, mtime_ns, 下次检查时间, 上次重载失败的 mtime_ns]
+        self._cache: dict[str, list] = {}
+
+    def _find(self, name: str) -> Path:
+        for suffix in self.SUFFIXES:
+            path = self.root / f"{name}{suffix}"
+            if path.exists():
+                return path
+        raise ContentError(f"找不到内容包 {name}（{self.root}）")
+
+    def _parse(self, path: Path) -> dict:
+        text = path.read_text(encoding="utf-8")
+        if path.suffix == ".json":
+            data = json.loads(text)
+        else:
+            if yaml is None:
+                raise ContentError(f"读取 {path.name} 需要安装 PyYAML")
+            data = yaml.safe_load(text)
+        if not isinstance(data, dict):
+            raise ContentError(f"{path.name} 顶层必须是映射")
+        return data
+
+    def load(self, name: str) -> Any:
+        """强制重新读取并校验；成功后替换缓存"""
+        path = self._find(name)
+        mtime = path.stat().st_mtime_ns
+        try:
+            pack = BUILDERS[name](self._parse(path))
+        except ContentError:
+            raise
+        except Exception as e:
+            raise ContentError(f"{path.name} 解析失败：{e}") from e
+        self._cache[name] = [pack, mtime, time.monotonic() + self.check_interval, False]
+        return pack
+
+    def get(self, name: str) -> Any:
+        entry = self._cache.get(name)
+        if entry is None:
+            return self.load(name)
+        now = time.monotonic()
+        if now >= entry[2]:
+            entry[2] = now + self.check_interval
+            mtime = None
+            try:
+                mtime = self._find(name).stat().st_mtime_ns
+                if mtime != entry[1] and mtime != entry[3]:
+                    return self.load(name)
+            except Exception as e:
+                if mtime != entry[3]:  # 文件找不到时 mtime 为 None，同样只记一次
+                    logger.error(f"内容包 {name} 热重载失败，继续使用旧版本：{e}")
+                entry[3] = mtime
+        return entry[0]
+
+    def validate_all(self) -> list[str]:
+        """逐个校验全部内容包，返回错误信息列表（空列表表示全部通过）"""
+        errors = []
+        for name in BUILDERS:
+            try:
+                self.load(name)
+            except ContentError as e:
+                errors.append(str(e))
+        return errors
+
+
+CONTENT_DIR = Path(__file__).parent / "content"
+PACKS = ContentPacks(CONTENT_DIR)
+
+
+def tarot() -> TarotPack:
+    return PACKS.get("tarot")
+
+
+def feed() -> FeedPack:
+    return PACKS.get("feed")
+
+
+def greetings() -> GreetingPack:
+    return PACKS.get("greetings")
+
+
+def eggs() -> EggPack:
+    return PACKS.get("eggs")
+
+
+def achievements() -> AchievementPack:
+    return PACKS.get("achievements")
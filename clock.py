@@ -0,0 +1,93 @@
+"""
+每日重置时钟
+
+- today：当前“签到日”的日序号（date.toordinal()），today_iso 是同一天的 'YYYY-MM-DD'；
+  指令直接读这两个预先算好的值，不再每次 datetime.now() + 格式化字符串
+- 一天从配置时区的 reset_hour 点开始（默认 0 点、系统本地时区）；例如 reset_hour=4 时，凌晨 3 点仍算前一天
+- 后台任务最多每 60 秒醒一次重新计算（系统休眠、夏令时跳变都能自动纠正），跨过重置时刻时翻页，
+  并按注册顺序执行每日任务（清空签到名次、账本写快照等），这些工作不再挤在指令路径上
+"""
+import asyncio
+from datetime import date, datetime, time as dtime, timedelta, tzinfo
+from typing import Callable
+
+from astrbot.api import logger
+
+from .records import day_iso
+
+_MAX_SLEEP = 60.0
+
+
+def _load_tz(name: str | None) -> tzinfo | None:
+    """时区名 → tzinfo；为空或系统缺少时区数据时用本地时间"""
+    if not name:
+        return None
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except Exception as e:
+        logger.warning(f"时区 {name} 不可用，改用系统本地时间：{e}")
+        return None
+
+
+class DayClock:
+    def __init__(self, reset_hour: int = 0, tz: str | None = None):
+        self.reset_hour = int(reset_hour) % 24
+        self.tz = _load_tz(tz)
+        self._jobs: list[Callable[[int], None]] = []
+        self._task: asyncio.Task | None = None
+        self._closed = False
+        self.today = self.compute()
+        self.today_iso = day_iso(self.today)
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def compute(self, now: datetime | None = None) -> int:
+        """now 所在签到日的日序号（重置时刻之前算前一天）"""
+        now = now or self.now()
+        return (now - timedelta(hours=self.reset_hour)).date().toordinal()
+
+    def seconds_to_next(self, now: datetime | None = None) -> float:
+        now = now or self.now()
+        boundary = datetime.combine(date.fromordinal(self.compute(now) + 1), dtime(self.reset_hour), tzinfo=now.tzinfo)
+        return max(0.0, (boundary - now).total_seconds())
+
+    def on_rollover(self, job: Callable[[int], None]) -> None:
+        """注册每日任务：翻页时以新的日序号调用"""
+        self._jobs.append(job)
+
+    def tick(self, now: datetime | None = None) -> bool:
+        """重新计算今天；跨日时翻页并执行每日任务，返回是否翻页"""
+        day = self.compute(now)
+        if day == self.today:
+            return False
+        self.today, self.today_iso = day, day_iso(day)
+        logger.info(f"小碎：进入新的一天 {self.today_iso}")
+        for job in self._jobs:
+            try:
+                job(day)
+            except Exception as e:
+                logger.error(f"每日任务执行失败：{e}")
+        return True
+
+    def start(self) -> None:
+        if self._task is None:
+            self.tick()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._closed:
+            # 多睡 0.05 秒，醒来时一定已跨过重置时刻
+            await asyncio.sleep(min(_MAX_SLEEP, self.seconds_to_next() + 0.05))
+            self.tick()
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
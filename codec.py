@@ -0,0 +1,34 @@
+"""
+JSON 编解码（存档、账本、快照共用）
+
+- 装了 orjson 用 orjson，其次 msgspec，都没有时用标准库 json；三者输出的都是标准 JSON，读写可以混用
+- dumps 一律输出紧凑格式（无缩进、无多余空格）的 UTF-8 字节，中文不转义；旧版带缩进的存档照常读取
+"""
+import json
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+try:
+    import msgspec as _msgspec
+except ImportError:
+    _msgspec = None
+
+if _orjson is not None:
+    NAME = "orjson"
+    dumps = _orjson.dumps
+    loads = _orjson.loads
+elif _msgspec is not None:
+    NAME = "msgspec"
+    dumps = _msgspec.json.encode
+    loads = _msgspec.json.decode
+else:
+    NAME = "json"
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data: bytes | str):
+        return json.loads(data)
@@ -0,0 +1,118 @@
+"""
+彩蛋掉落引擎
+
+- 每个彩蛋的位号由 records.EGG_IDS 分配，与用户记录里的收集位集共用同一套位号，掉落时无需转换
+- 各稀有度的“全部彩蛋”也是位集；“可掉落” = 稀有度位集 & ~已拥有，O(1) 位运算，无需每次过滤列表
+- 稀有度权重（普通 82% / 稀有 17% / 超稀有 1%）预先建成 Vose 别名表，一次均匀随机数即可抽中稀有度
+- 某稀有度已集齐时按 普通 → 稀有 → 超稀有 的顺序直接检查下一个位集回落，不再重新扫描列表
+- 内容包热重载后会得到新的 EggPack，get_engine() 发现包变了就重建引擎（位号不变，用户位集照常可用）
+"""
+import random as _random
+from dataclasses import dataclass
+
+from .catalog import EggPack, Egg, TIER_TAG, MYTHIC_EGG_ID
+from .records import EGG_IDS
+
+SPECIAL_P = 0.10                   # 特别彩蛋：每次独立判定
+MYTHIC_P = 0.005                   # 传说彩蛋：基础掉落命中后再独立判定
+INTERACTION_P = 0.20               # 互动指令基础掉落概率
+MESSAGE_P = 0.05                   # 普通群消息基础掉落概率
+TIER_WEIGHTS = (("normal", 0.82), ("rare", 0.17), ("ultra", 0.01))
+FALLBACK_ORDER = ("normal", "rare", "ultra")
+
+
+def build_alias(weights: list[float]) -> tuple[list[float], list[int]]:
+    """Vose 别名法：返回 (prob, alias)，抽样 O(1)"""
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights]
+    prob, alias = [0.0] * n, [0] * n
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], l
+        scaled[l] -= 1.0 - scaled[s]
+        (small if scaled[l] < 1.0 else large).append(l)
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
+
+
+def nth_set_bit(mask: int, n: int) -> int:
+    """mask 中第 n 个（从 0 数）为 1 的位的下标"""
+    while n:
+        mask &= mask - 1
+        n -= 1
+    return (mask & -mask).bit_length() - 1
+
+
+@dataclass(slots=True)
+class Drop:
+    egg: Egg
+    tag: str
+
+
+class DropEngine:
+    def __init__(self, pack: EggPack):
+        self.pack = pack
+        self.eggs: tuple[Egg, ...] = pack.normal + pack.rare + pack.ultra + pack.special
+        self.by_pos: dict[int, Egg] = {EGG_IDS.intern(e.id): e for e in self.eggs}
+        self.tier_mask: dict[str, int] = {}
+        for i, e in self.by_pos.items():
+            self.tier_mask[e.tier] = self.tier_mask.get(e.tier, 0) | (1 << i)
+        self.mythic_bit = EGG_IDS.bit(MYTHIC_EGG_ID)
+        self._tiers = [t for t, _ in TIER_WEIGHTS]
+        self._prob, self._alias = build_alias([w for _, w in TIER_WEIGHTS])
+
+    def mask_of(self, egg_ids) -> int:
+        """egg_id 列表 → 位集（与 UserRecord.collected 同一套位号）"""
+        return EGG_IDS.mask_of(egg_ids)
+
+    def _pick(self, avail: int, rng) -> Egg:
+        return self.by_pos[nth_set_bit(avail, rng.randrange(avail.bit_count()))]
+
+    def _tier(self, u: float) -> str:
+        x = u * len(self._tiers)
+        i = int(x)
+        return self._tiers[i] if x - i < self._prob[i] else self._tiers[self._alias[i]]
+
+    def roll(self, owned: int, is_interaction: bool, rng=_random, gated: bool = False) -> Drop | None:
+        """
+        一次掉落判定（概率与旧版一致）：
+        1) 特别彩蛋 10% 独立判定（已集齐则继续）
+        2) 基础掉落：互动 20% / 普通消息 5%（gated=True 表示调用方已做过这一步，跳过）
+        3) 传说彩蛋 0.5% 独立判定（未获得时）
+        4) 别名表抽稀有度，已集齐则按顺序回落
+        """
+        if rng.random() < SPECIAL_P:
+            avail = self.tier_mask.get("special", 0) & ~owned
+            if avail:
+                return Drop(self._pick(avail, rng), TIER_TAG["special"])
+
+        if not gated and rng.random() >= (INTERACTION_P if is_interaction else MESSAGE_P):
+            return None
+
+        if not owned & self.mythic_bit and rng.random() < MYTHIC_P:
+            return Drop(self.by_pos[self.mythic_bit.bit_length() - 1], TIER_TAG["ultra"])
+
+        tier = self._tier(rng.random())
+        avail = self.tier_mask.get(tier, 0) & ~owned
+        if not avail:
+            for tier in FALLBACK_ORDER:
+                avail = self.tier_mask.get(tier, 0) & ~owned
+                if avail:
+                    break
+            else:
+                return None  # 全部收集完毕则不给重复
+        return Drop(self._pick(avail, rng), TIER_TAG[tier])
+
+
+_engine: DropEngine | None = None
+
+
+def get_engine(pack: EggPack) -> DropEngine:
+    global _engine
+    if _engine is None or _engine.pack is not pack:
+        _engine = DropEngine(pack)
+    return _engine
@@ -0,0 +1,135 @@
+"""
+落盘安全：校验和、轮换备份、目录 fsync（预写日志见 journal.py）
+
+- 校验：JSON 存档开头嵌一段 {"_checksum":"<sha256>", …}，校验的是去掉这一段之后的正文；
+  文件仍是合法 JSON，旧版没有校验段的存档照常读取（视为未校验）
+- 轮换：每次整份重写存档前，把当前文件留作 .1（原 .1 顺延为 .2，依此类推，保留 keep 份）
+- 每日备份：每日任务把存档复制到 backups/<名称>-<日期>.<后缀>，旁边写一份 .sha256，保留最近 days 份；
+  json / sqlite 都适用（sqlite 用在线备份 API 复制）
+"""
+import hashlib
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Callable
+
+_SEAL_HEAD = b'{"_checksum":"'
+_SEAL_LEN = len(_SEAL_HEAD) + 64 + 2  # 头 + sha256 十六进制 + '",'
+
+
+class StateCorrupt(Exception):
+    """存档（及其全部备份）都无法通过校验"""
+
+
+def seal(body: bytes) -> bytes:
+    """给一段 JSON 对象（以 { 开头）加上校验段；空对象不加"""
+    if body == b"{}":
+        return body
+    digest = hashlib.sha256(body).hexdigest().encode("ascii")
+    return _SEAL_HEAD + digest + b'",' + body[1:]
+
+
+def unseal(data: bytes) -> bytes:
+    """校验并去掉校验段，返回正文；没有校验段的旧文件原样返回；不一致时抛 StateCorrupt"""
+    if not data.startswith(_SEAL_HEAD):
+        return data
+    digest = data[len(_SEAL_HEAD):_SEAL_LEN - 2]
+    body = b"{" + data[_SEAL_LEN:]
+    if hashlib.sha256(body).hexdigest().encode("ascii") != digest:
+        raise StateCorrupt("校验和不一致")
+    return body
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fsync_dir(path: Path) -> None:
+    """让目录项（rename / 新建 / 删除）也落盘；Windows 上打不开目录，跳过"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def generation(path: Path, i: int) -> Path:
+    return path.with_name(f"{path.name}.{i}")
+
+
+def rotate_generations(path: Path, keep: int) -> None:
+    """当前文件留作 .1，原有的 .1..keep-1 顺延；用硬链接保留 .1，当前文件始终在原处"""
+    if keep <= 0 or not path.exists():
+        return
+    for i in range(keep - 1, 0, -1):
+        src = generation(path, i)
+        if src.exists():
+            os.replace(src, generation(path, i + 1))
+    first = generation(path, 1)
+    try:
+        os.link(path, first)
+    except OSError:  # 文件系统不支持硬链接
+        shutil.copy2(path, first)
+
+
+def quarantine(path: Path) -> Path:
+    """把损坏的文件改名挪开（不删除，留给人工检查）"""
+    dest = path.with_name(f"{path.name}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}")
+    os.replace(path, dest)
+    return dest
+
+
+# ---- 每日备份 ----
+def backup_dir(data_dir: Path) -> Path:
+    return data_dir / "backups"
+
+
+def daily_backup_path(data_dir: Path, name: str, day: str) -> Path:
+    """形如 backups/xiaosui_state-2024-01-01.json"""
+    stem, suffix = name.rsplit(".", 1)
+    return backup_dir(data_dir) / f"{stem}-{day}.{suffix}"
+
+
+def write_daily_backup(copy_fn: Callable[[Path], None], data_dir: Path, name: str, day: str, days: int) -> Path:
+    """
+    copy_fn(dest) 把当前存档写到 dest；随后写 dest.sha256，并只保留最近 days 份同名备份
+    """
+    root = backup_dir(data_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    dest = daily_backup_path(data_dir, name, day)
+    tmp = dest.with_name(dest.name + ".tmp")
+    copy_fn(tmp)
+    os.replace(tmp, dest)
+    dest.with_name(dest.name + ".sha256").write_text(file_digest(dest), encoding="ascii")
+    fsync_dir(root)
+    for old in daily_backups(data_dir, name)[days:]:
+        old.unlink(missing_ok=True)
+        old.with_name(old.name + ".sha256").unlink(missing_ok=True)
+    return dest
+
+
+def daily_backups(data_dir: Path, name: str) -> list[Path]:
+    """同名存档的每日备份，新的在前"""
+    stem, suffix = name.rsplit(".", 1)
+    root = backup_dir(data_dir)
+    if not root.exists():
+        return []
+    return sorted(root.glob(f"{stem}-????-??-??.{suffix}"), reverse=True)
+
+
+def verify_backup(path: Path) -> bool:
+    side = path.with_name(path.name + ".sha256")
+    try:
+        return side.read_text(encoding="ascii").strip() == file_digest(path)
+    except OSError:
+        return False
@@ -0,0 +1,75 @@
+"""
+用户身份解析（带记忆）
+
+- 同一个事件只解析一次：结果挂在事件对象上
+- 按适配器事件类型记住“哪个取值方式能用”，之后同类型事件直接调用，不再逐个 getattr/try 试探
+- 都拿不到时退回 name::昵称（is_fallback=True），由插件负责之后合并到真实 ID
+"""
+from typing import Callable
+
+FALLBACK_PREFIX = "name::"
+_CACHE_ATTR = "_xiaosui_uid"
+
+
+def _method(name: str) -> Callable:
+    def probe(event):
+        fn = getattr(event, name, None)
+        return fn() if callable(fn) else None
+    return probe
+
+
+def _sender_attr(name: str) -> Callable:
+    def probe(event):
+        sender = getattr(event, "sender", None)
+        return getattr(sender, name, None) if sender is not None else None
+    return probe
+
+
+# 与旧版 _get_user_id 的试探顺序一致
+PROBES: tuple[Callable, ...] = (
+    _method("get_sender_id"),
+    _method("get_user_id"),
+    _method("get_sender_qq"),
+    _sender_attr("id"),
+    _sender_attr("user_id"),
+)
+
+
+class IdentityResolver:
+    def __init__(self):
+        # 事件类型 -> 学到的取值方式（None 表示该类型拿不到真实 ID）
+        self._learned: dict[type, Callable | None] = {}
+
+    def resolve(self, event) -> tuple[str, bool]:
+        """返回 (user_id, 是否为昵称兜底)"""
+        cached = getattr(event, _CACHE_ATTR, None)
+        if cached is not None:
+            return cached
+        result = self._resolve(event)
+        try:
+            setattr(event, _CACHE_ATTR, result)
+        except Exception:
+            pass  # 事件对象不允许挂属性时，只是少了单事件缓存
+        return result
+
+    def _resolve(self, event) -> tuple[str, bool]:
+        cls = type(event)
+        probe = self._learned.get(cls)
+        if probe is not None:
+            uid = _try(probe, event)
+            if uid:
+                return uid, False
+        for probe in PROBES:
+            uid = _try(probe, event)
+            if uid:
+                self._learned[cls] = probe
+                return uid, False
+        return f"{FALLBACK_PREFIX}{event.get_sender_name()}", True
+
+
+def _try(probe: Callable, event) -> str | None:
+    try:
+        uid = probe(event)
+    except Exception:
+        return None
+    return str(uid) if uid else None
@@ -0,0 +1,228 @@
+"""
+预写日志（journal）：两次落盘之间的修改先记在这里，崩溃重启时重放
+
+- 每行一条：8 位十六进制 CRC32 + 空格 + JSON 数组 [序号, 类型, …]，序号在分片内单调递增（跨重启延续）
+  - ["u", uid, user_dict | None, egg_dict | None]：用户记录的最新值（都为 None 表示已删除）
+  - ["s", key, value]：顶层状态键（别名表等）的最新值
+  - ["l", ts, uid, 来源, 好感变动, 玻璃珠变动]：一笔流水；序号同时写进账本行，据此判断账本里是否已有
+- 组提交：指令只 touch() 记下改了谁，不做 IO；后台每 interval 秒在事件循环上把这批用户导出成行，
+  交给 IO 线程一次写入并 fsync（多条指令共用一次 fsync；崩溃最多丢最近 interval 秒）
+- 分段：<分片目录>/journal/<段号>.log。每轮落盘开始时 cut() 切到新段，返回已覆盖到的序号，
+  存档（带 journal_seq）写成功后 release() 删掉旧段；落盘失败则旧段保留，下次启动照样重放。
+  retain > 0 时多留最近 retain 轮的段：当前存档损坏、退回 .1..retain 历史版本时，重放这些段也能补齐
+- since_backup=True（sqlite：库没有历史版本，损坏时只能退回每日备份）时改为保留最近一次每日备份以来的全部段：
+  备份写完后 backup_done() 记下当时的段号，release() 不删它之后的段；启动时已有的段一律当作备份以来的。
+  这些段反正要留到下次备份，cut() 不再每轮切段，只在当前段写满 SEGMENT_BYTES 或备份过后才切，
+  一天下来只有寥寥几个段（而不是每轮落盘一个小文件），启动时要打开的文件也就这几个
+- 启动：读完存档后 read() 读出所有段里完好的行（遇到崩溃时写了一半的行即停），由分片按序号重放
+"""
+import asyncio
+import os
+import zlib
+from pathlib import Path
+from typing import Callable
+
+from astrbot.api import logger
+
+from . import codec
+from .durability import fsync_dir
+from .storage import run_io
+
+SEGMENT_BYTES = 8 << 20  # since_backup 时单个段写到这么大才切新段
+
+
+def encode_line(entry: list) -> bytes:
+    body = codec.dumps(entry)
+    return b"%08x " % zlib.crc32(body) + body + b"\n"
+
+
+def decode_line(raw: bytes) -> list | None:
+    """校验不过（含没写完的半行）时返回 None"""
+    if not raw.endswith(b"\n") or len(raw) < 10 or raw[8:9] != b" ":
+        return None
+    body = raw[9:-1]
+    try:
+        if int(raw[:8], 16) != zlib.crc32(body):
+            return None
+        return codec.loads(body)
+    except ValueError:
+        return None
+
+
+class Journal:
+    """
+    export_user(uid) -> (user_dict | None, egg_dict | None)、export_state(key) -> value 由分片提供，
+    在事件循环上调用（导出的是调用那一刻的值，同一用户在一批里只写一行）。
+    """
+
+    def __init__(self, data_dir: Path, export_user: Callable, export_state: Callable, interval: float = 0.5,
+                 retain: int = 0, since_backup: bool = False):
+        self.dir = data_dir / "journal"
+        self.interval = max(0.01, float(interval))
+        self.retain = max(0, int(retain))
+        self.since_backup = since_backup
+        self._export_user = export_user
+        self._export_state = export_state
+        self.seq = 0
+        self._seg = 0
+        self._users: dict[str, None] = {}   # 待导出的用户（保持 touch 的先后顺序）
+        self._keys: set[str] = set()        # 待导出的顶层状态键
+        self._buf: list[tuple[int, bytes]] = []  # (段号, 行)
+        self._cuts: list[int] = []               # 最近几轮成功落盘时切出的段号
+        self._backup_seg = 0                     # since_backup 时：最近一次每日备份之后的第一个段号
+        self._seg_bytes = 0                      # 当前段已编码的字节数（含还在缓冲里的）
+        self._rotate = False                     # since_backup 时：下次 cut() 必须切段（刚做完备份）
+        self._lock = asyncio.Lock()
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._closed = False
+
+    def _seg_path(self, seg: int) -> Path:
+        return self.dir / f"{seg:08d}.log"
+
+    def segments(self) -> list[Path]:
+        return sorted(self.dir.glob("*.log")) if self.dir.exists() else []
+
+    # ---- 启动（阻塞，在 IO 线程里调用）----
+    def read(self) -> list[list]:
+        """读出全部段里完好的条目，并把段号接到最后一段之后"""
+        entries = []
+        segs = self.segments()
+        for path in segs:
+            with open(path, "rb") as f:
+                for raw in f:
+                    entry = decode_line(raw)
+                    if entry is None:
+                        logger.warning(f"journal {path.name} 末尾有写了一半的行，其后的内容已忽略")
+                        break
+                    entries.append(entry)
+                else:
+                    continue
+            break
+        if segs:
+            self._seg = int(segs[-1].stem) + 1
+            # 不知道上次备份在哪一段：已有的段都留到下一次备份
+            self._backup_seg = int(segs[0].stem)
+        return entries
+
+    # ---- 运行时（事件循环上）----
+    def touch(self, user_id: str) -> None:
+        self._users[user_id] = None
+
+    def touch_state(self, key: str) -> None:
+        self._keys.add(key)
+
+    def append(self, kind: str, *payload) -> int:
+        """立即编码一条（流水用：它本身不可合并），返回序号"""
+        self.seq += 1
+        line = encode_line([self.seq, kind, *payload])
+        self._buf.append((self._seg, line))
+        self._seg_bytes += len(line)
+        return self.seq
+
+    def _materialize(self) -> None:
+        users, self._users = self._users, {}
+        keys, self._keys = self._keys, set()
+        for uid in users:
+            self.append("u", uid, *self._export_user(uid))
+        for key in sorted(keys):
+            self.append("s", key, self._export_state(key))
+
+    def cut(self) -> int:
+        """
+        把待导出的修改编成行，之后的条目写进新段；返回切段前的最大序号（本轮存档覆盖到这里）。
+        since_backup 时当前段没写满、也没做过备份就接着写：段里混有存档已覆盖的条目无妨，重放时按序号跳过
+        """
+        self._materialize()
+        if not self.since_backup or self._rotate or self._seg_bytes >= SEGMENT_BYTES:
+            self._seg += 1
+            self._seg_bytes = 0
+            self._rotate = False
+        return self.seq
+
+    @property
+    def pending(self) -> int:
+        return len(self._users) + len(self._keys) + len(self._buf)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"写 journal 失败：{e}")
+
+    async def sync(self) -> None:
+        """把这段时间的修改写进段文件并 fsync（一批一次）；失败时这批留在缓冲里下次再写"""
+        async with self._lock:
+            self._materialize()
+            if not self._buf:
+                return
+            buf, self._buf = self._buf, []
+            try:
+                await run_io(self._write, buf)
+            except Exception:
+                self._buf = buf + self._buf
+                raise
+
+    def _write(self, buf: list[tuple[int, bytes]]) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        by_seg: dict[int, list[bytes]] = {}
+        for seg, line in buf:
+            by_seg.setdefault(seg, []).append(line)
+        created = False
+        for seg, lines in sorted(by_seg.items()):
+            path = self._seg_path(seg)
+            created |= not path.exists()
+            with open(path, "ab") as f:
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+        if created:
+            fsync_dir(self.dir)
+
+    def backup_done(self) -> None:
+        """
+        每日备份已写完（它覆盖到最近一次 cut() 为止）：since_backup 时此前的段下次 release() 可以删了。
+        当前段可能还混着备份之前的条目，留着，下次 cut() 切新段，到下一次备份时连它一起删
+        """
+        self._backup_seg = self._seg
+        self._rotate = True
+
+    async def release(self) -> None:
+        """存档已覆盖 cut() 之前的条目：删掉 retain 轮以前的段（缓冲里还没写出去的旧段条目一并丢掉）"""
+        async with self._lock:
+            self._cuts = (self._cuts + [self._seg])[-(self.retain + 1):]
+            floor = self._cuts[0]
+            if self.since_backup:
+                floor = min(floor, self._backup_seg)
+            self._buf = [(seg, line) for seg, line in self._buf if seg >= floor]
+            old = [p for p in self.segments() if int(p.stem) < floor]
+            if old:
+                await run_io(self._remove, old)
+
+    def _remove(self, paths: list[Path]) -> None:
+        for p in paths:
+            p.unlink(missing_ok=True)
+        fsync_dir(self.dir)
+
+    async def close(self) -> None:
+        """停止后台任务；剩下的修改由随后的最后一次落盘写进存档，这里仍先写一遍以防落盘失败"""
+        self._closed = True
+        if self._task is not None:
+            self._wake.set()
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"journal 任务异常退出：{e}")
+            self._task = None
+        await self.sync()
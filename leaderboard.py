@@ -0,0 +1,203 @@
+"""
+排行榜（好感 / 玻璃珠 / 彩蛋数）
+
+- 每个榜是一条升序的有序索引，元素是一个 int：(-分数) << 32 | 用户序号，头部就是第一名，取前 N 名不需要排序；
+  用 int 而不是 (分数, user_id) 元组，二分时每次比较快得多，也更省内存。同分按用户首次入榜的先后排
+- 有序索引按块存放（每块不超过 2*LOAD 条，另存每块最大值）：定位用二分 O(log n)，
+  插入/删除只移动一个块内的元素，10 万人时单次更新仍是微秒级
+- 每位用户的当前分数缓存在 _scores 里；余额或彩蛋变化时只对变了的那几个榜做“删旧 + 插新”
+- 范围：全服一份，另外每个群一份（用户在哪些群出现过记在 UserRecord.groups）
+- 按需加载的分片（见 records.LazyUserTable）在后台用 build_from 从数据库逐行建榜，不建完整用户记录；
+  建榜期间先用一份空榜接住修改，touched 记下动过的用户，建完后按这些用户的当前记录对一遍
+"""
+from bisect import bisect_left, insort
+from itertools import islice
+
+from .records import UserRecord, UserTable, Interner
+
+METRICS = ("favor", "marbles", "eggs")
+GLOBAL = None  # 全服榜的 scope
+_SHIFT = 32
+_LOW = (1 << _SHIFT) - 1
+
+
+def scores_of(rec: UserRecord) -> tuple[int, int, int]:
+    return rec.favor, rec.marbles, rec.collected.bit_count()
+
+
+class SortedIndex:
+    """分块有序列表（只存可比较的元素，这里是编码后的 int）"""
+
+    LOAD = 512
+
+    def __init__(self, items=()):
+        items = sorted(items)
+        self._chunks: list[list] = [items[i:i + self.LOAD] for i in range(0, len(items), self.LOAD)]
+        self._maxes: list = [c[-1] for c in self._chunks]
+        self._len = len(items)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, item) -> None:
+        if not self._chunks:
+            self._chunks.append([item])
+            self._maxes.append(item)
+            self._len = 1
+            return
+        i = bisect_left(self._maxes, item)
+        if i == len(self._maxes):
+            i -= 1
+            chunk = self._chunks[i]
+            chunk.append(item)
+            self._maxes[i] = item
+        else:
+            chunk = self._chunks[i]
+            insort(chunk, item)
+        self._len += 1
+        if len(chunk) > 2 * self.LOAD:
+            self._chunks[i:i + 1] = [chunk[:self.LOAD], chunk[self.LOAD:]]
+            self._maxes[i:i + 1] = [chunk[self.LOAD - 1], chunk[-1]]
+
+    def remove(self, item) -> None:
+        i = bisect_left(self._maxes, item)
+        if i == len(self._maxes):
+            raise KeyError(item)
+        chunk = self._chunks[i]
+        j = bisect_left(chunk, item)
+        if j == len(chunk) or chunk[j] != item:
+            raise KeyError(item)
+        del chunk[j]
+        self._len -= 1
+        if chunk:
+            self._maxes[i] = chunk[-1]
+        else:
+            del self._chunks[i], self._maxes[i]
+
+    def index(self, item) -> int:
+        """item 的位置（从 0 数）；不在索引里时抛 ValueError。前面的块只数长度，不逐个比较"""
+        i = bisect_left(self._maxes, item)
+        if i < len(self._maxes):
+            chunk = self._chunks[i]
+            j = bisect_left(chunk, item)
+            if j < len(chunk) and chunk[j] == item:
+                return sum(len(c) for c in self._chunks[:i]) + j
+        raise ValueError(item)
+
+    def head(self, n: int) -> list:
+        return list(islice((x for c in self._chunks for x in c), n))
+
+
+class Leaderboards:
+    def __init__(self):
+        self._boards: dict[tuple, SortedIndex] = {}             # (metric, scope) -> 有序索引
+        self._scores: dict[str, tuple[int, int, int]] = {}      # user_id -> 当前分数
+        self._ids = Interner()                                  # user_id <-> 用户序号
+        self.touched: set[str] | None = None                    # 不为 None 时记下 update/join/discard 过的用户
+
+    def _key(self, score: int, user_id: str) -> int:
+        return (-score << _SHIFT) | self._ids.intern(user_id)
+
+    def _decode(self, key: int) -> tuple[int, str]:
+        return -(key >> _SHIFT), self._ids.name(key & _LOW)
+
+    @classmethod
+    def build(cls, users: UserTable) -> "Leaderboards":
+        """启动时一次性建榜（每个榜排序一次）"""
+        return cls.build_from((uid, *scores_of(rec), rec.groups) for uid, rec in users.items())[0]
+
+    @classmethod
+    def build_from(cls, rows) -> tuple["Leaderboards", dict[str, tuple]]:
+        """
+        从 (user_id, 好感, 玻璃珠, 彩蛋数, 群列表) 逐行建榜（每个榜排序一次），
+        返回 (榜, user_id → 群列表)，后者只含有群的用户，供 forget 用
+        """
+        lb = cls()
+        buckets: dict = {}  # scope -> 每个指标一个列表
+        groups_of: dict[str, tuple] = {}
+        intern = lb._ids.intern
+        for uid, favor, marbles, eggs, groups in rows:
+            lb._scores[uid] = (favor, marbles, eggs)
+            no = intern(uid)
+            if groups:
+                groups_of[uid] = groups = tuple(groups)
+            for scope in (GLOBAL, *(groups or ())):
+                lists = buckets.get(scope)
+                if lists is None:
+                    lists = buckets[scope] = ([], [], [])
+                lists[0].append((-favor << _SHIFT) | no)
+                lists[1].append((-marbles << _SHIFT) | no)
+                lists[2].append((-eggs << _SHIFT) | no)
+        lb._boards = {(metric, scope): SortedIndex(items)
+                      for scope, lists in buckets.items() for metric, items in zip(METRICS, lists)}
+        return lb, groups_of
+
+    def _board(self, metric: str, scope) -> SortedIndex:
+        board = self._boards.get((metric, scope))
+        if board is None:
+            board = self._boards[(metric, scope)] = SortedIndex()
+        return board
+
+    def update(self, user_id: str, rec: UserRecord) -> None:
+        """用户余额/彩蛋变化后调用；分数没变就什么都不做"""
+        if self.touched is not None:
+            self.touched.add(user_id)
+        new = scores_of(rec)
+        old = self._scores.get(user_id)
+        if old == new:
+            return
+        self._scores[user_id] = new
+        no = self._ids.intern(user_id)
+        changed = [k for k in range(len(METRICS)) if old is None or old[k] != new[k]]
+        for scope in (GLOBAL, *(rec.groups or ())):
+            for k in changed:
+                board = self._board(METRICS[k], scope)
+                if old is not None:
+                    board.remove((-old[k] << _SHIFT) | no)
+                board.add((-new[k] << _SHIFT) | no)
+
+    def join(self, user_id: str, group: str, rec: UserRecord) -> None:
+        """用户第一次在某个群出现：调用方先把 group 记进 rec.groups，再把当前分数放进该群的榜"""
+        if self.touched is not None:
+            self.touched.add(user_id)
+        if user_id not in self._scores:
+            self.update(user_id, rec)  # 连同新群一起入榜
+            return
+        for metric, score in zip(METRICS, self._scores[user_id]):
+            self._board(metric, group).add(self._key(score, user_id))
+
+    def discard(self, user_id: str, rec: UserRecord) -> None:
+        """用户记录被移除（如昵称兜底记录合并）时从所有榜删除"""
+        if self.touched is not None:
+            self.touched.add(user_id)
+        self.forget(user_id, rec.groups)
+
+    def forget(self, user_id: str, groups) -> None:
+        """从全服榜与 groups 这些群的榜删除该用户"""
+        old = self._scores.pop(user_id, None)
+        if old is None:
+            return
+        for scope in (GLOBAL, *(groups or ())):
+            for metric, score in zip(METRICS, old):
+                self._board(metric, scope).remove(self._key(score, user_id))
+
+    def top(self, metric: str, scope=GLOBAL, n: int = 10) -> list[tuple[int, str]]:
+        """前 n 名 [(分数, user_id)]"""
+        board = self._boards.get((metric, scope))
+        return [self._decode(key) for key in board.head(n)] if board else []
+
+    def rank(self, metric: str, user_id: str, scope=GLOBAL) -> tuple[int, int] | None:
+        """(名次（从 1 数）, 榜上人数)；不在榜上时为 None"""
+        scores = self._scores.get(user_id)
+        board = self._boards.get((metric, scope))
+        if scores is None or board is None:
+            return None
+        try:
+            pos = board.index(self._key(scores[METRICS.index(metric)], user_id))
+        except ValueError:
+            return None  # 不在这个群的榜上
+        return pos + 1, len(board)
+
+    def size(self, metric: str, scope=GLOBAL) -> int:
+        board = self._boards.get((metric, scope))
+        return len(board) if board else 0
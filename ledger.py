@@ -0,0 +1,219 @@
+"""
+好感度 / 玻璃珠流水账本（只追加）
+
+- 每笔变动记一行 JSONL：[时间戳, user_id, 来源指令, 好感变动, 玻璃珠变动, journal 序号]
+  （开启 journal 时才有第 6 列，旧账本只有前 5 列；读取方一律按 e[:5] 取）
+- 变动先进内存缓冲，随状态落盘一起批量追加到 data/ledger.jsonl（只写新增部分，远比整份重写便宜）
+- 内存里维护 user_id → 该用户各条流水在文件中的字节偏移，查询某人最近流水时直接 seek，不扫全文件
+- 每追加 snapshot_every 条写一次快照（各用户按账本累计的余额 + 偏移索引 + 已覆盖的文件长度）；
+  启动时读快照，只重放快照之后的尾部
+- 用户第一次出现在账本里时先记一笔“期初”余额，保证按账本累计的余额能与当前存档核对
+- 落盘分三步，文件读写都在 IO 线程里：drain() 在事件循环上把缓冲编码成字节并返回写入函数，
+  写完后 commit() 更新偏移索引（写失败则 abort() 把这批流水放回缓冲）；快照同理，由 snapshot_job() 返回写入函数
+- 流水同时记进分片的 journal（见 journal.py）；崩溃后 replay() 把账本里还没有的（序号大于 seq 的）补回缓冲
+"""
+import os
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable
+
+from . import codec
+from .storage import atomic_write_bytes
+
+OPENING = "期初"
+
+
+class Ledger:
+    def __init__(self, data_dir: Path, snapshot_every: int = 10000):
+        self.path = data_dir / "ledger.jsonl"
+        self.snapshot_path = data_dir / "ledger.snapshot.json"
+        self.snapshot_every = snapshot_every
+        self._balances: dict[str, list[int]] = {}  # uid -> [好感, 玻璃珠]（按账本累计）
+        self._index: dict[str, array] = {}         # uid -> 各条流水的字节偏移
+        self._pending: list[list] = []             # 尚未落盘的流水
+        self._inflight: list[list] = []            # 已交给 IO 线程、还没确认写完的流水
+        self._inflight_pos: list[int] = []         # 这批流水在文件中的偏移
+        self._inflight_end = 0                     # 这批写完后的文件长度
+        self._size = 0                             # 账本文件已写入长度
+        self._since_snapshot = 0
+        self._want_snapshot = False
+        self.journal = None                        # 分片的 Journal；为 None 时不记
+        self.seq = 0                               # 已落盘流水里最大的 journal 序号
+
+    # ---- 启动：快照 + 重放尾部 ----
+    def load(self) -> int:
+        """读快照并重放其后的流水，返回重放条数（阻塞，在 IO 线程里调用）"""
+        offset = 0
+        if self.snapshot_path.exists():
+            snap = codec.loads(self.snapshot_path.read_bytes())
+            offset = snap["offset"]
+            self.seq = snap.get("seq", 0)
+            self._balances = {uid: list(b) for uid, b in snap["balances"].items()}
+            self._index = {uid: array("q", offs) for uid, offs in snap["index"].items()}
+        if not self.path.exists():
+            self._size = 0
+            return 0
+        replayed = 0
+        with open(self.path, "rb+") as f:
+            f.seek(offset)
+            pos = offset
+            for raw in f:
+                try:
+                    if not raw.endswith(b"\n"):
+                        raise ValueError("半行")
+                    e = codec.loads(raw)
+                    uid, df, dm = e[1], e[3], e[4]
+                except (ValueError, IndexError, TypeError):
+                    # 崩溃时写了一半的最后一行：截掉，后面的都不可信
+                    f.truncate(pos)
+                    break
+                self._apply(uid, df, dm, pos)
+                if len(e) > 5:
+                    self.seq = e[5]
+                pos += len(raw)
+                replayed += 1
+            self._size = pos
+        self._since_snapshot = replayed
+        return replayed
+
+    def _apply(self, uid: str, df: int, dm: int, pos: int) -> None:
+        bal = self._balances.setdefault(uid, [0, 0])
+        bal[0] += df
+        bal[1] += dm
+        self._index.setdefault(uid, array("q")).append(pos)
+
+    # ---- 记账 ----
+    def record(self, user_id: str, user, source: str, favor: int = 0, marbles: int = 0) -> None:
+        """
+        记一笔变动（调用时 user 里的余额尚未加上本次变动；user 为 records.UserRecord）。
+        用户首次入账时先补一笔期初余额。
+        """
+        now = int(time.time())
+        if user_id not in self._balances:
+            self._balances[user_id] = [0, 0]
+            opening = (user.favor, user.marbles)
+            if opening != (0, 0):
+                self._add([now, user_id, OPENING, *opening])
+        self._add([now, user_id, source, favor, marbles])
+
+    def _add(self, entry: list) -> None:
+        if self.journal is not None:
+            entry.append(self.journal.append("l", *entry))
+        self._pending.append(entry)
+        self._bump(entry[1], entry[3], entry[4])
+
+    def replay(self, entry: list) -> bool:
+        """崩溃恢复：journal 里的一笔流水 [ts, uid, 来源, 好感, 玻璃珠, 序号]，账本里还没有就补进缓冲"""
+        if entry[5] <= self.seq:
+            return False
+        self._balances.setdefault(entry[1], [0, 0])
+        self._pending.append(entry)
+        self._bump(entry[1], entry[3], entry[4])
+        return True
+
+    def _bump(self, uid: str, df: int, dm: int) -> None:
+        # 换一个新列表而不是原地加：快照只浅复制余额表，旧列表留给正在写的快照
+        bal = self._balances[uid]
+        self._balances[uid] = [bal[0] + df, bal[1] + dm]
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def snapshot_due(self) -> bool:
+        return self._want_snapshot or self._since_snapshot >= self.snapshot_every
+
+    def request_snapshot(self) -> None:
+        """下一次落盘时顺带写快照（每日任务用）"""
+        self._want_snapshot = True
+
+    def drain(self) -> Callable[[], int] | None:
+        """
+        把缓冲的流水编码成要追加的字节，返回在 IO 线程里执行的写入函数（返回写入字节数）；没有流水时为 None。
+        写完后须调用 commit()，失败则调用 abort()；两次 drain 之间不能交错。
+        """
+        if not self._pending:
+            return None
+        entries, self._pending = self._pending, []
+        chunks = []
+        positions = []
+        pos = start = self._size
+        for e in entries:
+            line = codec.dumps(e) + b"\n"
+            positions.append(pos)
+            chunks.append(line)
+            pos += len(line)
+        self._inflight, self._inflight_pos, self._inflight_end = entries, positions, pos
+        data = b"".join(chunks)
+        path = self.path
+
+        def write() -> int:
+            with open(path, "ab") as f:
+                if f.tell() > start:
+                    f.truncate(start)  # 上次写失败留下的半截
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())  # 随后 journal 会删掉这批流水，账本必须先落到磁盘
+            return len(data)
+        return write
+
+    def commit(self) -> None:
+        for e, pos in zip(self._inflight, self._inflight_pos):
+            self._index.setdefault(e[1], array("q")).append(pos)
+        if self._inflight:
+            self._size = self._inflight_end
+            if len(self._inflight[-1]) > 5:
+                self.seq = self._inflight[-1][5]
+        self._since_snapshot += len(self._inflight)
+        self._inflight, self._inflight_pos = [], []
+
+    def abort(self) -> None:
+        self._pending = self._inflight + self._pending
+        self._inflight, self._inflight_pos = [], []
+
+    def snapshot_job(self) -> Callable[[], None]:
+        """
+        快照只覆盖已落盘的部分（缓冲中的流水下次重放时自然补上）。
+        事件循环上只浅复制余额表与索引表；各用户的偏移数组在 IO 线程里按已落盘长度截断后再写出。
+        """
+        offset, seq = self._size, self.seq
+        balances = self._balances_on_disk()
+        index = dict(self._index)
+        path = self.snapshot_path
+        self._since_snapshot = 0
+        self._want_snapshot = False
+
+        def write() -> None:
+            out = {}
+            for uid, offs in index.items():
+                offs = offs.tolist()
+                out[uid] = offs[:bisect_left(offs, offset)]
+            atomic_write_bytes(path, codec.dumps({"offset": offset, "seq": seq, "balances": balances, "index": out}))
+        return write
+
+    def _balances_on_disk(self) -> dict[str, list[int]]:
+        balances = dict(self._balances)
+        for e in self._inflight + self._pending:
+            uid, df, dm = e[1], e[3], e[4]
+            bal = balances[uid]
+            balances[uid] = [bal[0] - df, bal[1] - dm]
+        return balances
+
+    # ---- 查询 ----
+    def balance(self, user_id: str) -> tuple[int, int] | None:
+        bal = self._balances.get(user_id)
+        return (bal[0], bal[1]) if bal else None
+
+    def history(self, user_id: str, limit: int = 10) -> list[list]:
+        """某用户最近 limit 条流水（新的在前），按偏移索引直接 seek"""
+        out = [e for e in reversed(self._inflight + self._pending) if e[1] == user_id][:limit]
+        offs = self._index.get(user_id)
+        if offs and len(out) < limit and self.path.exists():
+            with open(self.path, "rb") as f:
+                for pos in reversed(offs[-(limit - len(out)):]):
+                    f.seek(pos)
+                    out.append(codec.loads(f.readline()))
+        return out
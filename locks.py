@@ -0,0 +1,52 @@
+"""
+按 key（通常是 user_id）划分的 asyncio 锁
+
+- 同一用户的指令串行执行，不同用户互不阻塞（不会把整个插件锁在一把全局锁后面）
+- 锁在第一次使用时才创建；空闲超过 idle_ttl 秒且无人持有/等待的锁会被批量清理
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+
+class KeyedLocks:
+    def __init__(self, idle_ttl: float = 300.0, sweep_every: int = 1024):
+        self.idle_ttl = idle_ttl
+        self.sweep_every = sweep_every
+        # key -> [lock, 持有+等待数, 最后释放时间]
+        self._entries: dict[Hashable, list] = {}
+        self._ops = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def held(self, key: Hashable) -> bool:
+        """有指令正持有或等待这把锁"""
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] > 0
+
+    @asynccontextmanager
+    async def lock(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [asyncio.Lock(), 0, 0.0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            entry[2] = time.monotonic()
+            self._ops += 1
+            if self._ops >= self.sweep_every:
+                self.sweep()
+
+    def sweep(self, now: float | None = None) -> int:
+        """清理空闲锁，返回清理数量"""
+        self._ops = 0
+        now = time.monotonic() if now is None else now
+        idle = [k for k, (_, refs, last) in self._entries.items() if refs == 0 and now - last >= self.idle_ttl]
+        for k in idle:
+            del self._entries[k]
+        return len(idle)
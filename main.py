@@ -1,63 +1,253 @@
 from astrbot.api.event import filter, AstrMessageEvent, MessageEventResult
 from astrbot.api.star import Context, Star, register
-from astrbot.api import logger
+from astrbot.api import logger, AstrBotConfig
 
-import random
-import json
+import functools
+import time
+from calendar import monthrange
 from pathlib import Path
-from datetime import datetime
+from datetime import date, datetime
+
+from .catalog import (
+    DIVINE_FEE, FEED_COOLDOWN, FORTUNE_FACES, FORTUNE_ENCOURAGE, FORTUNE_BLESS,
+    DILIGENT_LINES, LUCK_LEVELS, TIER_TAG, Egg,
+    SIGN_FAVOR_RANGE, SIGN_MARBLE_RANGE, DIVINE_FAVOR_RANGE, SSS_BONUS, SSS_BONUS_P, MARBLE_CLIP,
+    FEED_FAVOR_RANGE, SPECIAL_FOOD_RANGE, FORTUNE_MAX, FORTUNE_ZERO, FORTUNE_HUNDRED,
+    tarot, feed, greetings, eggs, achievements, streak_bonus,
+)
+from .locks import KeyedLocks
+from .drops import get_engine, MESSAGE_P
+from .achieve import get_engine as get_achievement_engine
+from .identity import IdentityResolver, FALLBACK_PREFIX
+from .records import UserRecord, EGG_IDS, ACH_IDS, SIGN_WINDOW
+from .leaderboard import GLOBAL
+from .shards import Shard, ShardManager
+from .clock import DayClock
+from .ratelimit import Limit, RateLimiter
+from .rng import RngService, BACKEND as RNG_BACKEND
+from .metrics import Metrics, TextfileExporter
+from .templates import bag, SIGN_IN_DONE, SIGN_IN_OK, SIGN_IN_STREAK, DIVINE_DONE, DIVINE_RESULT
+
+
+def metered(handler):
+    """
+    记录指令耗时与异常（xiaosui_command_seconds / xiaosui_command_errors_total），放在 filter.command 紧下面。
+    只累计处理函数自己运行的时间：yield 出去等框架发送回复的那段不算。
+    包装本身是普通函数：指标关闭时直接返回原处理函数的异步生成器，不多套一层生成器。
+    """
+    command = handler.__name__
+
+    async def timed(self, event: AstrMessageEvent, args, kwargs):
+        m = self._metrics
+        busy = 0.0
+        t0 = time.perf_counter()
+        try:
+            async for res in handler(self, event, *args, **kwargs):
+                busy += time.perf_counter() - t0
+                yield res
+                t0 = time.perf_counter()
+        except Exception:
+            m.command_errors.inc((command,))
+            raise
+        busy += time.perf_counter() - t0
+        m.command_seconds.observe((command,), busy)
+
+    @functools.wraps(handler)
+    def wrapper(self, event: AstrMessageEvent, *args, **kwargs):
+        if not self._metrics.enabled:
+            return handler(self, event, *args, **kwargs)
+        return timed(self, event, args, kwargs)
+    return wrapper
+
+
+def user_locked(handler):
+    """
+    会修改状态的指令：按用户加锁，同一用户的指令串行执行（含后续的彩蛋掉落）。
+    取到锁之后才合并昵称兜底记录（_merge_fallback），限流检查只解析 ID、不改状态。
+    指令前后各读一次彩蛋以外的成就计数器（见 achieve.py），变了的才交给成就引擎判定，新达成的成就随后回复
+    """
+    @functools.wraps(handler)
+    async def wrapper(self, event: AstrMessageEvent, *args, **kwargs):
+        shard = self._shard(event)
+        user_id = self._get_user_id(event)
+        async with self._locks.lock(user_id):
+            await shard.prefetch(user_id)  # 按需加载：记录不在内存里时同样在 IO 线程里取
+            await self._merge_fallback(event, user_id)
+            self._note_member(event, user_id)
+            engine = get_achievement_engine(achievements())
+            if not engine.polled:
+                async for res in handler(self, event, *args, **kwargs):
+                    yield res
+                return
+            before = engine.read(shard.users.get(user_id))
+            async for res in handler(self, event, *args, **kwargs):
+                yield res
+            user = shard.users.get(user_id)
+            changed = engine.changed(before, engine.read(user)) if user is not None else None
+            if changed:
+                msgs = _check_and_award_achievements(self, shard, event.get_sender_name(), user_id, user, changed)
+                if msgs:
+                    shard.save(user_id)
+                    yield event.plain_result("\n".join(msgs))
+    return wrapper
+
+
+def rate_limited(*limits: Limit, on_limited=None):
+    """
+    声明指令的冷却/限流（见 ratelimit.py）：全部限制都通过才执行；不通过时一个令牌都不扣。
+    on_limited(self, event, wait) 返回被拦下时的回复文本；不给则静默丢弃（防刷屏的限制不再回一句刷屏）。
+    放在 user_locked 外层：被拦下的请求不排队等锁。
+    """
+    def decorate(handler):
+        command = handler.__name__
+
+        @functools.wraps(handler)
+        async def wrapper(self, event: AstrMessageEvent, *args, **kwargs):
+            wait = self._limiter.hit(command, limits, self._get_user_id(event), self._group_of(event))
+            if wait:
+                if self._metrics.enabled:
+                    self._metrics.rate_limited.inc((command,))
+                if on_limited is not None:
+                    yield event.plain_result(on_limited(self, event, wait))
+                return
+            async for res in handler(self, event, *args, **kwargs):
+                yield res
+        return wrapper
+    return decorate
+
+
+def _feed_wait_text(self, event: AstrMessageEvent, wait: float) -> str:
+    user = self._shard(event).users.get(self._get_user_id(event))
+    mm, ss = divmod(max(1, round(wait)), 60)
+    wait_str = f"{mm}分{ss}秒" if mm else f"{ss}秒"
+    return (
+        f"⌛ {event.get_sender_name()}，小碎还在消化中～请再等 {wait_str} 再投喂。\n"
+        f"💗 当前好感度：{user.favor if user else 0}"
+    )
+
+
+# 排行榜：指标 -> (图标, 榜名, 单位)
+BOARD_LABELS = {
+    "favor": ("💗", "好感榜", "好感度"),
+    "marbles": ("🫧", "玻璃珠榜", "玻璃珠"),
+    "eggs": ("🥚", "彩蛋榜", "已收集彩蛋"),
+}
+
 
 @register("helloworld", "YourName", "一个简单的 Hello World 插件", "1.0.0")
 class MyPlugin(Star):
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, config: AstrBotConfig | None = None):
         super().__init__(context)
-        # 数据持久化文件：插件同目录 data/xiaosui_state.json
+        self._config = config or {}
+        # 数据持久化目录：插件同目录 data/
+        #   - json 后端：data/xiaosui_state.json（默认，兼容旧数据）
+        #   - sqlite 后端：data/xiaosui_state.db（首次启用自动从 json 迁移）
+        #   - 开启 shard_by_group 时各群的今日签到顺序单独一份：data/groups/<群号>/（见 shards.py）
         self._data_dir = Path(__file__).parent / "data"
-        self._data_path = self._data_dir / "xiaosui_state.json"
-        self._state = {"users": {}}  # { user_id: {"favor": int, "marbles": int, "last_sign": "YYYY-MM-DD"} }
+        # 运行指标（见 metrics.py）：/小碎状态 查看；配置了 metrics_textfile 时定期导出 Prometheus 文本
+        self._metrics = Metrics(bool(self._config.get("metrics_enabled", True)))
+        # 每日重置时钟：today 为预先算好的日序号，在配置时区的 reset_hour 点翻页并执行每日任务
+        self._clock = DayClock(self._config.get("reset_hour", 0), self._config.get("timezone") or None)
+        # 按用户划分的指令锁（懒创建，空闲自动清理）
+        self._locks = KeyedLocks()
+        # 状态分片：每个分片自带用户记录、签到顺序、排行榜、流水账本与后台落盘；
+        # 按需加载时正在执行指令（持有用户锁）的用户记录不淘汰
+        self._shards = ShardManager(self._data_dir, self._config, self._clock, self._metrics, self._locks.held)
+        # 指令冷却/限流：内存里的令牌桶，过期的桶由时间轮批量清除，不进存档
+        self._limiter = RateLimiter()
+        # 随机数服务：每位用户一条随机流；配置 rng_seed 时结果可复现（见 rng.py）
+        self._rng = RngService(self._config.get("rng_seed") or None)
+        # 用户身份解析：按适配器类型记住可用的取值方式
+        self._identity = IdentityResolver()
+        # 群消息被动彩蛋开关
+        self._passive_egg = bool(self._config.get("passive_egg", True))
+        # 仪表与文本导出（metrics_textfile 为相对路径时相对于 data/）
+        self._register_gauges()
+        textfile = self._config.get("metrics_textfile") or ""
+        self._exporter = TextfileExporter(
+            self._metrics, self._data_dir / textfile, self._config.get("metrics_export_interval", 15),
+        ) if textfile and self._metrics.enabled else None
+
+    def _register_gauges(self):
+        """仪表在导出时现取：已加载分片的用户数、存档大小、待落盘修改数，以及锁、随机流、令牌桶的常驻数量"""
+        g = self._metrics.gauge
+        g("xiaosui_users", "已加载分片中的用户数", lambda: sum(len(s.users) for s in self._shards))
+        g("xiaosui_users_cached", "按需加载时内存里的用户记录数",
+          lambda: sum(s.users.resident for s in self._shards if s.users.lazy))
+        g("xiaosui_shards_loaded", "已加载的分片数", lambda: len(self._shards))
+        g("xiaosui_state_file_bytes", "已加载分片的存档文件大小（sqlite 含 -wal）",
+          lambda: sum(s.state_bytes() for s in self._shards))
+        g("xiaosui_dirty_pending", "缓存中等待落盘的修改数", lambda: sum(s.persist.dirty for s in self._shards))
+        g("xiaosui_user_locks", "常驻的用户锁", lambda: len(self._locks))
+        g("xiaosui_rng_streams", "常驻的用户随机流", lambda: len(self._rng))
+        g("xiaosui_rate_buckets", "常驻的令牌桶", lambda: len(self._limiter))
 
     async def initialize(self):
         """可选择实现异步的插件初始化方法，当实例化该插件类之后会自动调用该方法。"""
-        try:
-            self._data_dir.mkdir(parents=True, exist_ok=True)
-            if self._data_path.exists():
-                self._state = json.loads(self._data_path.read_text(encoding="utf-8"))
-                if "users" not in self._state:
-                    self._state["users"] = {}
-            logger.info("小碎数据已加载")
-        except Exception as e:
-            logger.error(f"加载数据失败：{e}")
-
-    def _save_state(self):
-        try:
-            self._data_path.write_text(json.dumps(self._state, ensure_ascii=False, indent=2), encoding="utf-8")
-        except Exception as e:
-            logger.error(f"保存数据失败：{e}")
+        # 加载默认分片；分群模式下群分片在第一次收到该群消息时才加载
+        await self._shards.start()
+        self._clock.on_rollover(self._shards.rollover)
+        self._clock.start()
+        logger.info(f"小碎随机数种子：{self._rng.seed}（{RNG_BACKEND}）")
+        if self._exporter is not None:
+            self._exporter.start()
+
+    async def terminate(self):
+        """可选择实现异步的插件销毁方法，当插件被卸载/停用时会调用。"""
+        # 停止时钟与各分片的后台落盘任务，并保证最后一次刷盘
+        await self._clock.close()
+        await self._shards.close()
+        if self._exporter is not None:
+            await self._exporter.close()
+
+    def _shard(self, event: AstrMessageEvent) -> Shard:
+        """用户数据（余额、彩蛋、成就、账本、排行榜）所在的分片：总是默认分片，按群分开存储时也一样"""
+        return self._shards.default
+
+    async def _signin_index(self, event: AstrMessageEvent) -> Shard:
+        """存放本群今日签到顺序的分片：分群时是该群的分片（没加载时在 IO 线程里加载），否则是默认分片"""
+        return await self._shards.ensure(self._shards.key_of(self._group_of(event)))
+
+    def _note_member(self, event: AstrMessageEvent, user_id: str):
+        """记下用户出现过的群（加入该群排行榜）与当前昵称"""
+        self._shard(event).note_member(user_id, self._group_of(event), event.get_sender_name())
+
+    @staticmethod
+    def _group_of(event: AstrMessageEvent) -> str | None:
+        """群号；私聊或适配器不提供时为 None"""
+        get_group = getattr(event, "get_group_id", None)
+        group = get_group() if callable(get_group) else None
+        return str(group) if group else None
 
     def _get_user_id(self, event: AstrMessageEvent) -> str:
-        """尽量稳妥地拿一个用户唯一标识"""
-        for getter in ("get_sender_id", "get_user_id", "get_sender_qq"):
-            fn = getattr(event, getter, None)
-            if callable(fn):
-                try:
-                    uid = fn()
-                    if uid:
-                        return str(uid)
-                except Exception:
-                    pass
-        try:
-            sender = getattr(event, "sender", None)
-            if sender and hasattr(sender, "id"):
-                return str(sender.id)
-            if sender and hasattr(sender, "user_id"):
-                return str(sender.user_id)
-        except Exception:
-            pass
-        return f"name::{event.get_sender_name()}"
+        """
+        尽量稳妥地拿一个用户唯一标识（同一事件只解析一次，按适配器类型记住可用的取值方式）。
+        拿不到真实 ID 时用 name::昵称 兜底（已合并过的兜底换成真实 ID）。只读，不改状态：限流检查也在用
+        """
+        uid, is_fallback = self._identity.resolve(event)
+        if is_fallback:
+            return self._shard(event).state.get("aliases", {}).get(uid, uid)
+        return uid
+
+    async def _merge_fallback(self, event: AstrMessageEvent, user_id: str) -> None:
+        """
+        须在持有 user_id 的用户锁时调用：该昵称的 name::昵称 兜底记录第一次遇到真实 ID 时，把兜底记录合并过去。
+        每个 ID 每天只查一次（alias_checked 在每日翻页时清空）
+        """
+        shard = self._shard(event)
+        if user_id in shard.alias_checked or user_id.startswith(FALLBACK_PREFIX):
+            return
+        shard.alias_checked.add(user_id)
+        alias = f"{FALLBACK_PREFIX}{event.get_sender_name()}"
+        if alias in shard.state.get("aliases", {}):
+            return
+        await shard.prefetch(alias)
+        if alias in shard.users:
+            shard.merge_alias(alias, user_id)
 
     def _time_period(self, now: datetime | None = None) -> str:
         """按小时划分时间段：早上/中午/下午/晚上/半夜"""
-        h = (now or datetime.now()).hour
+        h = (now or self._clock.now()).hour
         if 5 <= h <= 10:
             return "morning"
         if 11 <= h <= 13:
@@ -71,6 +261,8 @@ class MyPlugin(Star):
 
     # ---- 已有指令：小碎（保留随机多语气） ----
     @filter.command("小碎")
+    @metered
+    @rate_limited(Limit(3, 20), Limit(10, 6, "group"))
     async def helloworld(self, event: AstrMessageEvent):
         """这是一个 hello world 指令"""
         user_name = event.get_sender_name()
@@ -78,115 +270,214 @@ class MyPlugin(Star):
         message_chain = event.get_messages()  # 用户所发的消息的消息链
         logger.info(message_chain)
 
-        replies = [
-            f"你好呀，{user_name}，小碎在这里～",
-            f"{user_name}，找我有什么事吗？",
-            f"在呢在呢～{user_name}，小碎随时待命！",
-            f"怎么了吗？",
-            f"我在(*'▽'*)♪",
-            f"嗨——"
-        ]
-        yield event.plain_result(random.choice(replies))
+        # 先选模板，只渲染被选中的那一条
+        yield event.plain_result(self._rng.shared.choice(greetings().hello).render(name=user_name))
+
+    # ---- 被动彩蛋：群内任意消息 5% 掉落 ----
+    @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    async def passive_egg(self, event: AstrMessageEvent):
+        """群内任意消息的彩蛋入口；95% 的消息在第一次比较就返回，不查用户、不碰状态、不拼字符串"""
+        if self._rng.shared.random() >= MESSAGE_P or not self._passive_egg:
+            return
+        if getattr(event, "is_at_or_wake_command", False):
+            return  # 指令消息由指令自己判定掉落，避免一条消息掉两次
+        shard = self._shard(event)
+        user_id = self._get_user_id(event)
+        async with self._locks.lock(user_id):
+            await shard.prefetch(user_id)  # 与 user_locked 相同：冷用户的记录在 IO 线程里取
+            await self._merge_fallback(event, user_id)
+            self._note_member(event, user_id)
+            res = await _try_drop_egg(self, event, is_interaction=False, gated=True)
+        if res:
+            yield res
 
     # ---- 新增指令：签到（已加“每日一次”限制） ----
     @filter.command("签到")
+    @metered
+    @user_locked
     async def sign_in(self, event: AstrMessageEvent):
         """根据时间段打招呼 + 随机获得好感度与玻璃珠，并记录到背包；每日仅可签到一次"""
         user_name = event.get_sender_name()
         user_id = self._get_user_id(event)
+        shard = self._shard(event)
+        index = await self._signin_index(event)  # 分群时本群的签到顺序在群分片里
 
         # ——【新增：每天只能签到一次的校验】——
-        today = datetime.now().date().isoformat()
-        user = self._state["users"].setdefault(user_id, {"favor": 0, "marbles": 0})
-        if user.get("last_sign") == today:
-            yield event.plain_result(
-                f"{user_name}，今天已经签过到啦～\n当前好感度：{user['favor']}｜玻璃珠：{user['marbles']}"
-            )
+        today = self._clock.today
+        user = shard.users.get_or_create(user_id)
+        rng = self._rng.for_user(user_id)  # 本用户的随机流
+        if user.last_sign == today:
+            yield event.plain_result(SIGN_IN_DONE.render(name=user_name, favor=user.favor, marbles=user.marbles))
             return
         # ——【新增结束】——
-        # ——【最笨法：统计今天已签到人数作为名次】——
-        users = self._state.get("users", {})
-        signed_today_count = 0
-        for _uid, _u in users.items():
-            if isinstance(_u, dict) and _u.get("last_sign") == today:
-                signed_today_count += 1
-        rank_today = signed_today_count + 1
-        # ——【最笨法结束】——
-
+        # ——【名次：追加到今日签到顺序表，O(1)；检查与追加之间没有 await，并发签到名次也唯一】——
+        order = index.signin_order(self._clock.today_iso)
+        order.append(user_id)
+        rank_today = len(order)
+        if index is not shard:
+            index.save()  # 群分片只有签到顺序表这一项状态
 
         period = self._time_period()
-        pool = {
-            "morning": [
-                f"你是今天第{rank_today}位签到的~\n早安，{user_name}！小碎为你点亮新的一天～",
-                f"你是今天第{rank_today}位签到的~\n{user_name} 早呀！今天也一起加油！",
-                f"你是今天第{rank_today}位签到的~\n清晨好，{user_name}～来摸摸小碎提提神！",
-                f"你是今天第{rank_today}位签到的~\n小碎送来一杯热可可，{user_name} 早上好！",
-                f"你是今天第{rank_today}位签到的~\n新的一天，从和小碎说早安开始吧，{user_name}～",
-                f"晨光正好，{user_name}～"
-            ],
-            "noon": [
-                f"你是今天第{rank_today}位签到的~\n午间好，{user_name}～记得补充能量哦！",
-                f"你是今天第{rank_today}位签到的~\n{user_name} 午好！小碎给你加点效率 BUFF～",
-                f"你是今天第{rank_today}位签到的~\n小憩一下吧，{user_name}～小碎守着你！",
-                f"你是今天第{rank_today}位签到的~\n咕噜咕噜～午饭好吃吗 {user_name}？",
-                f"你是今天第{rank_today}位签到的~\n精神满满的下午从饱饱的中午开始！{user_name}～",
-                f"午安～{user_name}，小碎在线待命！"
-            ],
-            "afternoon": [
-                f"你是今天第{rank_today}位签到的~\n下午好，{user_name}～小碎陪你继续冲刺！",
-                f"你是今天第{rank_today}位签到的~\n{user_name}，下午的太阳刚刚好～",
-                f"你是今天第{rank_today}位签到的~\n来点小甜点如何？小碎请你～",
-                f"你是今天第{rank_today}位签到的~\n保持专注，{user_name}～小碎给你打气！",
-                f"你是今天第{rank_today}位签到的~\n嗷嗷～{user_name}，小碎在这儿守护你！",
-                f"下午茶时间到～{user_name} 要不要来一口？"
-            ],
-            "evening": [
-                f"你是今天第{rank_today}位签到的~\n晚上好，{user_name}～要不要一起放松下？",
-                f"你是今天第{rank_today}位签到的~\n{user_name} 辛苦啦！小碎给你舒缓一下～",
-                f"你是今天第{rank_today}位签到的~\n夜色真美，{user_name}～小碎也在！",
-                f"你是今天第{rank_today}位签到的~\n来听会儿歌吧，{user_name}～小碎陪你～",
-                f"你是今天第{rank_today}位签到的~\n收工快乐，{user_name}！小碎为你点亮小灯灯～",
-                f"晚风轻拂～{user_name}，小碎在这儿～"
-            ],
-            "midnight": [
-                f"你是今天第{rank_today}位签到的~\n半夜啦，{user_name}～注意休息哦，小碎抱抱～",
-                f"你是今天第{rank_today}位签到的~\n{user_name} 还没睡呀？小碎小声陪你～",
-                f"你是今天第{rank_today}位签到的~\n夜深了，{user_name}～要不要喝点热牛奶？",
-                f"你是今天第{rank_today}位签到的~\n小碎给你盖小被子～{user_name} 晚安前的签到也很可爱！",
-                f"你是今天第{rank_today}位签到的~\n星星眨眼睛～{user_name}，小碎悄悄上线～",
-                f"夜猫子小队集合！{user_name}～小碎打卡到！"
-            ],
-        }
-
-        greet = random.choice(pool[period])
-
-        favor_inc = random.randint(0, 30)
-        marbles_inc = random.randint(0, 30)
+        greet = rng.choice(greetings().sign_in[period]).render(rank=rank_today, name=user_name)
 
-        # 此处直接使用上面已获取/创建的 user
-        user["favor"] += favor_inc
-        user["marbles"] += marbles_inc
-        user["last_sign"] = today  # 记录今天已签到
-        self._save_state()
+        favor_inc = rng.randint(*SIGN_FAVOR_RANGE)
+        marbles_inc = rng.randint(*SIGN_MARBLE_RANGE)
 
-        reply = (
-            f"{greet}\n"
-            f"签到成功啦～小碎好感度 +{favor_inc}，小碎赠予你 {marbles_inc} 颗玻璃珠。\n"
-            f"当前好感度：{user['favor']}｜玻璃珠：{user['marbles']}"
+        # 此处直接使用上面已获取/创建的 user
+        shard.credit(user_id, user, "签到", favor_inc, marbles_inc)
+        streak = user.mark_signed(today)  # 记录今天已签到（签到位图前移到今天），得到连续天数
+        bonus_favor, bonus_marbles = streak_bonus(streak)
+        if bonus_favor or bonus_marbles:
+            shard.credit(user_id, user, "连续签到", bonus_favor, bonus_marbles)
+        user.name = user_name  # 记录昵称，供签到榜展示
+        shard.save(user_id)
+
+        reply = SIGN_IN_OK.render(
+            greet=greet, favor_inc=favor_inc, marbles_inc=marbles_inc, favor=user.favor, marbles=user.marbles,
         )
+        if bonus_favor or bonus_marbles:
+            reply += "\n" + SIGN_IN_STREAK.render(streak=streak, favor=bonus_favor, marbles=bonus_marbles)
         yield event.plain_result(reply)
 
         res = await _try_drop_egg(self,event, is_interaction=True)
         if res: yield res
 
-    
+    # ---- 新增指令：今日签到榜（直接读签到顺序表，不扫描用户）----
+    @filter.command("今日签到榜")
+    @metered
+    async def sign_rank(self, event: AstrMessageEvent):
+        """列出今天最早签到的前 N 位（默认 10，最多 50），如：今日签到榜 20"""
+        parts = event.message_str.split()
+        n = int(parts[-1]) if parts and parts[-1].isdigit() else 10
+        n = max(1, min(50, n))
+
+        shard = self._shard(event)
+        order = (await self._signin_index(event)).signin_order(self._clock.today_iso)
+        if not order:
+            yield event.plain_result("今天还没有人签到哦～快来当第一名吧 (๑•̀ㅂ•́)و✧")
+            return
+
+        aliases = shard.state.get("aliases", {})
+        lines = []
+        for i, uid in enumerate(order[:n], start=1):
+            rec = shard.users.get(aliases.get(uid, uid))
+            lines.append(f"{i}. {rec.name if rec and rec.name else uid}")
+        yield event.plain_result(
+            f"📋 今日签到榜（共 {len(order)} 人已签到）\n" + "\n".join(lines)
+        )
+
+    # ---- 新增指令：签到日历（读签到位图，每人固定大小，不存日期列表）----
+    @filter.command("签到日历")
+    @metered
+    async def sign_calendar(self, event: AstrMessageEvent):
+        """本月的签到情况与连续天数；可指定月份，如：签到日历 2024-05 / 签到日历 5"""
+        user_name = event.get_sender_name()
+        shard = self._shard(event)
+        user_id = self._get_user_id(event)
+        await shard.prefetch(user_id)
+        user = shard.users.get(user_id)
+        today = self._clock.today
+        now = date.fromordinal(today)
+        parts = event.message_str.split()
+        arg = parts[-1] if len(parts) > 1 else ""
+        try:
+            if "-" in arg:
+                year, month = (int(x) for x in arg.split("-", 1))
+            else:
+                year, month = now.year, int(arg) if arg else now.month
+            first = date(year, month, 1).toordinal()
+        except ValueError:
+            yield event.plain_result("月份格式不对哦～例如：签到日历 2024-05 / 签到日历 5")
+            return
+        last = first + monthrange(year, month)[1] - 1
+        if first > today:
+            yield event.plain_result(f"{year} 年 {month} 月还没到呢～")
+            return
+        if last <= today - SIGN_WINDOW:
+            yield event.plain_result(f"小碎只记得最近 {SIGN_WINDOW} 天的签到哦～")
+            return
+
+        # 位图第 j 位 = last - j 那天；一格一天：✅ 已签 / ⬜ 漏签 / ⭕ 今天还没签 / ▫️ 还没到
+        bits = user.sign_range(first, last) if user else 0
+        cells = ["　"] * date.fromordinal(first).weekday()
+        signed = missed = 0
+        for day in range(first, last + 1):
+            if bits >> (last - day) & 1:
+                cells.append("✅")
+                signed += 1
+            elif day < today:
+                cells.append("⬜")
+                missed += 1
+            else:
+                cells.append("⭕" if day == today else "▫️")
+        rows = [" ".join(cells[i:i + 7]) for i in range(0, len(cells), 7)]
+        streak = user.streak_on(today) if user else 0
+        longest = user.longest_streak if user else 0
+        yield event.plain_result(
+            f"📅 {user_name} 的签到日历 · {year} 年 {month} 月\n"
+            "一 二 三 四 五 六 日\n"
+            + "\n".join(rows)
+            + f"\n\n本月已签 {signed} 天，漏签 {missed} 天\n🔥 当前连续 {streak} 天｜最长连续 {longest} 天"
+        )
+
+    # ---- 新增指令：排行榜（好感 / 玻璃珠 / 彩蛋；群内默认本群，加“全服”看全服）----
+    @filter.command("好感榜")
+    @metered
+    async def favor_board(self, event: AstrMessageEvent):
+        """好感度排行榜，如：好感榜 / 好感榜 20 / 好感榜 全服"""
+        await self._shard(event).boards_ready()
+        yield event.plain_result(self._render_board(event, "favor"))
+
+    @filter.command("玻璃珠榜")
+    @metered
+    async def marbles_board(self, event: AstrMessageEvent):
+        """玻璃珠排行榜，如：玻璃珠榜 / 玻璃珠榜 20 / 玻璃珠榜 全服"""
+        await self._shard(event).boards_ready()
+        yield event.plain_result(self._render_board(event, "marbles"))
+
+    @filter.command("彩蛋榜")
+    @metered
+    async def eggs_board(self, event: AstrMessageEvent):
+        """彩蛋收集数排行榜，如：彩蛋榜 / 彩蛋榜 20 / 彩蛋榜 全服"""
+        await self._shard(event).boards_ready()
+        yield event.plain_result(self._render_board(event, "eggs"))
+
+    def _render_board(self, event: AstrMessageEvent, metric: str) -> str:
+        """取前 N 名（默认 10，最多 50）+ 自己的名次；直接读有序索引，不排序、不扫描用户"""
+        icon, title, unit = BOARD_LABELS[metric]
+        parts = event.message_str.split()
+        n = next((int(p) for p in parts if p.isdigit()), 10)
+        n = max(1, min(50, n))
+        group = self._group_of(event)
+        shard = self._shard(event)
+        if group and "全服" not in parts:
+            scope, scope_name = group, "本群"
+        else:
+            scope, scope_name = GLOBAL, "全服"
+
+        top = shard.boards.top(metric, scope, n)
+        if not top:
+            return f"{icon} {scope_name}{title}还是空的哦～"
+        lines = []
+        for i, (score, uid) in enumerate(top, start=1):
+            rec = shard.users.get(uid)
+            lines.append(f"{i}. {rec.name if rec and rec.name else uid} —— {score}")
+        mine = shard.boards.rank(metric, self._get_user_id(event), scope)
+        footer = f"\n你的名次：第 {mine[0]} 名" if mine else "\n你还没有上榜哦～"
+        return (
+            f"{icon} {scope_name}{title}（{unit}，共 {shard.boards.size(metric, scope)} 人）\n"
+            + "\n".join(lines) + footer
+        )
+
     # ---- 新版：占卜（每日一次，内联数据，仅三组牌）----
     @filter.command("占卜")
+    @metered
+    @user_locked
     async def divination(self, event: AstrMessageEvent):
         """
         每日仅可占卜一次：
         - 首次占卜扣 20 玻璃珠
-        - 随机抽取 22 大阿卡那中的前三组（愚者/魔术师/女祭司，含正逆）
+        - 随机抽取 22 张大阿卡那（含正逆）
         - 展示等级（SSS/SS/S/B/C/D/F）和中文形容，并根据好/波动/坏给祝福或安慰
         - 玻璃珠增减区间受等级影响（最终裁切到 ±266）
         - 好感度 +0~50，与牌面无关
@@ -194,201 +485,60 @@ class MyPlugin(Star):
         """
         user_name = event.get_sender_name()
         user_id = self._get_user_id(event)
-        user = self._state["users"].setdefault(user_id, {"favor": 0, "marbles": 0})
+        shard = self._shard(event)
+        user = shard.users.get_or_create(user_id)
+        rng = self._rng.for_user(user_id)
 
         # 每日一次
-        today = datetime.now().date().isoformat()
-        if user.get("last_divine") == today:
-            yield event.plain_result(
-                f"🔒 {user_name}，今天已经占卜过啦～明天再来试试吧！\n"
-                f"📦 当前背包｜好感度：{user.get('favor',0)}｜玻璃珠：{user.get('marbles',0)}"
-            )
+        today = self._clock.today
+        if user.last_divine == today:
+            yield event.plain_result(DIVINE_DONE.render(name=user_name, favor=user.favor, marbles=user.marbles))
             return
 
         # 占卜费用（仅首次）
-        fee = 20
-        user["marbles"] = user.get("marbles", 0) - fee
-
-        # 等级 -> 形容词 & 玻璃珠区间（最终会裁切到 ±266）
-        RATING_WORD = {
-            "SSS": "特别棒的",
-            "SS":  "很好的",
-            "S":   "不错的",
-            "B":   "有波动的",
-            "C":   "不太顺的",
-            "D":   "糟心的",
-            "F":   "相当危险的",
-        }
-        MARBLE_RANGE = {
-            "SSS": (200, 266),
-            "SS":  (120, 220),
-            "S":   (40, 160),
-            "B":   (-60, 120),
-            "C":   (-160, 40),
-            "D":   (-220, -40),
-            "F":   (-266, -120),
-        }
-
-        # 仅前三组牌（正/逆）
-        CARDS = {
-            "愚者": {
-                "upright":  {"core": "自由", "type": "SS",  "keywords": ["起点","冒险","单纯","信任","未知","旅途"], "interp": "拥抱未知，轻装上路会带来新鲜突破。"},
-                "reversed": {"core": "鲁莽", "type": "C",   "keywords": ["冲动","迷路","逃避","风险","幼稚","分心"], "interp": "先看脚下再跳，边界与计划缺一不可。"},
-            },
-            "魔术师": {
-                "upright":  {"core": "创造", "type": "SSS", "keywords": ["专注","沟通","资源","技巧","显化","机会"], "interp": "心之所向可被实现，主动出手就是魔法。"},
-                "reversed": {"core": "失衡", "type": "F",   "keywords": ["欺骗","分神","虚张","失控","散漫","反复"], "interp": "谨防口惠而实不至，把能量收束回到行动。"},
-            },
-            "女祭司": {
-                "upright":  {"core": "直觉", "type": "S",   "keywords": ["潜意识","静观","神秘","梦境","洞察","沉默"], "interp": "答案在心底，给直觉一点安静的空间。"},
-                "reversed": {"core": "压抑", "type": "C",   "keywords": ["怀疑","迟疑","隔阂","隐瞒","自我否定","迷雾"], "interp": "过度压抑会遮蔽线索，承认感受即是起点。"},
-            },
-            "女皇": {
-                "upright":  {"core": "丰盛", "type": "SS", "keywords": ["创造","滋养","成长","美感","安逸","母性"], "interp": "照顾他人也别忘了自己，丰盛来自平衡的给予。"},
-                "reversed": {"core": "匮乏", "type": "D", "keywords": ["疲惫","依赖","过度付出","冷漠","封闭","失衡"], "interp": "当能量只流出不流入，美好也会枯竭。"},
-            },
-            "皇帝": {
-                "upright":  {"core": "掌控", "type": "SS", "keywords": ["权威","秩序","责任","理性","执行","稳定"], "interp": "果断与规则让局面井然，责任感是最稳固的基石。"},
-                "reversed": {"core": "僵化", "type": "C", "keywords": ["独断","压迫","失控","固执","滥权","刚愎"], "interp": "控制不等于掌控，学会放手才能真正统御。"},
-            },
-            "教皇": {
-                "upright":  {"core": "信念", "type": "S", "keywords": ["传统","伦理","学习","指导","信仰","秩序"], "interp": "沿袭经验也可焕新意义，尊重不等于盲从。"},
-                "reversed": {"core": "教条", "type": "C", "keywords": ["虚伪","封闭","盲信","僵化","伪善","桎梏"], "interp": "打破旧框架，信念要能滋养而非束缚心灵。"},
-            },
-            "恋人": {
-                "upright":  {"core": "连结", "type": "S", "keywords": ["爱情","契合","选择","信任","共鸣","吸引"], "interp": "内外和谐的选择会让你与世界都更亲近。"},
-                "reversed": {"core": "分歧", "type": "D", "keywords": ["冲突","诱惑","犹豫","不忠","冷淡","矛盾"], "interp": "情感或价值的裂缝需要诚实面对，而非逃避。"},
-            },
-            "战车": {
-                "upright":  {"core": "意志", "type": "SS", "keywords": ["胜利","前进","目标","专注","速度","方向"], "interp": "掌舵者的意志决定航向，集中火力向前冲。"},
-                "reversed": {"core": "失控", "type": "C", "keywords": ["冲动","分心","犹豫","退缩","阻力","混乱"], "interp": "拉缰绳而不是马鞭，先稳住方向再加速。"},
-            },
-            "力量": {
-                "upright":  {"core": "勇气", "type": "SS", "keywords": ["温柔","耐心","自信","坚毅","掌控","平衡"], "interp": "真正的力量是温柔而坚定，对自己也要仁慈。"},
-                "reversed": {"core": "脆弱", "type": "C", "keywords": ["怯懦","失衡","焦虑","依赖","自我怀疑","暴躁"], "interp": "别和恐惧硬碰硬，承认脆弱也是力量。"},
-            },
-            "隐士": {
-                "upright":  {"core": "内省", "type": "S", "keywords": ["思考","智慧","孤独","洞察","沉淀","启示"], "interp": "独处不是逃避，而是与自我对话的机会。"},
-                "reversed": {"core": "迷茫", "type": "C", "keywords": ["孤立","闭塞","犹豫","冷漠","逃避","退缩"], "interp": "自省若无行动，只会变成封闭的循环。"},
-            },
-            "命运之轮": {
-                "upright":  {"core": "机缘", "type": "SS", "keywords": ["转折","变化","循环","机会","命运","节奏"], "interp": "潮起潮落皆为契机，把握节奏乘势而上。"},
-                "reversed": {"core": "停滞", "type": "D", "keywords": ["错失","拖延","重复","抗拒","不顺","偏离"], "interp": "命运不帮倒忙，只是等你先迈出那一步。"},
-            },
-            "正义": {
-                "upright":  {"core": "公正", "type": "S", "keywords": ["平衡","真相","判断","责任","诚信","理性"], "interp": "诚实面对因果，决策的刀锋要稳。"},
-                "reversed": {"core": "偏颇", "type": "C", "keywords": ["不公","误判","虚伪","偏见","推诿","混乱"], "interp": "逃避审视只会让秤更歪，承担即修正。"},
-            },
-            "倒吊人": {
-                "upright":  {"core": "顿悟", "type": "S", "keywords": ["牺牲","等待","转换","洞察","暂停","释然"], "interp": "改变视角后，束缚也许就是自由的钥匙。"},
-                "reversed": {"core": "抗拒", "type": "C", "keywords": ["固执","停滞","逃避","无奈","浪费","延迟"], "interp": "不必被动受困，主动松手才有余地。"},
-            },
-            "死神": {
-                "upright":  {"core": "重生", "type": "SS", "keywords": ["结束","转化","放下","更新","重启","净化"], "interp": "勇敢告别过去，新的周期已在脚下展开。"},
-                "reversed": {"core": "停滞", "type": "D", "keywords": ["拖延","抗拒改变","沉溺","旧习","停滞","惧怕"], "interp": "拒绝结束，就等于拒绝成长。"},
-            },
-            "节制": {
-                "upright":  {"core": "平衡", "type": "SS", "keywords": ["协调","耐心","融合","自控","适度","疗愈"], "interp": "节奏的拿捏是艺术，保持心与行的温度。"},
-                "reversed": {"core": "失调", "type": "C", "keywords": ["过度","放纵","矛盾","失衡","冲突","躁动"], "interp": "过多或过少都偏离中心，回到中点再出发。"},
-            },
-            "恶魔": {
-                "upright":  {"core": "欲望", "type": "B", "keywords": ["诱惑","执着","束缚","诱因","享乐","阴影"], "interp": "欲望不该被否定，关键是你掌握它，而非被掌握。"},
-                "reversed": {"core": "解放", "type": "S", "keywords": ["觉醒","挣脱","放下","清醒","自由","自控"], "interp": "认出锁链，便是打断它的第一步。"},
-            },
-            "塔": {
-                "upright":  {"core": "崩塌", "type": "F", "keywords": ["突变","冲击","崩坏","真相","剧变","警醒"], "interp": "旧结构崩塌只是前奏，清理废墟才能重建。"},
-                "reversed": {"core": "重组", "type": "C", "keywords": ["缓和","修复","自省","避免","迟疑","余波"], "interp": "别惧怕瓦解，那是重塑的信号。"},
-            },
-            "星星": {
-                "upright":  {"core": "希望", "type": "SSS", "keywords": ["灵感","疗愈","信念","平静","美好","未来"], "interp": "黑夜正因为有星光，才值得仰望。"},
-                "reversed": {"core": "失望", "type": "C", "keywords": ["疑虑","动摇","沮丧","迷茫","悲观","退缩"], "interp": "希望未消失，只是被尘埃遮住，擦一擦就亮了。"},
-            },
-            "月亮": {
-                "upright":  {"core": "潜意识", "type": "B", "keywords": ["梦境","幻象","直觉","情绪","神秘","不安"], "interp": "直觉是指南针，不是恐惧的放大镜。"},
-                "reversed": {"core": "幻灭", "type": "D", "keywords": ["欺骗","误判","困惑","幻想","焦虑","迷路"], "interp": "幻象散去后，留下的是真实。"},
-            },
-            "太阳": {
-                "upright":  {"core": "喜悦", "type": "SSS", "keywords": ["成功","幸福","自信","清晰","能量","光明"], "interp": "温暖照亮一切，分享快乐让好运加倍。"},
-                "reversed": {"core": "延迟", "type": "C", "keywords": ["疲惫","阴影","失落","困顿","自我怀疑","迟缓"], "interp": "阳光暂时被云遮住，但依然在你背后。"},
-            },
-            "审判": {
-                "upright":  {"core": "觉醒", "type": "SS", "keywords": ["重生","反思","决断","救赎","更新","回应"], "interp": "是时候回应自己的召唤，新的篇章已开启。"},
-                "reversed": {"core": "逃避", "type": "F", "keywords": ["后悔","自责","否认","拖延","怯懦","混乱"], "interp": "原谅自己才能再次起身，宽恕是重生的门。"},
-            },
-            "世界": {
-                "upright":  {"core": "完成", "type": "SS", "keywords": ["成就","圆满","整合","成功","终点","平衡"], "interp": "旅途终将圆满，你已成为那个更完整的自己。"},
-                "reversed": {"core": "未竟", "type": "C", "keywords": ["半途","停滞","阻碍","遗憾","失衡","迷失"], "interp": "终点未远，只是需要再迈最后一步。"},
-            },
-        }
+        fee = DIVINE_FEE
+        shard.credit(user_id, user, "占卜费用", marbles=-fee)
 
         # 随机抽牌与正逆
-        card_name = random.choice(list(CARDS.keys()))
-        upright = random.choice([True, False])
-        orient = "upright" if upright else "reversed"
-        m = CARDS[card_name][orient]
+        deck = tarot()
+        card = rng.choice(deck.cards)
+        upright = rng.random() < 0.5
+        m = card.upright if upright else card.reversed
+        card_name = card.name
         orient_cn = "正位" if upright else "逆位"
-        rating = m["type"]
+        rating = m.rating
 
-        # 玻璃珠增减（按等级），并裁切到 ±266
-        rmin, rmax = MARBLE_RANGE[rating]
-        marble_delta = random.randint(rmin, rmax)
-        marble_delta = max(-266, min(266, marble_delta))
+        # 玻璃珠增减（按等级），并裁切到 ±MARBLE_CLIP
+        rmin, rmax = deck.marble_range[rating]
+        marble_delta = rng.randint(rmin, rmax)
+        marble_delta = max(-MARBLE_CLIP, min(MARBLE_CLIP, marble_delta))
 
-        # 好感度独立 +0~50
-        favor_inc = random.randint(0, 50)
+        # 好感度独立抽取，与牌面无关
+        favor_inc = rng.randint(*DIVINE_FAVOR_RANGE)
 
-        # SSS 10% 额外奖励
+        # SSS 概率额外奖励
         bonus = 0
         bonus_text = ""
-        if rating == "SSS" and random.random() < 0.10:
-            bonus = 999
-            bonus_text = "\n🎉 中奖时刻！群星垂青，额外获得 **999** 颗玻璃珠！"
+        if rating == "SSS" and rng.random() < SSS_BONUS_P:
+            bonus = SSS_BONUS
+            bonus_text = f"\n🎉 中奖时刻！群星垂青，额外获得 **{SSS_BONUS}** 颗玻璃珠！"
 
         # 好/波动/坏 -> 祝福/安慰
-        if rating in ("SSS", "SS", "S"):
-            mood_pool = [
-                "🕊️ 祝福送达：顺风顺水、步步开花！",
-                "🌟 保持清澈与专注，好运与成果相互奔赴。",
-                "🚀 节奏对了就别停，今天的舞台灯正亮着。",
-            ]
-        elif rating == "B":
-            mood_pool = [
-                "🌗 形势有波动，收束变量稳稳推进。",
-                "🧭 先拿下一个小目标，趋势自然会靠拢你。",
-                "⚖️ 少量正确比大量盲冲更强。",
-            ]
-        else:
-            mood_pool = [
-                "🫧 别怕，先安顿好自己，路会在脚下重新出现。",
-                "🌧️ 暂避锋芒也算前进，修复能量再出发。",
-                "🛡️ 把风险写出来就降级一半，慢慢来，一切都会过去。",
-            ]
-        mood_line = random.choice(mood_pool)
+        mood_line = rng.choice(deck.moods[rating])
 
         # 更新状态并标记今日已占卜
-        user["favor"] += favor_inc
-        user["marbles"] += marble_delta + bonus
-        user["last_divine"] = today
-        self._save_state()
+        shard.credit(user_id, user, "占卜", favor_inc, marble_delta + bonus)
+        user.last_divine = today
+        shard.save(user_id)
 
         # 输出
-        def fmt_signed(n: int) -> str:
-            return f"+{n}" if n >= 0 else f"{n}"
-        rating_word = RATING_WORD[rating]
-        keywords = "、".join(m["keywords"][:6])
-
-        reply = (
-            f"🔮 我收取了 **{fee}** 枚玻璃珠作为占卜费用……\n"
-            f"✨ 本次是 **{card_name}·{orient_cn}**\n"
-            f"等级：**{rating}（{rating_word}）**\n"
-            f"核心：**{m['core']}**｜其它：{keywords}\n"
-            f"🔎 解析：{m['interp']}\n"
-            f"{mood_line}\n"
-            f"💗 小碎好感度 {fmt_signed(favor_inc)}，"
-            f"🫧 玻璃珠 {fmt_signed(marble_delta + bonus)}{bonus_text}\n"
-            f"📦 当前背包｜好感度：{user['favor']}｜玻璃珠：{user['marbles']}"
-        )
-        yield event.plain_result(reply)
+        yield event.plain_result(DIVINE_RESULT.render(
+            fee=fee, card=card_name, orient=orient_cn,
+            rating=rating, rating_word=deck.rating_word[rating],
+            core=m.core, keywords=m.keywords_line, interp=m.interp, mood=mood_line,
+            favor_inc=favor_inc, marble_delta=marble_delta + bonus, bonus_text=bonus_text,
+            favor=user.favor, marbles=user.marbles,
+        ))
 
 
         res = await _try_drop_egg(self,event, is_interaction=True)
@@ -400,105 +550,33 @@ class MyPlugin(Star):
 
     # ---- 新增指令：投喂（42条候选，含特殊食物，3分钟冷却）----
     @filter.command("投喂")
+    @metered
+    @rate_limited(Limit(1, FEED_COOLDOWN), on_limited=_feed_wait_text)
+    @user_locked
     async def feed_xiaosui(self, event: AstrMessageEvent):
         """给小碎投喂；每次好感度+0~10，命中特殊食物额外+5~20；冷却3分钟"""
         user_name = event.get_sender_name()
         user_id = self._get_user_id(event)
-        user = self._state["users"].setdefault(user_id, {"favor": 0, "marbles": 0})
-
-        now_ts = int(datetime.now().timestamp())
-        cd = 180  # 3分钟
-        last_ts = int(user.get("last_feed_ts", 0))
-        remain = cd - (now_ts - last_ts)
-        if remain > 0:
-            mm, ss = divmod(remain, 60)
-            wait_str = f"{mm}分{ss}秒" if mm else f"{ss}秒"
-            yield event.plain_result(
-                f"⌛ {user_name}，小碎还在消化中～请再等 {wait_str} 再投喂。\n"
-                f"💗 当前好感度：{user.get('favor',0)}"
-            )
-            return
-
-        # 结构：(一句话情景文本, 是否特殊)
-        pool = []
-
-        # --- 星露谷物语 ×10（新增2条：生鱼片、幸运午餐） ---
-        pool += [
-            ("小碎接过星露谷的披萨，边吹边咬一口，芝士拉出细细长丝。", False),
-            ("粉红蛋糕香气扑鼻，小碎小口啃着，脸颊鼓鼓的。", False),
-            ("星露谷的咖啡刚冲好，小碎捧着杯子深吸一口气再轻抿。", False),
-            ("鲑鱼晚餐摆上桌，小碎认真地把柠檬挤在鱼排上。", False),
-            ("巧克力蛋糕切下一角，小碎把叉子立正地插好再优雅送入口。", False),
-            ("龙虾浓汤热气氤氲，小碎端稳碗边吹边喝。", False),
-            ("香辣鳗鱼一上来，小碎眯起眼睛说：这股劲儿正合适。", True),          # 特殊
-            ("金星南瓜派切面细腻，小碎晃晃叉子：今天也会很顺利。", True),        # 特殊
-            ("生鱼片切得晶莹，小碎蘸了一点酱油，满足地眯起眼。", False),           # 新增
-            ("幸运午餐端到面前，小碎认真默念：今天要抓住好时机。", True),         # 新增/特殊
-        ]
-
-        # --- 饥荒 ×5 ---
-        pool += [
-            ("小碎把饥荒的肉丸倒进碗里，用小勺一下一下地舀。", False),
-            ("太妃糖甜意蔓延，小碎舔了舔指尖上的糖霜。", False),
-            ("培根煎蛋滋滋作响，小碎把蛋黄轻轻戳破配着培根吞下。", True),       # 特殊
-            ("饕餮馅饼切开冒着热气，小碎吹了两口才敢咬。", True),                  # 特殊
-            ("波兰饺子皮薄馅足，小碎夹起一个蘸了点酱再吃。", False),
-        ]
-
-        # --- 泰拉瑞亚 ×5 ---
-        pool += [
-            ("熟鱼肉质紧实，小碎顺着鱼刺细细拆开吃得很认真。", False),
-            ("南瓜派切成扇形，小碎数了数层次才下口。", False),
-            ("一碗热汤端上来，小碎先试探地抿了一口再点头。", False),
-            ("苹果派略带肉桂香，小碎把边缘的酥皮先掰掉吃。", False),
-            ("至尊培根油亮喷香，小碎一口下去精神都跟着抖擞起来。", True),       # 特殊
-        ]
-
-        # --- 通用可爱互动 ×22 ---
-        pool += [
-            ("热可可送到手心，小碎呼一口热气暖暖指尖。", False),
-            ("草莓牛奶冰凉顺喉，小碎在吸管里发出小小的咕噜声。", False),
-            ("抹茶曲奇咔哧一声，小碎认真数着碎屑别让它们逃跑。", False),
-            ("蜜瓜面包外脆内软，小碎把顶上的格子一块块掰开。", False),
-            ("薄荷冰淇淋化得很快，小碎飞快地转着杯子防止滴落。", False),
-            ("芝士汉堡层层叠，小碎从侧面小心翼翼地咬第一口。", False),
-            ("蜂蜜柚子茶微苦回甘，小碎捧杯看着浮起的柚皮条发呆。", False),
-            ("可丽饼卷着奶油，小碎先舔了一下边缘确认不会沾鼻尖。", False),
-            ("彩虹果冻在盘里抖动，小碎用勺背轻轻按了按。", True),                # 特殊
-            ("焦糖布蕾敲开脆皮，小碎满意地点点头。", False),
-            ("焗土豆牵丝拉长，小碎把丝绕在叉子上慢慢卷。", False),
-            ("乌龙奶盖茶入口绵密，小碎把奶盖胡子抹掉后偷笑。", False),
-            ("樱花团子软糯弹牙，小碎一串一串地分给大家。", False),
-            ("海盐美式醒脑一击，小碎眨眨眼决定开始干活。", False),
-            ("松饼塔叠得高高的，小碎担心倒塌先抽走最顶上一片。", False),
-            ("柠檬塔酸甜对撞，小碎被刺激得肩膀一抖又想再来一口。", False),
-            ("巧克力豆在掌心融化，小碎赶紧一颗颗送进嘴里。", False),
-            ("蜜桃乌龙果香四溢，小碎把漂浮的果肉捞起来慢慢嚼。", False),
-            ("星光糖在舌尖噼啪作响，小碎被惊到笑出声。", True),                 # 特殊
-            ("小熊软糖排成方阵，小碎宣布开饭仪式并迅速解散队伍。", False),
-            ("玉米棒刷了黄油，小碎顺着纹路一排排地啃。", False),
-            ("椰子布丁轻轻晃动，小碎叮嘱自己这次一定不要打翻。", False),
-        ]
-
-        # 安全兜底
-        if not pool:
-            pool = [("小饼干一块，小碎眯起眼心情变好。", False)]
+        shard = self._shard(event)
+        user = shard.users.get_or_create(user_id)
+        rng = self._rng.for_user(user_id)
 
+        # 冷却由 rate_limited 把关，能走到这里就是可以投喂
         # --- 随机抽取 ---
-        text, is_special = random.choice(pool)
+        food = rng.choice(feed().foods)
+        text, is_special = food.text, food.special
 
-        # --- 基础好感 +0~10 ---
-        favor_inc = random.randint(0, 10)
+        # --- 基础好感 ---
+        favor_inc = rng.randint(*FEED_FAVOR_RANGE)
         bonus_inc = 0
         bonus_text = ""
         if is_special:
-            bonus_inc = random.randint(5, 20)
+            bonus_inc = rng.randint(*SPECIAL_FOOD_RANGE)
             bonus_text = f"\n诶，吃到了特别的食物！小碎好感度额外增加 {bonus_inc}"
 
-        # --- 更新与落盘（记录冷却时间戳）---
-        user["favor"] += favor_inc + bonus_inc
-        user["last_feed_ts"] = now_ts
-        self._save_state()
+        # --- 更新与落盘 ---
+        shard.credit(user_id, user, "投喂", favor=favor_inc + bonus_inc)
+        shard.save(user_id)
 
         # --- 回复 ---
         def fmt_plus(n: int) -> str:
@@ -507,7 +585,7 @@ class MyPlugin(Star):
         reply = (
             f"{user_name} 投喂：{text}\n"
             f"好感度 {fmt_plus(favor_inc)}{bonus_text}\n"
-            f"💗 当前好感度：{user['favor']}"
+            f"💗 当前好感度：{user.favor}"
         )
         yield event.plain_result(reply)
 
@@ -517,6 +595,9 @@ class MyPlugin(Star):
 
 # ---- 新增指令：运势（0与100有特殊奖励）----
 @filter.command("运势")
+@metered
+@rate_limited(Limit(2, 30))
+@user_locked
 async def fortune(self, event: AstrMessageEvent):
     """
     随机给出 0~100 的当下运势值。
@@ -525,171 +606,99 @@ async def fortune(self, event: AstrMessageEvent):
     """
     user_name = event.get_sender_name()
     user_id = self._get_user_id(event)
-    user = self._state["users"].setdefault(user_id, {"favor": 0, "marbles": 0})
+    shard = self._shard(event)
+    user = shard.users.get_or_create(user_id)
+    rng = self._rng.for_user(user_id)
 
-    FACES = [
-        "(๑•̀ㅂ•́)و✧", "(つ´ω`)つ", "(*/ω＼*)", "(๑ᵔ⤙ᵔ๑)", "(=^･ω･^=)",
-        "( ੭ ˙ᗜ˙ )੭", "(≧▽≦)/", "ヾ(•ω•`)o", "(｡•̀ᴗ-)✧", "(ง •̀_•́)ง",
-        "(˶ᵔ ᵕ ᵔ˶)", "(•̀ᴗ•́)و ̑̑", "(*´∀`*)", "(｡˃ ᵕ ˂ )b", "(　＾∀＾)"
-    ]
-    face = random.choice(FACES)
+    face = rng.choice(FORTUNE_FACES)
 
-    x = random.randint(0, 100)
+    x = rng.randint(0, FORTUNE_MAX)
 
     base_line = f"你当下的运势是 {x}，顺带一提，运势是百分制的哦~ {face}"
 
     # 特殊分支：0 与 100
     if x == 0:
-        user["marbles"] += 3
-        encourage_pool = [
-            "低谷是弹射的起点，慢慢来会好起来的～",
-            "别担心，休整一下再出发，风会转向你这边。",
-            "把情绪放下半步，路就会出现。加油！"
-        ]
+        shard.credit(user_id, user, "运势", *FORTUNE_ZERO)
         reply = (
             f"{base_line}\n"
-            f"🫧 小碎送你 3 颗玻璃珠以示安慰。\n"
-            f"📣 {random.choice(encourage_pool)}\n"
-            f"📦 当前背包｜好感度：{user.get('favor',0)}｜玻璃珠：{user.get('marbles',0)}"
+            f"🫧 小碎送你 {FORTUNE_ZERO[1]} 颗玻璃珠以示安慰。\n"
+            f"📣 {rng.choice(FORTUNE_ENCOURAGE)}\n"
+            + bag(user)
         )
-        self._save_state()
+        shard.save(user_id)
         yield event.plain_result(reply)
         return
 
-    if x == 100:
-        user["favor"] += 10
-        user["marbles"] += 50
-        bless_pool = [
-            "愿你所想皆如愿、所行皆坦途！",
-            "万事顺遂，灵感与好运一起到访～",
-            "今天你发光，世界都在为你让路！"
-        ]
+    if x == FORTUNE_MAX:
+        shard.credit(user_id, user, "运势", *FORTUNE_HUNDRED)
         reply = (
             f"{base_line}\n"
-            f"🎉 满分好运！小碎为你提升好感度 +10，并赠送 50 颗玻璃珠！\n"
-            f"🌟 {random.choice(bless_pool)}\n"
-            f"📦 当前背包｜好感度：{user.get('favor',0)}｜玻璃珠：{user.get('marbles',0)}"
+            f"🎉 满分好运！小碎为你提升好感度 +{FORTUNE_HUNDRED[0]}，并赠送 {FORTUNE_HUNDRED[1]} 颗玻璃珠！\n"
+            f"🌟 {rng.choice(FORTUNE_BLESS)}\n"
+            + bag(user)
         )
-        self._save_state()
+        shard.save(user_id)
         yield event.plain_result(reply)
         return
 
     # 常规分支：1~99
-    reply = f"{base_line}\n📦 当前背包｜好感度：{user.get('favor',0)}｜玻璃珠：{user.get('marbles',0)}"
+    reply = f"{base_line}\n{bag(user)}"
     yield event.plain_result(reply)
 
 
 
 # ---- 新增指令：我还要签到（九段运势，仅玻璃珠变动，不加好感）----
 @filter.command("我还要签到")
+@metered
+@user_locked
 async def extra_sign_in(self, event: AstrMessageEvent):
     """
     规则：
-    - 每日一次（与“签到”互不影响），记录到 user['last_extra_sign']
+    - 每日一次（与“签到”互不影响），记录到 user.last_extra_sign
     - 随机给出九段运势：大吉/吉/中吉/小吉/平/小凶/中凶/凶/大凶
     - 仅根据运势增减玻璃珠，不增加好感度
     - 运势好→祝福；运势差→鼓励；平→中性提示
     """
     user_name = event.get_sender_name()
     user_id = self._get_user_id(event)
-    user = self._state["users"].setdefault(user_id, {"favor": 0, "marbles": 0})
+    shard = self._shard(event)
+    user = shard.users.get_or_create(user_id)
+    rng = self._rng.for_user(user_id)
 
-    today = datetime.now().date().isoformat()
-    if user.get("last_extra_sign") == today:
+    today = self._clock.today
+    if user.last_extra_sign == today:
         yield event.plain_result(
             f"🔒 {user_name}，今天已经进行过【勤勉签到】啦～\n"
-            f"📦 当前背包｜好感度：{user.get('favor',0)}｜玻璃珠：{user.get('marbles',0)}"
+            + bag(user)
         )
         return
 
-    diligent_lines = [
-        "今天也是勤勉的一天～",
-        "记录一下扎实的努力！",
-        "稳步前进就是胜利～",
-        "打卡！小目标正在靠近你～",
-        "今天的你也很棒哦~！",
-        "有在认真生活的味道～",
-        "努力被宇宙看见啦！",
-        "悄悄耕耘，静待花开～",
-        "积跬步以至千里！",
-        "继续保持，好状态在线～",
-        "今日功课√ 给自己点个赞！",
-        "进度条+1，能量值+1！",
-        "你在变好，小碎看得见～",
-        "今天也在认真打卡吗~（小碎鼓励的眼神）",
-        "坚持的人自带闪光～"
-    ]
-    diligent_text = random.choice(diligent_lines)
-
-    # 九段日式运势
-    luck_levels = ["大吉", "吉", "中吉", "小吉", "平", "小凶", "中凶", "凶", "大凶"]
-    level = random.choice(luck_levels)
-
-    # 对应玻璃珠区间
-    marble_ranges = {
-        "大吉": (180, 266),
-        "吉": (120, 200),
-        "中吉": (80, 160),
-        "小吉": (40, 100),
-        "平": (0, 60),
-        "小凶": (-20, 20),
-        "中凶": (-60, 0),
-        "凶": (-120, -40),
-        "大凶": (-200, -100),
-    }
-    desc = {
-        "大吉": "群星加护",
-        "吉": "好运相随",
-        "中吉": "顺水顺心",
-        "小吉": "稳步向前",
-        "平": "风平浪静",
-        "小凶": "略有波折",
-        "中凶": "阴云未散",
-        "凶": "注意节奏",
-        "大凶": "谨慎行事",
-    }
-
-    rmin, rmax = marble_ranges[level]
-    delta = random.randint(rmin, rmax)
-    delta = max(-266, min(266, delta))
-    user["marbles"] = user.get("marbles", 0) + delta
+    diligent_text = rng.choice(DILIGENT_LINES)
 
-    # 祝福 / 中性 / 鼓励
-    bless_pool = [
-        "好运加身，今天注定闪闪发光～",
-        "顺风顺水，连星星都在帮你许愿！",
-        "阳光正好，心想事成～"
-    ]
-    neutral_pool = [
-        "平稳是另一种幸福，慢慢走也能到达。",
-        "不焦不躁，保持节奏就是好兆头。",
-        "静水流深，平日的积累最可贵。"
-    ]
-    encourage_pool = [
-        "乌云只是暂时的，下一刻就是晴天。",
-        "先休息一下，明天会更顺。",
-        "困难是运气积蓄的前奏，撑一撑就见光。"
-    ]
+    # 九段日式运势（含玻璃珠区间、描述与对应的祝福/中性/鼓励文案）
+    luck = rng.choice(LUCK_LEVELS)
+    level = luck.name
+
+    rmin, rmax = luck.marbles
+    delta = rng.randint(rmin, rmax)
+    delta = max(-MARBLE_CLIP, min(MARBLE_CLIP, delta))
+    shard.credit(user_id, user, "我还要签到", marbles=delta)
 
-    if level in ("大吉", "吉", "中吉", "小吉"):
-        mood_line = f"🌟 {random.choice(bless_pool)}"
-    elif level == "平":
-        mood_line = f"🧭 {random.choice(neutral_pool)}"
-    else:
-        mood_line = f"🛡️ {random.choice(encourage_pool)}"
+    # 祝福 / 中性 / 鼓励
+    mood_line = rng.choice(luck.moods)
 
-    user["last_extra_sign"] = today
-    self._save_state()
+    user.last_extra_sign = today
+    shard.save(user_id)
 
     def fmt_signed(n: int) -> str:
         return f"+{n}" if n >= 0 else f"{n}"
 
     reply = (
         f"{diligent_text}\n"
-        f"📅 今日运势：**{level}（{desc[level]}）**\n"
+        f"📅 今日运势：**{level}（{luck.desc}）**\n"
         f"🫧 玻璃珠变动：{fmt_signed(delta)}（不增加好感度）\n"
         f"{mood_line}\n"
-        f"📦 当前背包｜好感度：{user.get('favor',0)}｜玻璃珠：{user.get('marbles',0)}"
+        + bag(user)
     )
     yield event.plain_result(reply)
 
@@ -703,13 +712,12 @@ async def extra_sign_in(self, event: AstrMessageEvent):
 #   - 在“签到”、“我还要签到”、“占卜”、“投喂”的回复 yield 之后，追加：
 #       res = await _try_drop_egg(self,event, is_interaction=True)
 #       if res: yield res
-#   - 若你有一个“群内任意消息入口”（如总 on_message/默认回调），在合适位置追加：
-#       res = await _try_drop_egg(self,event, is_interaction=False)
-#       if res: yield res
+#   - 群内任意消息入口见 MyPlugin.passive_egg：先用一次随机数做 5% 快速判定，
+#     命中后才查用户并调用 _try_drop_egg(self, event, is_interaction=False, gated=True)
 #
 # 说明：
-# - 群内任意消息：5% 掉落概率
-# - 日常互动（两个签到、占卜、投喂）：15% 掉落概率
+# - 群内任意消息：5% 掉落概率（命中后再走特别彩蛋 / 稀有度判定）
+# - 日常互动（两个签到、占卜、投喂）：20% 掉落概率
 # - 特别彩蛋：固定每次 10% 概率独立判定（若命中则直接掉落特别彩蛋）
 # - 超稀有中有一个“传说彩蛋”全局 0.5% 概率（独立判定），奖励 300 好感 + 999 玻璃珠
 # - 不会掉重复彩蛋；若该稀有度已集齐，会自动回落/上浮到可用的稀有度
@@ -717,243 +725,102 @@ async def extra_sign_in(self, event: AstrMessageEvent):
 # ======================================================================
 
 # （放在类里）
-async def _try_drop_egg(self, event: AstrMessageEvent, is_interaction: bool) -> MessageEventResult | None:
+async def _try_drop_egg(self, event: AstrMessageEvent, is_interaction: bool,
+                        gated: bool = False) -> MessageEventResult | None:
     user_name = event.get_sender_name()
     user_id = self._get_user_id(event)
-    user = self._state["users"].setdefault(user_id, {"favor": 0, "marbles": 0})
-
-    # ── 初始化彩蛋/成就存档 ─────────────────────────────────────────────
-    store = self._state.setdefault("eggs", {})
-    u = store.setdefault(user_id, {
-        "collected": [],            # 存放 egg_id 列表（不重复）
-        "achievements": [],         # 已达成成就 key 列表
-        "special_collected": [],    # 已收集的“特别彩蛋” egg_id
-    })
-
-    # ── 定义彩蛋池（每种先给 3 个示例，其余你可继续补充到目标数量）────────
-    # 结构：("id", "标题", "正文内容（不含结尾奖励提示）", favor_delta, marbles_delta)
-    NORMAL_EGGS = [
-        ("n01", "【甜甜圈店的奇遇】", "和小碎一起吃到了超棒的草莓燕麦脆珠甜甜圈，意外地在甜甜圈上发现了玻璃珠点缀！", 5, 30),
-        ("n02", "【便利店的幸运签】", "小碎在发票上刮出了‘再来一瓶’的幸运字样，两人都笑了。", 8, 20),
-        ("n03", "【邮筒下的信封】", "风吹起的信封里掉出一枚亮晶晶的珠子，小碎帮忙捡了起来。", 10, 15),
-        ("n04", "【路边的猫】", "小碎蹲下摸了摸那只橘猫，猫打了个滚，露出一个闪光的小球。", 12, 25),
-        ("n05", "【掉落的糖纸】", "糖纸背后写着‘今天会有好事’，结果你脚边真的滚来一颗玻璃珠。", 8, 18),
-        ("n06", "【泡泡机的故障】", "泡泡里飞出一颗小珠子，小碎忙着追，结果你们都笑翻了。", 10, 20),
-        ("n07", "【夜晚的便利店灯】", "灯光闪了三下，柜台边反光的不是零钱，而是一颗漂亮的珠子。", 6, 25),
-        ("n07", "【夜晚的便利店灯】", "灯光闪了三下，柜台边反光的不是零钱，而是一颗漂亮的珠子。", 6, 25),
-        ("n08", "【公交卡的反面】", "小碎贴贴公交卡背面，发现印着一颗笑脸玻璃珠的图案，感觉被祝福了。", 15, 10),
-        ("n09", "【角落的糖果罐】", "最后一颗玻璃糖是心形的，小碎说：‘这是今天的好运！’", 10, 30),
-        ("n10", "【图书馆的回音】", "小碎在书页间发现一张旧书签，上面粘着一颗迷你珠子。", 6, 18),
-        ("n11", "【海边的贝壳】", "贝壳打开，里面藏着一颗像月亮一样的玻璃珠。", 15, 25),
-        ("n12", "【风车转动的瞬间】", "小碎拍下的照片里，多出了一道光点，那正是玻璃珠的倒影。", 12, 20),
-        ("n13", "【废弃游乐场】", "旋转木马启动了一下，地上掉出一个粉色珠子。", 8, 28),
-        ("n14", "【天台的风筝】", "线断了，但风筝带回一条缎带，上面缠着珠光。", 10, 25),
-        ("n15", "【午后的柠檬水】", "酸酸甜甜，小碎喝完一整杯，发现杯底的冰块里冻着颗玻璃珠！", 8, 35),
-        ("n16", "【路灯下的影子】", "两道影子交叠时，地上闪了下光，小碎惊呼：‘它在动！’", 5, 20),
-        ("n17", "【天桥上的彩带】", "风吹落的彩带挂在你手臂上，系着一颗蓝色小珠子。", 10, 30),
-        ("n18", "【车站的留言墙】", "‘要一起努力哦’，小碎指着那条留言笑了，旁边是一个闪亮标记。", 15, 15),
-        ("n19", "【海洋的声音】", "和小碎一起到海滩，听到人鱼们在歌唱，他们的眼泪化作了玻璃珠滚到脚边。", 12, 20),
-        ("n20", "【蛋糕店的点心】", "抹茶蛋糕上插着小碎做的旗子，下面藏了两颗玻璃珠。", 8, 40),
-        ("n21", "【自动售货机】", "买饮料多吐了一颗珠珠糖，味道居然是薄荷运气味。", 10, 15),
-        ("n22", "【街角旧相机】", "冲洗出的照片上闪着彩色反光，小碎说那是‘情绪的珠子’。", 10, 25),
-        ("n23", "【山丘上的风】", "风吹乱了头发，也吹来一颗珠子，小碎伸手接住。", 5, 35),
-        ("n24", "【纸飞机的终点】", "飞机降落在你的脚边，小碎在上面画了个笑脸。", 12, 20),
-        ("n25", "【猫头鹰的信】", "夜空里传来一声咕咕，信封掉落，里面是小碎画的珠子贴纸。", 15, 25),
-        # TODO: 补充至 25 个普通彩蛋
-    ]
-    RARE_EGGS = [
-        ("r01", "【流星下的约定】", "小碎许愿：‘如果有星星掉下来，就分你一半好运！’第二天地上真多了几颗珠子。", 20, 80),
-        ("r02", "【梦中的旋律】", "梦里小碎弹钢琴，音符变成闪光的玻璃珠飘起。", 25, 60),
-        ("r03", "【钟楼的碎片】", "钟声敲响时，掉下一片刻着花纹的玻璃片，光从中透出彩虹。", 15, 100),
-        ("r04", "【湖面的倒影】", "你与小碎低头看湖，水中星光汇成一颗大珠子。", 30, 70),
-        ("r05", "【雪天的手套】", "雪地里摸到小碎丢的手套，里面藏着一颗温热的珠子。", 20, 90),
-        ("r06", "【风铃的共鸣】", "小碎挂起的风铃在风中共振，风声带来了好运。", 25, 75),
-        ("r07", "【夜市的奖券】", "小碎抽中了‘特等奖’，奖品是一瓶装满玻璃珠的罐子！", 15, 120),
-        ("r08", "【旧车站的时刻表】", "上面手写着‘等好运的列车’，角落贴着一颗珠子。", 20, 90),
-        ("r09", "【烟花的残光】", "烟花散尽，‘每一次闪烁，都是你的一颗幸运珠。’", 25, 100),
-        ("r10", "【风中的回信】", "寄出的信没有名字，但回信附了一颗发光珠。", 30, 80),
-        # TODO: 补充至 10 个稀有彩蛋
-    ]
-    # 超稀有里包含一个“传说彩蛋”（id = u00），全局 0.5% 概率；其余奖励为两位/三位量级
-    ULTRA_EGGS = [
-        ("u00", "【群星玻璃匣】", "（恭喜达成最稀有彩蛋~！）小碎打开匣子，所有星星一齐闪烁——玻璃珠飞舞成环。", 300, 999),   # 传说彩蛋（最难）
-        ("u01", "【星辉折射镜】", "小碎用镜子对准夜空，所有星光都汇聚成你的名字。", 60, 200),
-        ("u02", "【时间夹缝票根】", "旧电影院的票根突然发光，时光倒流回最初的那天。", 100, 150),
-        ("u03", "【彩色万花筒】", "透过万花筒看世界，小碎发现每个图案中心都有颗珠子。", 50, 250),
-        ("u04", "【空中花园门票】", "风带来一张写着‘限时入场’的门票，小碎带你飞了上去。", 120, 120),
-        # TODO: 补充至 5 个超稀有彩蛋（含 u00 在内）
-    ]
-    # 特别彩蛋（与星露谷、饥荒、泰拉瑞亚相关）——固定 10% 独立概率
-    SPECIAL_EGGS = [
-        # 星露谷
-        ("s-sdv-01", "【星露谷·金星南瓜派】", "小碎帮忙烤南瓜派，结果烤盘里多了闪亮的珠子。", 25, 150),
-        ("s-sdv-02", "【星露谷·幸运午餐】", "午餐香气扑鼻，小碎咬下一口后：‘今天会超顺利的！’", 20, 100),
-        ("s-sdv-03", "【星露谷·古代水果酒】", "酒香飘满农场，瓶底藏着一颗古老的珠子。", 15, 200),
-        ("s-sdv-04", "【星露谷·火山地牢】", "熔岩菇闪着红光，小碎摘下最大的一颗递给你。", 30, 120),
-        ("s-sdv-05", "【星露谷·春】", "春天里花瓣徐徐飘落，小碎从风中捞到一颗玻璃珠。", 25, 130),
-        ("s-sdv-06", "【星露谷·流星田边】", "夜里的农田被流星照亮，一颗珠子嵌在土里发光。", 20, 160),
-        # 饥荒
-        ("s-dst-01", "【饥荒·猪王的馈赠】", "猪王开心地丢出三颗珠子，小碎接得飞快。", 15, 180),
-        ("s-dst-02", "【饥荒·舞台剧】", "影子伸手递来礼物，小碎微笑着收下。", 25, 150),
-        # 泰拉瑞亚
-        ("s-ter-01", "【泰拉瑞亚·红心水晶】", "砸碎红心后，小碎心跳了一下，地上出现两颗珠子。", 20, 200),
-        ("s-ter-02", "【泰拉瑞亚·月总的余晖】", "月亮领主化作光，化成珠雨落下。", 40, 250),
-        # TODO: 补充至 10 个特别彩蛋（可按三作继续扩展）
-    ]
-
-    # 快速索引：已拥有
-    owned = set(u["collected"])
-    owned_special = set(u["special_collected"])
+    shard = self._shard(event)
+    user = shard.users.get_or_create(user_id)
 
-    # ── 概率设定 ──────────────────────────────────────────────────────
-    # 基础掉落概率：互动 20%，普通消息 5%
-    base_p = 0.20 if is_interaction else 0.05
+    # 彩蛋池见 content/eggs.yaml；掉落引擎按内容包预建位集与稀有度别名表（见 drops.py），
+    # 与用户记录的收集位集共用位号，直接传入即可
+    engine = get_engine(eggs())
 
-    # 特别彩蛋：固定 10% 独立判定（若命中则直接走特别彩蛋逻辑）
-    from random import random, choice
-
-    # 1) 先判定特别彩蛋（独立）
-    if random() < 0.10:
-        # 可选的特别彩蛋（去重）
-        avail = [e for e in SPECIAL_EGGS if e[0] not in owned_special]
-        if not avail:
-            # 特别彩蛋已集齐，继续进入普通概率流
-            pass
-        else:
-            egg = choice(avail)
-            return await _award_egg_and_achievements(self,event, user_name, user_id, user, u, egg, rarity_tag="特别彩蛋")
-
-    # 2) 然后判定基础掉落
-    if random() >= base_p:
-        return None
-
-    # 3) 传说彩蛋全局 0.5% 独立触发（若未获得）
-    mythic = next((e for e in ULTRA_EGGS if e[0] == "u00"), None)
-    if mythic and mythic[0] not in owned and random() < 0.005:
-        return await _award_egg_and_achievements(self,event, user_name, user_id, user, u, mythic, rarity_tag="超稀有彩蛋")
-
-    # 4) 稀有度权重抽取（可按需微调）
-    #    普通 82%，稀有 17%，超稀有 1%
-    roll = random()
-    if roll < 0.82:
-        pool, tag = NORMAL_EGGS, "普通彩蛋"
-    elif roll < 0.99:
-        pool, tag = RARE_EGGS, "稀有彩蛋"
-    else:
-        pool, tag = ULTRA_EGGS, "超稀有彩蛋"
-
-    # 按稀有度挑未拥有
-    avail = [e for e in pool if e[0] not in owned]
-    # 若该池已空，则尝试回落/上浮寻找可用彩蛋
-    if not avail:
-        fallback_order = [NORMAL_EGGS, RARE_EGGS, ULTRA_EGGS]
-        for p in fallback_order:
-            cand = [e for e in p if e[0] not in owned]
-            if cand:
-                avail = cand
-                tag = "普通彩蛋" if p is NORMAL_EGGS else ("稀有彩蛋" if p is RARE_EGGS else "超稀有彩蛋")
-                break
-    if not avail:
-        # 全部收集完毕则不给重复；可以在此提示“已全收集”
+    # 概率：特别 10% 独立 → 基础（互动 20% / 普通消息 5%）→ 传说 0.5% → 普通/稀有/超稀有 82/17/1，集齐自动回落
+    drop = engine.roll(user.collected, is_interaction, rng=self._rng.for_user(user_id), gated=gated)
+    if drop is None:
         return None
-
-    egg = choice(avail)
-    return await _award_egg_and_achievements(self,event, user_name, user_id, user, u, egg, rarity_tag=tag)
+    if self._metrics.enabled:
+        self._metrics.egg_drops.inc((drop.egg.tier, "command" if is_interaction else "message"))
+    return await _award_egg_and_achievements(self, event, user_name, user_id, user, drop.egg, rarity_tag=drop.tag)
 
 # 负责发放奖励 + 成就检测 + 文案输出
 async def _award_egg_and_achievements(self, event: AstrMessageEvent, user_name: str, user_id: str,
-                                      user: dict, ustate: dict, egg_tuple: tuple, rarity_tag: str) -> MessageEventResult:
-    egg_id, title, body, f_inc, m_inc = egg_tuple
+                                      user: UserRecord, egg: Egg, rarity_tag: str) -> MessageEventResult:
+    egg_id, title, body, f_inc, m_inc = egg.id, egg.title, egg.body, egg.favor, egg.marbles
+    shard = self._shard(event)
 
-    # 写入收集
+    # 写入收集（位集，天然不重复）
+    bit = EGG_IDS.bit(egg_id)
     if rarity_tag == "特别彩蛋":
-        if egg_id not in ustate["special_collected"]:
-            ustate["special_collected"].append(egg_id)
-    if egg_id not in ustate["collected"]:
-        ustate["collected"].append(egg_id)
+        user.special |= bit
+    user.collected |= bit
 
     # 发奖励
-    user["favor"] += int(f_inc)
-    user["marbles"] += int(m_inc)
+    shard.credit(user_id, user, f"彩蛋:{egg_id}", int(f_inc), int(m_inc))
 
-    # 成就检查
-    achieve_msgs = _check_and_award_achievements(self,user_name, user_id, user, ustate)
+    # 成就检查：彩蛋计数与彩蛋奖励的好感 / 玻璃珠都变了（被动掉落不经过 user_locked 的前后比对）
+    achieve_msgs = _check_and_award_achievements(self, shard, user_name, user_id, user,
+                                                 ("collected", "special", "favor", "marbles"))
 
     # 落盘
-    self._save_state()
+    shard.save(user_id)
 
     # 文案（与示例格式一致）
     reply = (
         f"{rarity_tag}*{title}{body} 小碎好感+{f_inc}，玻璃珠+{m_inc}。\n"
         + ("\n".join(achieve_msgs) + ("\n" if achieve_msgs else ""))
-        + f"📦 当前背包｜好感度：{user.get('favor',0)}｜玻璃珠：{user.get('marbles',0)}"
+        + bag(user)
     )
     return event.plain_result(reply)
 
-def _check_and_award_achievements(self, user_name: str, user_id: str, user: dict, ustate: dict) -> list[str]:
+def _check_and_award_achievements(self, shard: Shard, user_name: str, user_id: str, user: UserRecord,
+                                  changed) -> list[str]:
     msgs = []
-    owned = set(ustate.get("collected", []))
-    owned_special = set(ustate.get("special_collected", []))
-    done = set(ustate.get("achievements", []))
-
-    # 成就定义（key, 触发条件函数, 奖励favor, 奖励marbles, 展示名）
-    ACHIEVEMENTS = [
-        ("a01_any_1",    lambda: len(owned) >= 1,   2,   5,   "「小碎的第一颗蛋」 —— 小碎开心地举起它，眼睛闪闪发光。"),
-        ("a02_any_10",   lambda: len(owned) >= 10, 10,  30,   "「彩蛋连连看」 —— 你的篮子叮叮当当，越来越重啦～"),
-        ("a03_any_25",   lambda: len(owned) >= 25, 20,  80,   "「珍重的回忆」 —— 旅程已经过了一半。"),
-        ("a04_any_40",   lambda: len(owned) >= 40, 40, 150,   "「叮咚！小碎的惊喜仓库」 —— 彩蛋多到小碎要数不过来了！"),
-        ("a05_all_50",   lambda: len(owned) >= 50, 100, 500,  "「小碎的终极闪闪收藏」 —— 全部集齐，连星星都在鼓掌～"),
-        ("a06_sp_all",   lambda: len(owned_special) >= 10, 60, 300, "「特别蛋大冒险！」 —— 小碎和你跑遍世界，收集到了所有的奇迹！"),
-    ]
-
-    for key, cond, fav, marb, title in ACHIEVEMENTS:
-        if key not in done and cond():
-            done.add(key)
-            ustate["achievements"] = list(done)
-            user["favor"] += fav
-            user["marbles"] += marb
+    # 成就定义见 content/achievements.yaml；引擎只判定 changed 里这几个计数器的成就（见 achieve.py）
+    engine = get_achievement_engine(achievements())
+    unlocked = engine.check(user, changed)
+    while unlocked:
+        for a in unlocked:
+            shard.credit(user_id, user, f"成就:{a.key}", a.favor, a.marbles)
+            if self._metrics.enabled:
+                self._metrics.achievements.inc((a.key,))
             # 小碎恭喜语（全收集与特别全收集更激动一些）
-            if key in ("a05_all_50", "a06_sp_all"):
-                exclaim = "哇——太厉害了！" if key == "a06_sp_all" else "天哪，了不起！"
+            if a.exclaim:
                 msgs.append(
-                    f"🎖️ {user_name}，恭喜你触发了【{title}】成就！{exclaim}小碎送你 好感+{fav}、玻璃珠+{marb}～"
+                    f"🎖️ {user_name}，恭喜你触发了【{a.title}】成就！{a.exclaim}小碎送你 好感+{a.favor}、玻璃珠+{a.marbles}～"
                 )
             else:
                 msgs.append(
-                    f"🏅 {user_name}，恭喜你触发了【{title}】成就！小碎送你 好感+{fav}、玻璃珠+{marb}～"
+                    f"🏅 {user_name}，恭喜你触发了【{a.title}】成就！小碎送你 好感+{a.favor}、玻璃珠+{a.marbles}～"
                 )
+        # 成就奖励本身改了好感 / 玻璃珠，可能又够上了这两个计数器的成就
+        unlocked = engine.check(user, ("favor", "marbles"))
 
     return msgs
 
 # ---- 新增指令：查看成就 ----
 @filter.command("查看成就")
+@metered
 async def check_achievements(self, event: AstrMessageEvent):
     """查看已解锁的成就与收集进度"""
     user_name = event.get_sender_name()
+    shard = self._shard(event)
     user_id = self._get_user_id(event)
-    eggs_state = self._state.get("eggs", {})
-    u = eggs_state.get(user_id)
+    await shard.prefetch(user_id)
+    user = shard.users.get(user_id)
 
-    if not u:
+    if user is None or not (user.collected or user.achievements):
         yield event.plain_result(f"{user_name} 还没有发现任何彩蛋呢～快去探索看看吧 (๑•̀ㅂ•́)و✧")
         return
 
-    collected = u.get("collected", [])
-    specials = u.get("special_collected", [])
-    achievements = u.get("achievements", [])
-
-    # 全部成就列表（与彩蛋系统定义保持一致）
-    ACHIEVEMENTS_INFO = {
-        "a01_any_1":  "「小碎的第一颗蛋」 —— 小碎开心地举起它，眼睛闪闪发光。",
-        "a02_any_10": "「彩蛋连连看」 —— 你的篮子叮叮当当，越来越重啦～",
-        "a03_any_25": "「珍重的回忆」 —— 旅程已经过了一半。",
-        "a04_any_40": "「叮咚！小碎的惊喜仓库」 —— 彩蛋多到小碎要数不过来了！",
-        "a05_all_50": "「小碎的终极闪闪收藏」 —— 全部集齐，连星星都在鼓掌～",
-        "a06_sp_all": "「特别蛋大冒险！」 —— 小碎和你跑遍世界，收集到了所有的奇迹！",
-    }
-
-    unlocked_names = [ACHIEVEMENTS_INFO[a] for a in achievements if a in ACHIEVEMENTS_INFO]
-    locked_names = [ACHIEVEMENTS_INFO[a] for a in ACHIEVEMENTS_INFO if a not in achievements]
+    # 全部成就列表（与彩蛋系统共用 content/achievements.yaml），未解锁的附上进度
+    pack = eggs()
+    engine = get_achievement_engine(achievements())
+    defs = achievements().items
+    unlocked_names = [a.title for a in defs if user.achievements & ACH_IDS.bit(a.key)]
+    locked_names = [f"{a.title}（%d/%d）" % engine.progress(user, a)
+                    for a in defs if not user.achievements & ACH_IDS.bit(a.key)]
 
     reply = (
         f"📜 小碎的成就册：\n"
@@ -961,14 +828,110 @@ async def check_achievements(self, event: AstrMessageEvent):
         + (("\n".join(f"✅ {n}" for n in unlocked_names)) if unlocked_names else "暂无成就～\n")
         + "\n——— 未解锁 ——\n"
         + (("\n".join(f"🔒 {n}" for n in locked_names)) if locked_names else "全部解锁啦！🌟")
-        + f"\n\n🥚 彩蛋收集进度：{len(collected)}/50"
-        + f"\n✨ 特别彩蛋收集进度：{len(specials)}/10"
+        + f"\n\n🥚 彩蛋收集进度：{user.collected.bit_count()}/{pack.total}"
+        + f"\n✨ 特别彩蛋收集进度：{user.special.bit_count()}/{pack.total_special}"
     )
     yield event.plain_result(reply)
 
 
 
+# ---- 新增指令：账本（最近的好感度/玻璃珠流水 + 余额核对）----
+@filter.command("账本")
+@metered
+async def show_ledger(self, event: AstrMessageEvent):
+    """查看自己最近 10 笔好感度/玻璃珠变动，并与当前背包核对"""
+    user_name = event.get_sender_name()
+    shard = self._shard(event)
+    user_id = self._get_user_id(event)
+    entries = shard.ledger.history(user_id, limit=10)
+    if not entries:
+        yield event.plain_result(f"{user_name} 的账本还是空的哦～")
+        return
+
+    def fmt_signed(n: int) -> str:
+        return f"+{n}" if n >= 0 else f"{n}"
+
+    lines = []
+    for ts, _uid, src, df, dm in (e[:5] for e in entries):
+        when = datetime.fromtimestamp(ts).strftime("%m-%d %H:%M")
+        parts = ([f"好感{fmt_signed(df)}"] if df else []) + ([f"玻璃珠{fmt_signed(dm)}"] if dm else [])
+        lines.append(f"{when} {src} {'，'.join(parts) or '无变动'}")
+
+    user = shard.users.get(user_id)
+    current = (user.favor, user.marbles) if user else (0, 0)
+    check = "✅ 与背包一致" if shard.ledger.balance(user_id) == current else "⚠️ 与背包不一致，请联系管理员核对"
+    yield event.plain_result(
+        f"📒 {user_name} 最近的流水：\n" + "\n".join(lines)
+        + f"\n📦 当前背包｜好感度：{current[0]}｜玻璃珠：{current[1]}｜{check}"
+    )
+
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.2f} GB"
+
+
+def _fmt_seconds(sec: float | None) -> str:
+    if sec is None:
+        return "-"
+    return f"{sec * 1e3:.2f} ms" if sec < 1 else f"{sec:.2f} s"
+
+
+# ---- 新增指令：小碎状态（管理员；运行指标摘要）----
+@filter.permission_type(filter.PermissionType.ADMIN)
+@filter.command("小碎状态")
+async def show_status(self, event: AstrMessageEvent):
+    """查看运行指标：内存、用户数、落盘、各指令耗时、彩蛋掉落与成就解锁（完整指标见 metrics_textfile 导出）"""
+    m = self._metrics
+    shards = list(self._shards)
+    hours, rest = divmod(int(time.time() - m.started), 3600)
+    rss = m.gauge_value("xiaosui_process_resident_bytes")
+    lines = [
+        f"📊 小碎运行状态（已运行 {hours} 小时 {rest // 60} 分）",
+        f"内存 {_fmt_bytes(rss) if rss is not None else '未知'}｜用户 {sum(len(s.users) for s in shards)}"
+        f"（{len(shards)} 个存档）｜存档 {_fmt_bytes(sum(s.state_bytes() for s in shards))}"
+        f"｜待落盘 {sum(s.persist.dirty for s in shards)}",
+    ]
+    if not m.enabled:
+        lines.append("指标统计未开启（配置项 metrics_enabled）")
+        yield event.plain_result("\n".join(lines))
+        return
+
+    backends = sorted({backend for backend, _ in m.saves.values})
+    for backend in backends:
+        lines.append(
+            f"落盘（{backend}）：成功 {m.saves.get((backend, 'ok')):.0f} 次，失败 {m.saves.get((backend, 'error')):.0f} 次，"
+            f"写入 {_fmt_bytes(m.save_bytes.get((backend,)))}，"
+            f"p50 {_fmt_seconds(m.save_seconds.quantile((backend,), 0.5))} / "
+            f"p99 {_fmt_seconds(m.save_seconds.quantile((backend,), 0.99))}"
+        )
+    if not backends:
+        lines.append("落盘：尚未落盘")
+
+    lines.append("指令（次数｜p50｜p99｜限流｜异常）：")
+    for key in sorted(m.command_seconds.series, key=lambda k: -m.command_seconds.count(k)):
+        lines.append(
+            f"  {key[0]}：{m.command_seconds.count(key)}｜{_fmt_seconds(m.command_seconds.quantile(key, 0.5))}"
+            f"｜{_fmt_seconds(m.command_seconds.quantile(key, 0.99))}"
+            f"｜{m.rate_limited.get(key):.0f}｜{m.command_errors.get(key):.0f}"
+        )
+
+    drops: dict[str, float] = {}
+    for (tier, _source), v in m.egg_drops.values.items():
+        drops[tier] = drops.get(tier, 0) + v
+    lines.append("彩蛋掉落：" + ("，".join(f"{TIER_TAG[t]} {v:.0f}" for t, v in drops.items()) or "暂无"))
+    lines.append(f"成就解锁：{m.achievements.total():.0f} 次")
+    if self._exporter is not None:
+        lines.append(f"指标导出：{self._exporter.path}")
+    yield event.plain_result("\n".join(lines))
+
+
 @filter.command("程序员彩蛋测试")
+@metered
+@user_locked
 async def dev_force_egg(self, event: AstrMessageEvent):
     """
     开发者用：固定掉落一个普通彩蛋（n01），不依赖内部私有方法。
@@ -976,43 +939,27 @@ async def dev_force_egg(self, event: AstrMessageEvent):
     """
     user_name = event.get_sender_name()
     user_id = self._get_user_id(event)
-    user = self._state["users"].setdefault(user_id, {"favor": 0, "marbles": 0})
-
-    # 初始化彩蛋存档
-    store = self._state.setdefault("eggs", {})
-    u = store.setdefault(user_id, {
-        "collected": [],
-        "achievements": [],
-        "special_collected": [],
-    })
+    shard = self._shard(event)
+    user = shard.users.get_or_create(user_id)
 
-    egg = ("n01", "【甜甜圈店的奇遇】", "和小碎一起吃到了超棒的草莓燕麦脆珠甜甜圈，意外地在甜甜圈上发现了玻璃珠点缀！", 5, 30)
+    egg = eggs().by_id["n01"]
+    bit = EGG_IDS.bit(egg.id)
 
     # 去重：已收集就提示
-    if egg[0] in set(u.get("collected", [])):
+    if user.collected & bit:
         yield event.plain_result(
-            f"普通彩蛋*{egg[1]}你已经拥有啦～\n"
-            f"📦 当前背包｜好感度：{user.get('favor',0)}｜玻璃珠：{user.get('marbles',0)}"
+            f"普通彩蛋*{egg.title}你已经拥有啦～\n"
+            + bag(user)
         )
         return
 
     # 写入与结算
-    u["collected"].append(egg[0])
-    user["favor"] = user.get("favor", 0) + egg[3]
-    user["marbles"] = user.get("marbles", 0) + egg[4]
-    self._save_state()
+    user.collected |= bit
+    shard.credit(user_id, user, "程序员彩蛋测试", egg.favor, egg.marbles)
+    shard.save(user_id)
 
     # 展示
     yield event.plain_result(
-        f"普通彩蛋*{egg[1]}{egg[2]} 小碎好感+{egg[3]}，玻璃珠+{egg[4]}。\n"
-        f"📦 当前背包｜好感度：{user.get('favor',0)}｜玻璃珠：{user.get('marbles',0)}"
+        f"普通彩蛋*{egg.title}{egg.body} 小碎好感+{egg.favor}，玻璃珠+{egg.marbles}。\n"
+        + bag(user)
     )
-
-
-
-    
-
-
-    async def terminate(self):
-        """可选择实现异步的插件销毁方法，当插件被卸载/停用时会调用。"""
-        self._save_state()
@@ -0,0 +1,251 @@
+"""
+运行指标：计数器 / 直方图 / 仪表，供 /小碎状态 查看，也可导出为 Prometheus 文本格式
+
+- 全部在事件循环线程里更新，不加锁；标签是按声明顺序排列的取值元组
+- 直方图用固定的对数桶（50 µs ~ 10 s），记录一次就是一次二分查找 + 两次加法；分位数按桶线性插值估算
+- 仪表不存值，导出时调用回调现取（用户数、内存、存档大小等）
+- 关闭（metrics_enabled=false）时 enabled 为 False，各埋点先判断它再做事，计时也不做
+- 导出：render() 生成 Prometheus 文本；配置了 metrics_textfile 时后台按间隔原子写入该文件
+  （配合 node_exporter 的 textfile collector 抓取）
+"""
+import asyncio
+import os
+import sys
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable
+
+from astrbot.api import logger
+
+from .storage import atomic_write_bytes
+
+# 耗时直方图的桶上界（秒）
+LATENCY_BUCKETS = (
+    50e-6, 100e-6, 250e-6, 500e-6,
+    1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3, 250e-3, 500e-3,
+    1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Counter:
+    kind = "counter"
+
+    __slots__ = ("name", "help", "labels", "values")
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, key: tuple = (), n: float = 1) -> None:
+        self.values[key] = self.values.get(key, 0) + n
+
+    def get(self, key: tuple = ()) -> float:
+        return self.values.get(key, 0)
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def samples(self):
+        for key, v in sorted(self.values.items()):
+            yield self.name, _label_str(self.labels, key), v
+
+
+class Histogram:
+    kind = "histogram"
+
+    __slots__ = ("name", "help", "labels", "buckets", "series")
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = buckets
+        # 标签取值 -> [各桶计数（非累计，末位为 +Inf）, 总和]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, key: tuple, value: float) -> None:
+        s = self.series.get(key)
+        if s is None:
+            s = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        s[0][bisect_left(self.buckets, value)] += 1
+        s[1] += value
+
+    def count(self, key: tuple) -> int:
+        s = self.series.get(key)
+        return sum(s[0]) if s else 0
+
+    def quantile(self, key: tuple, q: float) -> float | None:
+        """按桶线性插值估算分位数；落在 +Inf 桶时返回最后一个有限上界"""
+        s = self.series.get(key)
+        if not s:
+            return None
+        counts = s[0]
+        rank = q * sum(counts)
+        seen = 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lo = self.buckets[i - 1] if i else 0.0
+                return lo + (self.buckets[i] - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def samples(self):
+        for key, (counts, total) in sorted(self.series.items()):
+            acc = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                yield f"{self.name}_bucket", _label_str(self.labels, key, f'le="{_num(bound)}"'), acc
+            yield f"{self.name}_sum", _label_str(self.labels, key), total
+            yield f"{self.name}_count", _label_str(self.labels, key), acc
+
+
+class Gauge:
+    """导出时才取值：fn() 返回一个数，或 {标签取值元组: 数}；返回 None 时不导出"""
+
+    kind = "gauge"
+
+    __slots__ = ("name", "help", "labels", "fn")
+
+    def __init__(self, name: str, help: str, fn: Callable, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels, self.fn = name, help, labels, fn
+
+    def read(self) -> dict[tuple, float]:
+        try:
+            v = self.fn()
+        except Exception as e:
+            logger.error(f"读取指标 {self.name} 失败：{e}")
+            return {}
+        if v is None:
+            return {}
+        return v if isinstance(v, dict) else {(): v}
+
+    def samples(self):
+        for key, v in sorted(self.read().items()):
+            yield self.name, _label_str(self.labels, key), v
+
+
+def rss_bytes() -> int | None:
+    """当前常驻内存；读不到 /proc 时退回峰值（resource），都没有时为 None"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # macOS 以字节计，Linux 以 KB 计
+
+
+class Metrics:
+    """
+    插件的指标表。埋点处统一写成 `if m.enabled: m.xxx.inc(...)`，关闭时只多一次属性判断。
+    名称遵循 Prometheus 约定：xiaosui_ 前缀，计数器以 _total 结尾，时长以秒计。
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started = time.time()
+        self._all: list = []
+        self.command_seconds = self._add(Histogram(
+            "xiaosui_command_seconds", "指令处理耗时（不含等待框架发送回复的时间）", ("command",)))
+        self.command_errors = self._add(Counter(
+            "xiaosui_command_errors_total", "指令处理中抛出的异常", ("command",)))
+        self.rate_limited = self._add(Counter(
+            "xiaosui_rate_limited_total", "被冷却/限流拦下的指令", ("command",)))
+        self.saves = self._add(Counter(
+            "xiaosui_saves_total", "落盘次数", ("backend", "result")))
+        self.save_seconds = self._add(Histogram(
+            "xiaosui_save_seconds", "一次落盘（账本 + 存档）的耗时", ("backend",)))
+        self.save_bytes = self._add(Counter(
+            "xiaosui_save_bytes_total", "写入存档的字节数（sqlite 为写入行的数据量）", ("backend",)))
+        self.egg_drops = self._add(Counter(
+            "xiaosui_egg_drops_total", "彩蛋掉落", ("tier", "source")))
+        self.achievements = self._add(Counter(
+            "xiaosui_achievement_unlocks_total", "成就解锁", ("achievement",)))
+        self.gauge("xiaosui_process_resident_bytes", "进程常驻内存", rss_bytes)
+        self.gauge("xiaosui_uptime_seconds", "插件运行时长", lambda: time.time() - self.started)
+
+    def _add(self, metric):
+        self._all.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, fn: Callable, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(name, help, fn, labels))
+
+    def gauge_value(self, name: str, key: tuple = ()) -> float | None:
+        for m in self._all:
+            if m.kind == "gauge" and m.name == name:
+                return m.read().get(key)
+        return None
+
+    def render(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        lines = []
+        for m in self._all:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for name, labels, value in m.samples():
+                lines.append(f"{name}{labels} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path) -> None:
+        atomic_write_bytes(path, self.render().encode("utf-8"))
+
+
+class TextfileExporter:
+    """每 interval 秒把指标写入 path（原子替换）；停止时再写一次"""
+
+    def __init__(self, metrics: Metrics, path: Path, interval: float = 15.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = max(1.0, float(interval))
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._task = asyncio.create_task(self._run())
+
+    def export(self) -> bool:
+        try:
+            self.metrics.write_textfile(self.path)
+            return True
+        except Exception as e:
+            logger.error(f"导出指标失败：{e}")
+            return False
+
+    async def _run(self) -> None:
+        while True:
+            self.export()
+            await asyncio.sleep(self.interval)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.export()
@@ -0,0 +1,118 @@
+"""
+冷却 / 限流引擎
+
+- 令牌桶：每条限制 Limit(capacity, per, scope) 表示“最多连续 capacity 次，之后每 per 秒恢复一次”；
+  capacity=1 就是普通冷却（如投喂 180 秒一次）
+- 作用范围：user（每人）/ group（每群）/ global（全体），按 (指令, 范围, id) 各自一个桶
+- 一次请求要同时通过该指令的所有限制才放行；不放行时一个令牌都不扣，返回还需等待的秒数
+- 桶只在内存里，不写进存档；桶“补满”的时刻就是它的过期时间，挂在哈希时间轮上：
+  每次调用顺手推进时间轮，过期的桶整格批量删除，不会越积越多
+"""
+import time
+from dataclasses import dataclass
+from typing import Callable, Hashable
+
+SCOPES = ("user", "group", "global")
+
+
+@dataclass(frozen=True, slots=True)
+class Limit:
+    capacity: int          # 桶容量（允许连续触发的次数）
+    per: float             # 恢复一次所需秒数
+    scope: str = "user"    # user / group / global
+
+    def __post_init__(self):
+        if self.scope not in SCOPES:
+            raise ValueError(f"未知的限流范围：{self.scope}")
+        if self.capacity < 1 or self.per <= 0:
+            raise ValueError("capacity 至少为 1，per 必须大于 0")
+
+
+class TimerWheel:
+    """
+    哈希时间轮：slots 个格子，每格 tick 秒；到期时间超过一圈的项留在格子里，转到时再比较。
+    schedule 会把 key 从旧格子挪到新格子；advance(now) 返回并移除所有已到期的 key。
+    """
+
+    def __init__(self, slots: int = 512, tick: float = 1.0):
+        self.tick = tick
+        self._slots: list[set] = [set() for _ in range(slots)]
+        self._deadline: dict[Hashable, float] = {}
+        self._cursor: int | None = None  # 已处理到的 tick 序号
+
+    def __len__(self) -> int:
+        return len(self._deadline)
+
+    def _slot(self, when: float) -> set:
+        return self._slots[int(when // self.tick) % len(self._slots)]
+
+    def schedule(self, key: Hashable, when: float) -> None:
+        old = self._deadline.get(key)
+        if old is not None:
+            self._slot(old).discard(key)
+        self._deadline[key] = when
+        self._slot(when).add(key)
+
+    def cancel(self, key: Hashable) -> None:
+        old = self._deadline.pop(key, None)
+        if old is not None:
+            self._slot(old).discard(key)
+
+    def advance(self, now: float) -> list:
+        current = int(now // self.tick)
+        if self._cursor is None:
+            self._cursor = current - 1
+        start = max(self._cursor + 1, current - len(self._slots) + 1)  # 落后超过一圈时每格只需看一次
+        expired = []
+        for t in range(start, current + 1):
+            slot = self._slots[t % len(self._slots)]
+            if not slot:
+                continue
+            for key in [k for k in slot if self._deadline[k] <= now]:
+                slot.discard(key)
+                del self._deadline[key]
+                expired.append(key)
+        self._cursor = max(self._cursor, current)
+        return expired
+
+
+class RateLimiter:
+    def __init__(self, slots: int = 512, tick: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock  # 离线模拟时换成虚拟时钟
+        # (指令, 范围, id, 限制) -> [剩余令牌, 上次更新时间]
+        self._buckets: dict[tuple, list[float]] = {}
+        self._wheel = TimerWheel(slots, tick)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def hit(self, command: str, limits: tuple[Limit, ...], user_id: str, group_id: str | None = None,
+            now: float | None = None) -> float:
+        """尝试触发一次：全部限制都有令牌时扣除并返回 0；否则不扣，返回最长还需等待的秒数"""
+        now = self.clock() if now is None else now
+        for key in self._wheel.advance(now):
+            self._buckets.pop(key, None)
+
+        checked = []
+        wait = 0.0
+        for limit in limits:
+            ident = user_id if limit.scope == "user" else group_id if limit.scope == "group" else ""
+            if ident is None:
+                continue  # 私聊没有群范围的限制
+            key = (command, limit.scope, ident, limit)
+            bucket = self._buckets.get(key)
+            tokens = limit.capacity if bucket is None else min(
+                limit.capacity, bucket[0] + (now - bucket[1]) / limit.per
+            )
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) * limit.per)
+            checked.append((key, limit, tokens))
+        if wait:
+            return wait
+
+        for key, limit, tokens in checked:
+            tokens -= 1
+            self._buckets[key] = [tokens, now]
+            # 补满之后与新桶等价，到那时整桶删除
+            self._wheel.schedule(key, now + (limit.capacity - tokens) * limit.per)
+        return 0.0
@@ -0,0 +1,550 @@
+"""
+用户记录层（内存里的紧凑表示）
+
+- 每位用户一个 __slots__ 数据类 UserRecord，取代 {"favor":…, "last_sign": "YYYY-MM-DD", …} 的自由字典
+  以及 eggs[user_id] 里的三个字符串列表
+- 日期存成日序号（date.toordinal()，0 表示从未），比较今天是否做过只是一次整数比较
+- 签到历史是一个滚动位图 sign_bits：第 k 位 = last_sign 往前第 k 天是否签到，只留最近 SIGN_WINDOW 天；
+  签到时左移补位，连续天数 = 末尾连续 1 的个数，最长连续 = 反复 x & (x >> 1) 的轮数，都是位运算。
+  存档里写成 base64（sign_history，一年的位图不到 64 个字符），每人大小固定
+- 彩蛋 / 特别彩蛋 / 成就都存成 int 位集；位号由进程内的 Interner 分配（只增不改），
+  内容包热重载、调整顺序都不会让已有位号变化
+- UserTable 负责与现有存档格式互转：load() 读 {"users": …, "eggs": …}，export() 写回同样的结构，
+  存档文件格式不变，旧数据无需迁移
+- 写时复制快照：begin_snapshot() 只在事件循环上记下“此刻有哪些记录”，导出（及之后的序列化）在 IO 线程里做；
+  导出期间指令要动某条还没导出的记录时，先复制一份旧值留给快照，所以快照始终是开始那一刻的状态
+- 按需加载（LazyUserTable，sqlite 后端）：启动时不读任何用户，第一次用到时按主键取一行，内存里只留最近用过的
+  capacity 位（LRU）；有未落盘修改、正在写盘或正在执行指令的用户不淘汰
+"""
+import base64
+import copy
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+
+_DATE_FIELDS = ("last_sign", "last_divine", "last_extra_sign")
+SIGN_WINDOW = 366  # 签到位图保留的天数（连续天数最多也只数到这里）
+_SIGN_MASK = (1 << SIGN_WINDOW) - 1
+
+
+class Interner:
+    """字符串 id ↔ 小整数位号；只追加，位号一经分配不再改变"""
+
+    def __init__(self):
+        self._ids: list[str] = []
+        self._index: dict[str, int] = {}
+        self._lock = threading.Lock()  # 只在分配新位号时用：存档可能在 IO 线程里加载
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def intern(self, key: str) -> int:
+        i = self._index.get(key)
+        if i is None:
+            with self._lock:
+                i = self._index.get(key)
+                if i is None:
+                    i = len(self._ids)
+                    self._ids.append(key)
+                    self._index[key] = i
+        return i
+
+    def name(self, i: int) -> str:
+        return self._ids[i]
+
+    def bit(self, key: str) -> int:
+        return 1 << self.intern(key)
+
+    def mask_of(self, keys) -> int:
+        mask = 0
+        for k in keys:
+            mask |= 1 << self.intern(k)
+        return mask
+
+    def ids_of(self, mask: int) -> list[str]:
+        """位集 → id 列表（按位号从小到大）"""
+        out = []
+        while mask:
+            low = mask & -mask
+            out.append(self._ids[low.bit_length() - 1])
+            mask ^= low
+        return out
+
+
+EGG_IDS = Interner()   # 彩蛋 id 的位号（drops.py 的位集也用它）
+ACH_IDS = Interner()   # 成就 key 的位号
+
+
+def day_ordinal(value) -> int:
+    """'YYYY-MM-DD' / date → 日序号；空值或格式不对时为 0"""
+    if isinstance(value, date):
+        return value.toordinal()
+    if not value:
+        return 0
+    try:
+        return date.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        return 0
+
+
+def day_iso(ordinal: int) -> str | None:
+    return date.fromordinal(ordinal).isoformat() if ordinal else None
+
+
+def trailing_ones(x: int) -> int:
+    """最低位起连续 1 的个数"""
+    return (x ^ (x + 1)).bit_length() - 1
+
+
+def longest_run(x: int) -> int:
+    """最长的一段连续 1：每轮 x &= x >> 1 把每段缩短一位，缩到 0 的轮数就是最长段的长度"""
+    n = 0
+    while x:
+        x &= x >> 1
+        n += 1
+    return n
+
+
+def _encode_bits(bits: int) -> str:
+    return base64.b64encode(bits.to_bytes((bits.bit_length() + 7) // 8, "little")).decode("ascii")
+
+
+def _decode_bits(text) -> int:
+    try:
+        return int.from_bytes(base64.b64decode(text), "little") & _SIGN_MASK
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass(slots=True)
+class UserRecord:
+    favor: int = 0
+    marbles: int = 0
+    last_sign: int = 0          # 日序号，0 = 从未
+    last_divine: int = 0
+    last_extra_sign: int = 0
+    sign_bits: int = 0          # 签到位图：第 k 位 = last_sign 往前第 k 天（见模块说明）
+    best_streak: int = 0        # 历史最长连续签到天数（位图窗口之外的也记得）
+    name: str | None = None     # 最近一次签到时的昵称（签到榜展示用）
+    collected: int = 0          # 已收集彩蛋位集（位号见 EGG_IDS）
+    special: int = 0            # 其中的特别彩蛋
+    achievements: int = 0       # 已达成成就位集（位号见 ACH_IDS）
+    groups: tuple[str, ...] | None = None  # 出现过的群（群排行榜用）
+    extra: dict | None = None   # 存档里其它未知字段，原样保留
+
+    @classmethod
+    def from_dicts(cls, user: dict | None, egg: dict | None) -> "UserRecord":
+        rec = cls()
+        if user:
+            rest = dict(user)
+            rec.favor = int(rest.pop("favor", 0) or 0)
+            rec.marbles = int(rest.pop("marbles", 0) or 0)
+            for key in _DATE_FIELDS:
+                setattr(rec, key, day_ordinal(rest.pop(key, None)))
+            rest.pop("last_feed_ts", None)  # 旧版投喂冷却时间戳：冷却已改由 ratelimit.py 在内存里管理，读到即丢弃
+            # 旧存档没有签到位图：有 last_sign 时当作那一天签过
+            rec.sign_bits = _decode_bits(rest.pop("sign_history", "")) or (1 if rec.last_sign else 0)
+            rec.best_streak = int(rest.pop("best_streak", 0) or 0)
+            rec.name = rest.pop("name", None)
+            groups = rest.pop("groups", None)
+            rec.groups = tuple(sys.intern(str(g)) for g in groups) if groups else None
+            rec.extra = rest or None
+        if egg:
+            rec.collected = EGG_IDS.mask_of(egg.get("collected", []))
+            rec.special = EGG_IDS.mask_of(egg.get("special_collected", []))
+            rec.achievements = ACH_IDS.mask_of(egg.get("achievements", []))
+        return rec
+
+    def user_dict(self) -> dict:
+        """导出为旧版 users[user_id] 结构（只写出有值的日期字段）"""
+        out = dict(self.extra) if self.extra else {}
+        out["favor"] = self.favor
+        out["marbles"] = self.marbles
+        for key in _DATE_FIELDS:
+            ordinal = getattr(self, key)
+            if ordinal:
+                out[key] = day_iso(ordinal)
+        # 只有 last_sign 那一天的位图、最长 1 天的纪录都能从 last_sign 推出来，不写（旧存档原样导出）
+        if self.sign_bits > 1:
+            out["sign_history"] = _encode_bits(self.sign_bits)
+        if self.best_streak > 1:
+            out["best_streak"] = self.best_streak
+        if self.name is not None:
+            out["name"] = self.name
+        if self.groups:
+            out["groups"] = list(self.groups)
+        return out
+
+    def egg_dict(self) -> dict | None:
+        """导出为旧版 eggs[user_id] 结构；从未收集/达成过任何东西时为 None"""
+        if not (self.collected or self.achievements):
+            return None
+        return {
+            "collected": EGG_IDS.ids_of(self.collected),
+            "achievements": ACH_IDS.ids_of(self.achievements),
+            "special_collected": EGG_IDS.ids_of(self.special),
+        }
+
+    def absorb(self, other: "UserRecord") -> None:
+        """并入另一条记录的日期（取较晚者）、签到历史、彩蛋与成就（取并集）、昵称与群；余额由调用方记账转移"""
+        anchor = max(self.last_sign, other.last_sign)
+        if anchor:
+            self.sign_bits = self._sign_bits_at(anchor) | other._sign_bits_at(anchor)
+            self.best_streak = max(self.best_streak, other.best_streak, longest_run(self.sign_bits))
+        for key in _DATE_FIELDS:
+            if getattr(other, key) > getattr(self, key):
+                setattr(self, key, getattr(other, key))
+        if self.name is None:
+            self.name = other.name
+        for g in other.groups or ():
+            self.add_group(g)
+        self.collected |= other.collected
+        self.special |= other.special
+        self.achievements |= other.achievements
+
+    # ---- 签到历史 ----
+    def _sign_bits_at(self, day: int) -> int:
+        """把位图的第 0 位对齐到 day（day 不早于 last_sign）"""
+        if not self.last_sign:
+            return 0
+        return (self.sign_bits << (day - self.last_sign)) & _SIGN_MASK
+
+    def mark_signed(self, day: int) -> int:
+        """记下 day 签到并把 last_sign 移到 day，返回截至 day 的连续签到天数"""
+        if day < self.last_sign:  # 时钟回拨：只补上那一位
+            self.sign_bits |= 1 << min(self.last_sign - day, SIGN_WINDOW - 1)
+            return self.sign_streak
+        self.sign_bits = self._sign_bits_at(day) | 1
+        self.last_sign = day
+        streak = trailing_ones(self.sign_bits)
+        if streak > self.best_streak:
+            self.best_streak = streak
+        return streak
+
+    @property
+    def sign_streak(self) -> int:
+        """截至最近一次签到的连续天数（是否已经断签要看今天，见 streak_on）"""
+        return trailing_ones(self.sign_bits)
+
+    def streak_on(self, today: int) -> int:
+        """今天的连续签到天数：今天还没签时，昨天签了也算没断；断签后为 0"""
+        if not self.last_sign or today - self.last_sign > 1:
+            return 0
+        return self.sign_streak
+
+    @property
+    def longest_streak(self) -> int:
+        return max(self.best_streak, longest_run(self.sign_bits))
+
+    def sign_range(self, first: int, last: int) -> int:
+        """[first, last] 这些天的签到位图，第 j 位 = last - j 那天；窗口以外的天为 0"""
+        if not self.last_sign:
+            return 0
+        shift = self.last_sign - last
+        bits = self.sign_bits >> shift if shift >= 0 else self.sign_bits << -shift
+        return bits & ((1 << (last - first + 1)) - 1)
+
+    def add_group(self, group: str) -> bool:
+        """记下用户出现过的群；新群返回 True"""
+        if self.groups and group in self.groups:
+            return False
+        self.groups = (*(self.groups or ()), sys.intern(group))
+        return True
+
+
+class TableSnapshot:
+    """
+    UserTable 在某一刻的写时复制快照。
+    - pending：开始时列入快照、还没导出的记录（引用的是活记录）
+    - frozen：导出前就要被指令修改的记录，修改前复制的旧值
+    export() 在 IO 线程里逐条取记录：还在 pending 里的，持锁导出活记录（此时事件循环想动它会等这一条导完）；
+    已被冻结的导出冻结副本。freeze() 在事件循环上、修改记录之前调用。
+    """
+
+    __slots__ = ("order", "pending", "frozen", "lock")
+
+    def __init__(self, rows: dict[str, UserRecord], user_ids):
+        self.order = list(rows) if user_ids is None else [uid for uid in user_ids if uid in rows]
+        self.pending = dict(rows) if user_ids is None else {uid: rows[uid] for uid in self.order}
+        self.frozen: dict[str, UserRecord] = {}
+        self.lock = threading.Lock()
+
+    def freeze(self, user_id: str) -> None:
+        with self.lock:
+            rec = self.pending.pop(user_id, None)
+            if rec is not None:
+                # 记录里可变的只有标量字段；groups 是元组，extra 只读不改，浅复制即可
+                self.frozen[user_id] = copy.copy(rec)
+
+    def export(self) -> tuple[dict, dict]:
+        """导出为存档结构 (users, eggs)，与 UserTable.export 相同（在 IO 线程里调用）"""
+        users: dict[str, dict] = {}
+        eggs: dict[str, dict] = {}
+        lock, pending, frozen = self.lock, self.pending, self.frozen
+        for uid in self.order:
+            with lock:
+                rec = pending.pop(uid, None)
+                if rec is not None:
+                    users[uid] = rec.user_dict()
+                    egg = rec.egg_dict()
+            if rec is None:
+                rec = frozen.pop(uid)
+                users[uid] = rec.user_dict()
+                egg = rec.egg_dict()
+            if egg is not None:
+                eggs[uid] = egg
+        return users, eggs
+
+
+class UserTable:
+    """user_id → UserRecord"""
+
+    lazy = False
+
+    def __init__(self):
+        self._rows: dict[str, UserRecord] = {}
+        self._snap: TableSnapshot | None = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._rows
+
+    # get / get_or_create / pop 是指令拿到记录的唯一入口：有快照在导出时，先把这条记录的旧值留给快照
+    def get(self, user_id: str) -> UserRecord | None:
+        if self._snap is not None:
+            self._snap.freeze(user_id)
+        return self._rows.get(user_id)
+
+    def get_or_create(self, user_id: str) -> UserRecord:
+        if self._snap is not None:
+            self._snap.freeze(user_id)
+        rec = self._rows.get(user_id)
+        if rec is None:
+            rec = self._rows[user_id] = UserRecord()
+        return rec
+
+    def put(self, user_id: str, rec: UserRecord) -> None:
+        if self._snap is not None:
+            self._snap.freeze(user_id)
+        self._rows[user_id] = rec
+
+    def pop(self, user_id: str) -> UserRecord | None:
+        if self._snap is not None:
+            self._snap.freeze(user_id)
+        return self._rows.pop(user_id, None)
+
+    def begin_snapshot(self, user_ids=None) -> TableSnapshot:
+        """
+        开始一次写时复制快照（user_ids 为 None 时包含全部记录），在事件循环上调用，只复制一份 id → 记录 的引用表。
+        同一时刻只能有一个快照；导出完成后调用 end_snapshot()。
+        """
+        self._snap = TableSnapshot(self._rows, user_ids)
+        return self._snap
+
+    def end_snapshot(self) -> None:
+        self._snap = None
+
+    def items(self):
+        return self._rows.items()
+
+    @classmethod
+    def load(cls, users: dict, eggs: dict) -> "UserTable":
+        """从存档里的 users / eggs 两个字典建表（只在 eggs 里出现的用户也会建记录）"""
+        table = cls()
+        rows = table._rows
+        for uid, user in users.items():
+            rows[uid] = UserRecord.from_dicts(user if isinstance(user, dict) else None, eggs.get(uid))
+        for uid, egg in eggs.items():
+            if uid not in rows:
+                rows[uid] = UserRecord.from_dicts(None, egg)
+        return table
+
+    def signed_on(self, day: int) -> list[str]:
+        """last_sign 为 day 的用户"""
+        return [uid for uid, u in self._rows.items() if u.last_sign == day]
+
+    def export_one(self, user_id: str) -> tuple[dict | None, dict | None]:
+        """单个用户按存档格式导出 (user, egg)，用户不存在时为 (None, None)；只读，不触发快照冻结"""
+        rec = self._rows.get(user_id)
+        if rec is None:
+            return None, None
+        return rec.user_dict(), rec.egg_dict()
+
+    def export(self, user_ids=None) -> tuple[dict, dict]:
+        """
+        导出为存档结构 (users, eggs)。
+        user_ids 为 None 时导出全部；否则只导出列出的用户（已删除的用户不出现在结果里）。
+        """
+        users: dict[str, dict] = {}
+        eggs: dict[str, dict] = {}
+        if user_ids is None:
+            pairs = self._rows.items()
+        else:
+            pairs = ((uid, self._rows[uid]) for uid in user_ids if uid in self._rows)
+        for uid, rec in pairs:
+            users[uid] = rec.user_dict()
+            egg = rec.egg_dict()
+            if egg is not None:
+                eggs[uid] = egg
+        return users, eggs
+
+
+class LazyUserTable(UserTable):
+    """
+    按需加载的 user_id → UserRecord。source 是存储后端（fetch_user / signed_on / iter_users，见 storage.SqliteBackend）。
+    - get 未命中时同步按主键读一行（微秒级）；指令入口可以先 await prefetch 把这次读放到 IO 线程里
+    - len() 是启动时的用户数加上之后新建、减去删除的，不数数据库
+    - 快照 / export_one 只覆盖内存里的记录：sqlite 后端只写被修改的行，被修改的记录一定还在内存里
+    - pinned(uid) 为真的记录不淘汰（由分片提供：有未落盘的修改、正在写盘或正在执行指令）
+    """
+
+    lazy = True
+
+    def __init__(self, source, count: int = 0, capacity: int = 100_000):
+        super().__init__()
+        self._rows: OrderedDict[str, UserRecord] = OrderedDict()
+        self._source = source
+        self._count = count
+        self.capacity = max(1, int(capacity))
+        self._gone: set[str] = set()   # 已删除、数据库里可能还有旧行的用户
+        self.pinned = lambda user_id: False
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, user_id: str) -> bool:
+        return self._lookup(user_id) is not None
+
+    @property
+    def resident(self) -> int:
+        return len(self._rows)
+
+    def cached(self) -> list[str]:
+        """当前在内存里的用户"""
+        return list(self._rows)
+
+    def _lookup(self, user_id: str) -> UserRecord | None:
+        rec = self._rows.get(user_id)
+        if rec is not None:
+            self._rows.move_to_end(user_id)
+            self.hits += 1
+            return rec
+        if user_id in self._gone:
+            return None
+        return self.admit(user_id, self.fetch(user_id))
+
+    # ---- 预取：fetch 可在 IO 线程里调用，admit 回到事件循环上放进表 ----
+    def needs_fetch(self, user_id: str) -> bool:
+        return user_id not in self._rows and user_id not in self._gone
+
+    def fetch(self, user_id: str) -> tuple[dict | None, dict | None]:
+        return self._source.fetch_user(user_id)
+
+    def admit(self, user_id: str, dicts: tuple[dict | None, dict | None]) -> UserRecord | None:
+        rec = self._rows.get(user_id)
+        if rec is not None or user_id in self._gone:
+            return rec  # 预取期间已经有人读进来（或删掉）了
+        self.misses += 1
+        user, egg = dicts
+        if user is None and egg is None:
+            return None
+        rec = self._rows[user_id] = UserRecord.from_dicts(user, egg)
+        self._evict()
+        return rec
+
+    def _evict(self) -> None:
+        rows = self._rows
+        budget = 2 * (len(rows) - self.capacity) + 8  # 都被钉住时不要一直转圈
+        while len(rows) > self.capacity and budget > 0:
+            budget -= 1
+            uid = next(iter(rows))
+            if self.pinned(uid):
+                rows.move_to_end(uid)
+            else:
+                del rows[uid]
+
+    # ---- 与 UserTable 相同的入口 ----
+    def get(self, user_id: str) -> UserRecord | None:
+        if self._snap is not None:
+            self._snap.freeze(user_id)
+        return self._lookup(user_id)
+
+    def get_or_create(self, user_id: str) -> UserRecord:
+        if self._snap is not None:
+            self._snap.freeze(user_id)
+        rec = self._lookup(user_id)
+        if rec is None:
+            rec = self._rows[user_id] = UserRecord()
+            self._gone.discard(user_id)
+            self._count += 1
+            self._evict()
+        return rec
+
+    def put(self, user_id: str, rec: UserRecord) -> None:
+        if self._snap is not None:
+            self._snap.freeze(user_id)
+        if self._lookup(user_id) is None:
+            self._gone.discard(user_id)
+            self._count += 1
+        self._rows[user_id] = rec
+        self._rows.move_to_end(user_id)
+        self._evict()
+
+    def pop(self, user_id: str) -> UserRecord | None:
+        if self._snap is not None:
+            self._snap.freeze(user_id)
+        rec = self._lookup(user_id)
+        if rec is not None:
+            del self._rows[user_id]
+            self._gone.add(user_id)
+            self._count -= 1
+        return rec
+
+    def preload(self, users: dict, eggs: dict, deleted: set, known: set) -> None:
+        """启动时放入从 journal 恢复的记录（覆盖数据库里的旧行）；known 为其中数据库里已有的用户"""
+        for uid in {*users, *eggs}:
+            self._rows[uid] = UserRecord.from_dicts(users.get(uid), eggs.get(uid))
+            self._count += uid not in known
+        for uid in deleted:
+            self._gone.add(uid)
+            self._count -= uid in known
+
+    def items(self):
+        """内存里的记录，再加上数据库里其余的（临时建记录、不放进表）：只用于少见的全量操作"""
+        cached = list(self._rows.items())
+        yield from cached
+        seen = {uid for uid, _ in cached}
+        for uid, user, egg in self._source.iter_users():
+            if uid not in seen and uid not in self._gone:
+                yield uid, UserRecord.from_dicts(user, egg)
+
+    def export(self, user_ids=None) -> tuple[dict, dict]:
+        if user_ids is None:
+            user_ids = [uid for uid, _ in self.items()]
+        users: dict[str, dict] = {}
+        eggs: dict[str, dict] = {}
+        for uid in user_ids:
+            rec = self._lookup(uid)
+            if rec is not None:
+                users[uid] = rec.user_dict()
+                egg = rec.egg_dict()
+                if egg is not None:
+                    eggs[uid] = egg
+        return users, eggs
+
+    def export_one(self, user_id: str) -> tuple[dict | None, dict | None]:
+        if user_id not in self._rows and user_id not in self._gone:
+            return self.fetch(user_id)  # 不在内存里 = 没有未落盘的修改，数据库里的就是最新值
+        return super().export_one(user_id)
+
+    def signed_on(self, day: int) -> list[str]:
+        cached = [uid for uid, u in self._rows.items() if u.last_sign == day]
+        stored = [uid for uid in self._source.signed_on(day_iso(day))
+                  if uid not in self._rows and uid not in self._gone]
+        return cached + stored
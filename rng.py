@@ -0,0 +1,102 @@
+"""
+随机数服务
+
+- 所有随机结果都从这里取：每位用户一条独立的随机流，另有一条共享流（群消息掉落门槛、问候语等与用户无关的抽取）
+- 每条流由 (主种子, 流名, 块号) 派生出 128 位种子，按块预先生成一批 [0, 1) 均匀数，用完再生成下一块；
+  装了 NumPy 时用 PCG64 批量生成，否则用标准库 random.Random（同一主种子下两种实现的序列不同）
+- 配置 rng_seed 固定主种子后，同样的事件序列得到同样的结果（按用户分流，与不同用户之间的先后交错无关）；
+  不配置时每次启动随机取种子，并写进日志，需要时可以用它复现
+- 用户流最多常驻 max_streams 条（LRU）；被淘汰的流只记下一块的块号，再用到时从新块继续，不会重复旧的随机数
+"""
+import hashlib
+import random as _random
+import secrets
+from collections import OrderedDict
+from typing import Sequence, TypeVar
+
+try:
+    import numpy as _np
+except ImportError:  # 没有 NumPy 时逐个生成
+    _np = None
+
+T = TypeVar("T")
+
+BACKEND = "numpy" if _np is not None else "python"
+SHARED = ""  # 共享流的流名
+
+
+def derive_seed(seed: int, key: str, block: int) -> int:
+    digest = hashlib.blake2b(f"{seed}:{key}:{block}".encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest, "little")
+
+
+def uniforms(seed: int, n: int) -> list[float]:
+    """由 128 位种子生成 n 个 [0, 1) 均匀数"""
+    if _np is not None:
+        return _np.random.Generator(_np.random.PCG64(seed)).random(n).tolist()
+    r = _random.Random(seed).random
+    return [r() for _ in range(n)]
+
+
+class Stream:
+    """
+    一条可复现的随机流，提供插件用到的 random / randint / randrange / choice（与标准库同名同义）。
+    整数由一个均匀数乘区间长度取整得到，区间很小（远小于 2^53）时偏差可以忽略。
+    """
+
+    __slots__ = ("seed", "key", "block", "batch", "_buf", "_pos")
+
+    def __init__(self, seed: int, key: str, block: int = 0, batch: int = 64):
+        self.seed = seed
+        self.key = key
+        self.block = block  # 下一块的块号
+        self.batch = batch
+        self._buf: list[float] = []
+        self._pos = 0
+
+    def _refill(self) -> None:
+        self._buf = uniforms(derive_seed(self.seed, self.key, self.block), self.batch)
+        self._pos = 0
+        self.block += 1
+
+    def random(self) -> float:
+        if self._pos >= len(self._buf):
+            self._refill()
+        u = self._buf[self._pos]
+        self._pos += 1
+        return u
+
+    def randrange(self, n: int) -> int:
+        return int(self.random() * n)
+
+    def randint(self, a: int, b: int) -> int:
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, seq: Sequence[T]) -> T:
+        return seq[int(self.random() * len(seq))]
+
+
+class RngService:
+    def __init__(self, seed: int | None = None, batch: int = 64, shared_batch: int = 4096, max_streams: int = 4096):
+        self.seed = int(seed) if seed is not None else secrets.randbits(64)
+        self.batch = batch
+        self.max_streams = max_streams
+        self.shared = Stream(self.seed, SHARED, batch=shared_batch)
+        self._streams: OrderedDict[str, Stream] = OrderedDict()
+        self._next_block: dict[str, int] = {}  # 被淘汰的流：下次从哪一块开始
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def for_user(self, user_id: str) -> Stream:
+        stream = self._streams.get(user_id)
+        if stream is not None:
+            self._streams.move_to_end(user_id)
+            return stream
+        stream = Stream(self.seed, f"u:{user_id}", self._next_block.pop(user_id, 0), self.batch)
+        self._streams[user_id] = stream
+        if len(self._streams) > self.max_streams:
+            old_id, old = self._streams.popitem(last=False)
+            # 当前块剩下的随机数直接丢弃，下次从新块开始
+            self._next_block[old_id] = old.block
+        return stream
@@ -0,0 +1,542 @@
+"""
+按群分片的状态（多租户）
+
+- 一个分片 = 一份独立的存档：用户记录、今日签到顺序、别名表、排行榜、流水账本、存储后端与后台落盘任务
+- 默认分片（key=None）就是原来的 data/ 目录；不开启分群时所有消息都落在这里，行为与旧版完全一致
+- 开启分群（shard_by_group）后，每个群再有一个分片，目录为 data/groups/<群号>/，只放本群的今日签到顺序：
+  - 用户记录（余额、彩蛋、成就、签到历史）、账本、别名表与排行榜始终只在默认分片——钱包全服一份，
+    群排行榜就是默认分片排行榜里该群的那一段（用户出现过的群记在 UserRecord.groups）
+  - 群分片第一次有人在该群签到或查签到榜时才加载；空闲超过 shard_idle_ttl 秒先落盘再从内存移除
+  - 每个群分片单独落盘，写的只是本群的签到顺序表，与其他群无关
+- 读存档、重放账本、序列化与写盘都在 IO 线程里做（storage.run_io）；事件循环上只做写时复制快照与收尾
+- 落盘安全（见 durability.py / journal.py）：两次落盘之间的修改先记进 journal（组提交 fsync），
+  启动时在存档之上重放；存档及其备份都读不了时分片不再写存档，避免用空数据覆盖
+- 按需加载（sqlite 后端，lazy_load）：启动只读顶层状态、用户数与 journal，用户记录第一次用到时再取，
+  内存里只留最近用过的 user_cache_size 位；排行榜在后台逐行建，榜单指令等它建完（boards_ready）
+"""
+import asyncio
+import re
+import time
+from pathlib import Path
+
+from astrbot.api import logger
+
+from .storage import WriteBehind, open_backend, run_io
+from .durability import daily_backup_path, write_daily_backup
+from .journal import Journal
+from .ledger import Ledger
+from .records import LazyUserTable, UserTable, UserRecord, day_iso
+from .leaderboard import Leaderboards
+from .clock import DayClock
+from .metrics import Metrics
+
+_STATE_FILES = ("xiaosui_state.json", "xiaosui_state.db")
+
+
+def _copy_json(value):
+    """顶层状态（签到顺序表、别名表等）的深复制；只含 dict / list / 标量"""
+    if isinstance(value, dict):
+        return {k: _copy_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_json(v) for v in value]
+    return value
+
+
+def shard_dirname(key: str) -> str:
+    """群号 → 目录名（群号一般是纯数字；其它字符替换掉）"""
+    return re.sub(r"[^0-9A-Za-z_.-]", "_", key) or "_"
+
+
+class Shard:
+    def __init__(self, key: str | None, data_dir: Path, config: dict, clock: DayClock, metrics: Metrics,
+                 busy=None):
+        self.key = key
+        self.data_dir = data_dir
+        self.clock = clock
+        self.metrics = metrics
+        self._kind = config.get("storage_backend", "json")
+        self._keep = int(config.get("backup_keep", 3))
+        self._backup_days = max(1, int(config.get("backup_days", 7)))
+        # 按需加载：json 是整份文件，没有按用户取的办法，只对 sqlite 生效
+        self._lazy = self._kind == "sqlite" and bool(config.get("lazy_load", True))
+        self._cache_size = int(config.get("user_cache_size", 100000))
+        # busy(user_id)：该用户正在执行指令（持有用户锁），其记录不能淘汰
+        self._busy = busy or (lambda user_id: False)
+        self._boards_task: asyncio.Task | None = None
+        self.backend = None
+        # 好感度/玻璃珠流水账本：<分片目录>/ledger.jsonl（只追加）+ 定期快照
+        self.ledger = Ledger(data_dir, snapshot_every=config.get("ledger_snapshot_every", 10000))
+        # 用户记录见 records.py；state 只放其它顶层键（签到顺序表、别名表等）
+        self.users = UserTable()
+        self.state: dict = {}
+        # 好感/玻璃珠/彩蛋排行榜，余额变化时增量更新
+        self.boards = Leaderboards()
+        # 延迟合并写入：指令只标脏，后台按间隔/脏计数阈值统一落盘
+        self.persist = WriteBehind(
+            self._flush,
+            interval=config.get("save_interval", 5),
+            threshold=config.get("save_dirty_threshold", 50),
+        )
+        # 预写日志：两次落盘之间的修改，崩溃重启时重放。存档损坏时 json 退回 .1..keep 历史版本，
+        # 留最近 keep 轮的段；sqlite 只能退回每日备份，留备份以来的全部段
+        self.journal = None
+        if config.get("journal_enabled", True):
+            self.journal = Journal(data_dir, self._export_user, self._export_state,
+                                   interval=config.get("journal_fsync_interval", 0.5),
+                                   retain=self._keep if self._kind == "json" else 0,
+                                   since_backup=self._kind == "sqlite")
+            self.ledger.journal = self.journal
+        # 待做的每日备份（日期），下一次落盘成功后写
+        self._backup_day: str | None = None
+        # 今天已检查过昵称兜底合并的真实 ID（每日翻页时清空，常驻内存的只有当天活跃的用户）
+        self.alias_checked: set[str] = set()
+        self.last_used = time.monotonic()
+
+    def state_bytes(self) -> int:
+        """存档文件当前大小（sqlite 含 -wal）"""
+        total = 0
+        for name in _STATE_FILES + ("xiaosui_state.db-wal",):
+            try:
+                total += (self.data_dir / name).stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def _export_user(self, user_id: str) -> tuple:
+        return self.users.export_one(user_id)
+
+    def _export_state(self, key: str):
+        return _copy_json(self.state.get(key))
+
+    def _read(self) -> tuple:
+        """
+        阻塞部分：打开后端、读存档、重放 journal、建用户表与排行榜、重放账本尾部
+        （在 IO 线程里执行，此时分片尚未对外可见）
+        """
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        backend = open_backend(self._kind, self.data_dir, self._keep)
+        # 按需加载时不读用户表：users_raw / eggs_raw 只装 journal 里恢复出来的记录
+        state = backend.load_meta() if self._lazy else backend.load()
+        users_raw, eggs_raw = state.pop("users", {}), state.pop("eggs", {})
+        saved_seq = state.pop("journal_seq", 0)
+        entries = self.journal.read() if self.journal is not None else []
+        recovered: dict[str, None] = {}
+        deleted: set[str] = set()
+        for e in entries:
+            if e[1] == "l" or e[0] <= saved_seq:
+                continue
+            if e[1] == "u":
+                uid, user, egg = e[2], e[3], e[4]
+                for table, value in ((users_raw, user), (eggs_raw, egg)):
+                    if value is None:
+                        table.pop(uid, None)
+                    else:
+                        table[uid] = value
+                if user is None and egg is None:
+                    deleted.add(uid)
+                else:
+                    deleted.discard(uid)
+                recovered[uid] = None
+            elif e[1] == "s":
+                state[e[2]] = e[3]
+        if self._lazy:
+            users = LazyUserTable(backend, backend.count_users(), self._cache_size)
+            users.pinned = self._pinned
+            known = {uid for uid in recovered if backend.fetch_user(uid) != (None, None)}
+            users.preload(users_raw, eggs_raw, deleted, known)
+            boards = None  # 见 _install：后台建榜
+        else:
+            users = UserTable.load(users_raw, eggs_raw)
+            boards = Leaderboards.build(users)
+        replayed = self.ledger.load()
+        relogged = sum(self.ledger.replay([*e[2:7], e[0]]) for e in entries if e[1] == "l")
+        if self.journal is not None:
+            self.journal.seq = max(saved_seq, self.ledger.seq, entries[-1][0] if entries else 0)
+        if not daily_backup_path(self.data_dir, backend.path.name, self.clock.today_iso).exists():
+            self._backup_day = self.clock.today_iso
+        return backend, users, boards, state, replayed, list(recovered), relogged
+
+    def _install(self, loaded: tuple | None) -> None:
+        if loaded is not None:
+            self.backend, self.users, boards, self.state, replayed, recovered, relogged = loaded
+            if boards is not None:
+                self.boards = boards
+            elif len(self.users):
+                self.boards.touched = set(self.users.cached())
+                self._boards_task = asyncio.create_task(self._build_boards())
+            if "signin" not in self.state:
+                self.rebuild_signin_index()
+            elif recovered:
+                self._recover_signin(recovered)
+            if replayed:
+                logger.info(f"小碎账本{self._label}：重放快照后的 {replayed} 条流水")
+            if recovered or relogged:
+                logger.warning(f"小碎{self._label}：从 journal 恢复了 {len(recovered)} 位用户的修改、{relogged} 条流水")
+                for uid in recovered:
+                    self.persist.mark_dirty(uid)
+                self.persist.request()
+            if self._backup_day is not None:
+                self.persist.request()  # 今天还没有备份：启动后落一次盘顺带补上
+            logger.info(f"小碎数据已加载{self._label}（{self.backend.name}，{len(self.users)} 位用户）")
+        elif self.journal is not None:
+            # 存档读不了：不写存档，journal 也停用，留着现有的段给人工恢复
+            self.journal = self.ledger.journal = None
+        self.persist.start()
+        if self.journal is not None:
+            self.journal.start()
+
+    def _recover_signin(self, recovered: list[str]) -> None:
+        """journal 只记用户记录、不记签到顺序表：今天签过到却不在表里的，按 journal 中的先后补到表尾"""
+        idx = self.state["signin"]
+        if idx.get("day") != self.clock.today_iso:
+            return
+        order = idx.setdefault("order", [])
+        seen = set(order)
+        for uid in recovered:
+            rec = self.users.get(uid)
+            if rec is not None and rec.last_sign == self.clock.today and uid not in seen:
+                order.append(uid)
+
+    async def _build_boards(self) -> None:
+        """按需加载的分片：在 IO 线程里逐行扫一遍数据库建榜，再按建榜期间动过的用户的当前记录对一遍"""
+        t0 = time.perf_counter()
+        try:
+            built, groups_of = await run_io(lambda: Leaderboards.build_from(self.backend.scan_scores()))
+        except Exception as e:
+            logger.error(f"建排行榜失败{self._label}：{e}")
+            self.boards.touched = None  # 留着建榜期间的增量榜，至少新的修改还在
+            return
+        touched, self.boards.touched = self.boards.touched, None
+        for uid in touched:
+            built.forget(uid, groups_of.get(uid))
+            rec = self.users.get(uid)
+            if rec is not None:
+                built.update(uid, rec)
+        self.boards = built
+        logger.info(f"小碎排行榜已建好{self._label}（{built.size('favor')} 位用户，"
+                    f"{time.perf_counter() - t0:.2f} s）")
+
+    async def boards_ready(self) -> None:
+        """排行榜可用（按需加载的分片启动后在后台建榜，建完之前榜单指令在这里等）"""
+        task = self._boards_task
+        if task is not None and not task.done():
+            await asyncio.shield(task)
+
+    def _pinned(self, user_id: str) -> bool:
+        """按需加载的用户表问：这条记录能不能淘汰（有没写完的修改或正在执行指令时不能）"""
+        return self.persist.is_dirty(user_id) or self._busy(user_id)
+
+    async def prefetch(self, user_id: str) -> None:
+        """按需加载时在 IO 线程里把该用户的记录读进内存，之后指令里的 get 直接命中"""
+        users = self.users
+        if users.lazy and users.needs_fetch(user_id):
+            users.admit(user_id, await run_io(users.fetch, user_id))
+
+    async def open(self) -> None:
+        """读存档 + 重放账本尾部（在 IO 线程里），并启动后台落盘任务"""
+        try:
+            loaded = await run_io(self._read)
+        except Exception as e:
+            logger.error(f"加载数据失败{self._label}：{e}")
+            loaded = None
+        self._install(loaded)
+
+    async def close(self) -> None:
+        # 停止后台落盘任务，并保证最后一次刷盘；之后 journal 里的条目都已被存档覆盖
+        if self._boards_task is not None:
+            self._boards_task.cancel()
+            await asyncio.gather(self._boards_task, return_exceptions=True)
+            self._boards_task = None
+        await self.persist.close()
+        if self.journal is not None:
+            await self.journal.close()
+        if self.backend is not None:
+            backend, self.backend = self.backend, None
+            await run_io(backend.close)
+
+    @property
+    def _label(self) -> str:
+        return f"[群 {self.key}]" if self.key else ""
+
+    def save(self, user_id: str | None = None) -> None:
+        """标记状态已修改（传 user_id 时只标记该用户）；真正的写盘由后台任务合并完成，期间的修改记在 journal 里"""
+        self.persist.mark_dirty(user_id)
+        if self.journal is not None:
+            if user_id is not None:
+                self.journal.touch(user_id)
+            else:
+                for key in self.state:
+                    self.journal.touch_state(key)
+
+    async def _flush(self, keys: set) -> None:
+        """
+        先追加账本流水，再把本轮合并的修改交给存储后端（json 整份原子重写 / sqlite 只写被修改的用户行），
+        需要时再写账本快照。事件循环上只取快照，编码与写盘在 IO 线程里，期间指令照常修改内存状态。
+        """
+        m = self.metrics
+        if not m.enabled:
+            await self._write(keys)
+            return
+        t0 = time.perf_counter()
+        try:
+            written = await self._write(keys)
+        except Exception:
+            m.saves.inc((self._kind, "error"))  # 异常照常抛给 WriteBehind：记日志、保留脏标记等下一轮
+            raise
+        m.saves.inc((self._kind, "ok"))
+        m.save_seconds.observe((self._kind,), time.perf_counter() - t0)
+        m.save_bytes.inc((self._kind,), written)
+
+    async def _write(self, keys: set) -> int:
+        journal = self.journal
+        # 切段：此前的 journal 条目由这一轮的存档覆盖（存档里记下覆盖到的序号），写成功后才删
+        seq = journal.cut() if journal is not None else None
+        append = self.ledger.drain()
+        backend = self.backend
+        snap = state = None
+        if backend is not None and keys:
+            # 用户记录按存档格式导出：整份写的后端导出全部，按行写的后端只导出被修改的用户
+            full = None in keys or not backend.incremental
+            snap = self.users.begin_snapshot(None if full else keys)
+            state = _copy_json(self.state)
+            if seq is not None:
+                state["journal_seq"] = seq
+
+        def job() -> int:
+            written = append() if append is not None else 0
+            if snap is not None:
+                users, eggs_state = snap.export()
+                written += backend.save({"users": users, "eggs": eggs_state, **state}, keys)
+            return written
+
+        try:
+            written = await run_io(job)
+        except Exception:
+            self.ledger.abort()
+            raise
+        finally:
+            if snap is not None:
+                self.users.end_snapshot()
+        self.ledger.commit()
+        if snap is not None and journal is not None:
+            await journal.release()
+        if self.ledger.snapshot_due:
+            try:
+                await run_io(self.ledger.snapshot_job())
+            except Exception:
+                self.ledger.request_snapshot()
+                raise
+        if self._backup_day is not None and backend is not None and len(self.users) and backend.path.exists():
+            await self._daily_backup(backend)
+        return written
+
+    def request_backup(self, day: str) -> None:
+        """下一次落盘成功后写一份当天的备份（每日任务用）"""
+        self._backup_day = day
+        self.persist.request()
+
+    async def _daily_backup(self, backend) -> None:
+        day = self._backup_day
+        try:
+            dest = await run_io(write_daily_backup, backend.backup, self.data_dir, backend.path.name, day,
+                                self._backup_days)
+        except Exception as e:
+            logger.error(f"写每日备份失败{self._label}：{e}")  # 不影响本轮落盘，下一轮再试
+            return
+        if self._backup_day == day:
+            self._backup_day = None
+        if self.journal is not None:
+            self.journal.backup_done()
+        logger.info(f"小碎{self._label}：已写备份 {dest.name}")
+
+    def credit(self, user_id: str, user: UserRecord, source: str, favor: int = 0, marbles: int = 0) -> None:
+        """唯一的余额变动入口：记一笔流水，再改 user 里的好感度/玻璃珠，并更新排行榜（彩蛋数也一并刷新）"""
+        self.ledger.record(user_id, user, source, favor, marbles)
+        user.favor += favor
+        user.marbles += marbles
+        self.boards.update(user_id, user)
+
+    def note_member(self, user_id: str, group: str | None, name: str | None) -> None:
+        """记下用户出现过的群（加入该群排行榜）与当前昵称（榜单展示用）"""
+        user = self.users.get_or_create(user_id)
+        changed = False
+        if group is not None and user.add_group(group):
+            self.boards.join(user_id, group, user)
+            changed = True
+        if name and user.name != name:
+            user.name = name
+            changed = True
+        if changed:
+            self.save(user_id)
+
+    def rebuild_signin_index(self) -> None:
+        """旧存档没有签到顺序表时，启动时按 last_sign 重建一次（顺序无法还原，仅保证人数正确）"""
+        order = self.users.signed_on(self.clock.today)
+        self.state["signin"] = {"day": self.clock.today_iso, "order": order}
+
+    def signin_order(self, today: str) -> list[str]:
+        """今日签到顺序表（user_id 列表，名次 = 下标 + 1）；跨日时由每日任务清零，这里只兜底"""
+        idx = self.state.get("signin")
+        if not idx or idx.get("day") != today:
+            idx = self.state["signin"] = {"day": today, "order": []}
+        return idx["order"]
+
+    def merge_alias(self, alias: str, user_id: str) -> None:
+        """把 name::昵称 兜底记录并入真实 ID：余额相加、彩蛋/成就取并集、日期取较晚者，并记下别名"""
+        src = self.users.pop(alias)
+        if src is not None:
+            self.boards.discard(alias, src)
+            dst = self.users.get_or_create(user_id)
+            self.ledger.record(alias, src, "合并到真实账号", -src.favor, -src.marbles)
+            self.credit(user_id, dst, "合并昵称账号", src.favor, src.marbles)
+            known = set(dst.groups or ())
+            dst.absorb(src)
+            for group in dst.groups or ():
+                if group not in known:
+                    self.boards.join(user_id, group, dst)
+            self.boards.update(user_id, dst)
+
+        # 今日签到顺序表只追加，不改写；展示时按别名表换成真实 ID
+        self.state.setdefault("aliases", {})[alias] = user_id
+        logger.info(f"小碎{self._label}：已将 {alias} 的记录合并到 {user_id}")
+        self.save(alias)
+        self.save(user_id)
+        if self.journal is not None:
+            self.journal.touch_state("aliases")
+
+
+class ShardManager:
+    """
+    分片表：key=None 为默认分片（常驻），其余为群分片（懒加载，空闲淘汰）。
+    sharded=False 时所有 key 都映射到默认分片。
+    """
+
+    def __init__(self, root: Path, config: dict, clock: DayClock, metrics: Metrics | None = None, busy=None):
+        self.root = root
+        self.config = config
+        self.clock = clock
+        self.metrics = metrics or Metrics(enabled=False)
+        self.busy = busy
+        self.sharded = bool(config.get("shard_by_group", False))
+        self.idle_ttl = max(1.0, float(config.get("shard_idle_ttl", 1800)))
+        self._shards: dict[str | None, Shard] = {}
+        self._loading: dict[str | None, asyncio.Task] = {}
+        self._task: asyncio.Task | None = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    def __iter__(self):
+        """已加载的分片"""
+        return iter(list(self._shards.values()))
+
+    @property
+    def default(self) -> Shard:
+        return self._shards[None]
+
+    def key_of(self, group: str | None) -> str | None:
+        return group if self.sharded and group else None
+
+    def get(self, key: str | None) -> Shard:
+        """
+        取已加载的分片。不在这里同步加载（读存档会卡住事件循环）：指令先 await ensure(key)，
+        没加载就调用属于编程错误，直接抛 LookupError
+        """
+        shard = self._shards.get(key)
+        if shard is None:
+            raise LookupError(f"分片 {key} 尚未加载，须先 await ensure()")
+        shard.last_used = time.monotonic()
+        return shard
+
+    async def ensure(self, key: str | None) -> Shard:
+        """取分片；没加载时在 IO 线程里加载，同一个群同时只加载一次"""
+        shard = self._shards.get(key)
+        if shard is None:
+            task = self._loading.get(key)
+            if task is None:
+                task = self._loading[key] = asyncio.create_task(self._load(key))
+                task.add_done_callback(lambda _t: self._loading.pop(key, None))
+            shard = await asyncio.shield(task)
+        shard.last_used = time.monotonic()
+        return shard
+
+    def _new_shard(self, key: str | None) -> Shard:
+        data_dir = self.root if key is None else self.root / "groups" / shard_dirname(key)
+        return Shard(key, data_dir, self.config, self.clock, self.metrics, self.busy)
+
+    async def _load(self, key: str | None) -> Shard:
+        shard = self._new_shard(key)
+        await shard.open()
+        return self._register(key, shard)
+
+    def _register(self, key: str | None, shard: Shard) -> Shard:
+        if key is not None and len(shard.users):
+            logger.warning(f"小碎[群 {key}]：群存档里有 {len(shard.users)} 位用户的记录（旧版按群分开的钱包），"
+                           f"现已不再读取，余额、彩蛋与成就以默认存档为准；文件原样保留")
+        self._shards[key] = shard
+        return shard
+
+    async def start(self) -> None:
+        """加载默认分片；分群模式下启动空闲分片清理任务"""
+        await self.ensure(None)
+        if self.sharded and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def rollover(self, day: int) -> None:
+        """
+        每日任务（由 DayClock 在重置时刻调用）：已加载的分片清空签到顺序表与昵称兜底检查记录，
+        并让后台把缓冲的修改落盘、给账本写快照——相当于每天压缩一次，之后启动只需重放当天的流水；
+        落盘成功后再写一份当天的存档备份（backups/）。
+        签到表清空不单独标脏，随下一次落盘写回；在此之前重启，读到旧日期的表也会被兜底清零。
+        """
+        today = day_iso(day)
+        for shard in list(self._shards.values()):
+            shard.signin_order(today)
+            shard.alias_checked.clear()
+            shard.ledger.request_snapshot()
+            shard.request_backup(today)
+
+    async def _run(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(min(60.0, self.idle_ttl / 2))
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"清理空闲分片失败：{e}")
+
+    async def evict_idle(self, now: float | None = None) -> int:
+        """
+        淘汰空闲的群分片，返回淘汰数量。
+        先刷盘再从表里移除；刷盘期间又被用到（又有修改或刚被取用）的分片留到下一轮：
+        移除之后同一个群再来消息，重新加载时读到的已是最新存档。
+        """
+        now = time.monotonic() if now is None else now
+        evicted = []
+        for key, shard in list(self._shards.items()):
+            if key is None or now - shard.last_used < self.idle_ttl:
+                continue
+            used = shard.last_used
+            if shard.persist.dirty and not await shard.persist.flush():
+                continue  # 刷盘失败：留在内存里，下一轮再试
+            if shard.persist.dirty or shard.last_used != used or self._shards.get(key) is not shard:
+                continue
+            del self._shards[key]
+            evicted.append(shard)
+        for shard in evicted:
+            await shard.close()
+        return len(evicted)
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # 群分片先关，默认分片最后
+        for key in sorted(self._shards, key=lambda k: k is None):
+            await self._shards[key].close()
+        self._shards.clear()
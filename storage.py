@@ -0,0 +1,529 @@
+"""
+小碎数据持久化
+
+- 原子落盘：先写同目录临时文件并 fsync，再 os.replace 覆盖并 fsync 目录，避免写一半留下残缺文件；
+  JSON 存档带校验和，覆盖前把旧文件留作 .1..N，读不了时依次退回这些备份（见 durability.py）
+- 延迟合并写入（write-behind）：指令只负责“标脏”，后台任务按时间间隔
+  或脏计数阈值把多次修改合并成一次落盘；插件停用时保证最后再刷一次
+- 读写都不占事件循环：序列化与磁盘 IO 交给 run_io() 放到 IO 线程池里跑，
+  事件循环只负责取一份写时复制的快照（见 records.UserTable.begin_snapshot）
+- 可选存储后端：
+  - json：整份 {"users": {...}, "eggs": {...}} 写入一个文件（兼容旧数据；编解码见 codec.py，输出紧凑格式）
+  - sqlite：WAL 模式，用户/彩蛋/成就分表存储，只更新被修改的用户行；
+    支持按需加载（lazy_load）：启动只读顶层状态与用户数，用户记录按主键一行一行取（见 records.LazyUserTable）
+"""
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable
+
+from astrbot.api import logger
+
+from . import codec
+from .durability import (StateCorrupt, daily_backups, fsync_dir, generation, quarantine, rotate_generations, seal,
+                         unseal, verify_backup)
+
+# 存档 / 账本的读写线程池。同一分片的写入由 WriteBehind 串行，不同分片可以并行
+_IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="xiaosui-io")
+
+
+async def run_io(fn: Callable, *args):
+    """在 IO 线程池里执行阻塞的读写 / 序列化，不占事件循环"""
+    return await asyncio.get_running_loop().run_in_executor(_IO_POOL, fn, *args)
+
+
+def atomic_write_bytes(path: Path, data: bytes, keep: int = 0) -> None:
+    """
+    临时文件 + rename 的原子写入（同一文件系统内 os.replace 是原子的），rename 后 fsync 目录。
+    keep > 0 时，替换前把旧文件留作 path.1..keep（见 durability.rotate_generations）。
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    rotate_generations(path, keep)
+    os.replace(tmp, path)
+    fsync_dir(path.parent)
+
+
+class WriteBehind:
+    """
+    把频繁的状态修改合并成少量落盘。
+    - mark_dirty(key)：仅记录被修改的 key（通常是 user_id），不做任何 IO；
+      key 为 None 表示“整份状态都要写”
+    - 后台任务每 interval 秒检查一次；脏计数达到 threshold 时立即唤醒刷盘
+    - request()：没有修改也唤醒一次刷盘（如每日任务要求写账本快照）
+    - flush_fn 是协程函数，收到本轮合并后的 key 集合（可能为空）；同一时刻最多一轮在执行
+    - close()：停止后台任务并做最后一次刷盘
+    - is_dirty(key)：key 还有没写完的修改（含正在写的这一轮），按需加载的用户表据此决定能否淘汰
+    """
+
+    def __init__(self, flush_fn: Callable[[set], Awaitable[None]], interval: float = 5.0, threshold: int = 50):
+        self._flush_fn = flush_fn
+        self.interval = max(0.1, float(interval))
+        self.threshold = max(1, int(threshold))
+        self._dirty = 0
+        self._keys: set = set()
+        self._writing: set = set()
+        self._requested = False
+        self._lock = asyncio.Lock()
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._closed = False
+
+    @property
+    def dirty(self) -> int:
+        return self._dirty
+
+    def is_dirty(self, key) -> bool:
+        return key in self._keys or key in self._writing or None in self._keys or None in self._writing
+
+    def mark_dirty(self, key=None) -> None:
+        self._dirty += 1
+        self._keys.add(key)
+        if self._wake is not None and self._dirty >= self.threshold:
+            self._wake.set()
+
+    def request(self) -> None:
+        self._requested = True
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._dirty or self._requested:
+                await self.flush()
+
+    async def flush(self) -> bool:
+        """立即落盘；失败时把脏计数还回去，等下一轮重试。执行期间新的修改留给下一轮"""
+        async with self._lock:
+            self._requested = False
+            pending, self._dirty = self._dirty, 0
+            keys, self._keys = self._keys, set()
+            self._writing = keys
+            try:
+                await self._flush_fn(keys)
+                return True
+            except Exception as e:
+                self._dirty += pending
+                self._keys |= keys
+                logger.error(f"保存数据失败：{e}")
+                return False
+            finally:
+                self._writing = set()
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._task is not None:
+            self._wake.set()
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"落盘任务异常退出：{e}")
+            self._task = None
+        if self._dirty or self._requested:
+            await self.flush()
+
+
+# ==== 存储后端 ==========================================================
+# 存档结构始终是 {"users": {uid: {...}}, "eggs": {uid: {...}}, 其它顶层键...}
+# 后端只负责 load() 读出这份结构，以及 save(state, keys) 把被修改的部分写回（返回写入的字节数，供指标统计）。
+# load / save / close 都是阻塞调用，只在 IO 线程里执行（同一后端同一时刻只有一个线程在用）。
+# 插件内存里用的是 records.UserTable，落盘时再导出成这份结构：
+#   incremental = False 的后端每次拿到全部用户；True 的后端只拿到 keys 中列出的用户
+# ======================================================================
+
+# 用户记录中有独立列的字段，其余字段统一放进 extra（JSON）；last_feed_ts 已不再写入，列保留以兼容旧库
+_USER_COLUMNS = ("favor", "marbles", "last_sign", "last_divine", "last_extra_sign", "last_feed_ts")
+
+
+def _row_bytes(row: tuple) -> int:
+    """一行数据的大致字节数：文本按 UTF-8 长度，其它按 8 字节"""
+    return sum(len(v.encode("utf-8")) if isinstance(v, str) else 8 for v in row if v is not None)
+
+
+def _user_from_row(row: tuple) -> dict:
+    """users 表的一行 (user_id, 各常用列…, extra) → 存档里 users[user_id] 的结构"""
+    extra = row[-1]
+    rec = json.loads(extra) if extra else {}
+    for col, val in zip(_USER_COLUMNS, row[1:-1]):
+        if val is not None:
+            rec[col] = val
+    return rec
+
+
+class JsonBackend:
+    """
+    单文件 JSON：与旧版 data/xiaosui_state.json 兼容（读旧版带缩进、不带校验和的文件，写紧凑格式），每次整份重写。
+    写入时带 sha256 校验段，并把上一版留作 .1..keep；读取时依次尝试 当前文件 → .1..keep → 每日备份，
+    用第一份通过校验的，损坏的当前文件改名挪开（.corrupt-时间）留给人工检查。
+    """
+
+    name = "json"
+    incremental = False
+
+    def __init__(self, path: Path, keep: int = 3):
+        self.path = path
+        self.keep = max(0, int(keep))
+        self.restored_from: Path | None = None
+
+    def candidates(self) -> list[Path]:
+        gens = [generation(self.path, i) for i in range(1, self.keep + 1)]
+        return [p for p in [self.path, *gens] if p.exists()] + daily_backups(self.path.parent, self.path.name)
+
+    def load(self) -> dict:
+        tried = self.candidates()
+        if not tried:
+            return {"users": {}}
+        broken = False
+        for path in tried:
+            try:
+                if path.parent != self.path.parent and not verify_backup(path):
+                    raise StateCorrupt("备份校验和不一致")
+                state = codec.loads(unseal(path.read_bytes()))
+                if not isinstance(state, dict):
+                    raise StateCorrupt("内容不是 JSON 对象")
+            except Exception as e:
+                logger.error(f"读取 {path.name} 失败：{e}")
+                broken |= path == self.path
+                continue
+            if path != self.path:
+                self.restored_from = path
+                logger.warning(f"{self.path.name} 损坏或缺失，已从 {path.name} 恢复")
+            if broken:
+                logger.warning(f"损坏的存档已改名为 {quarantine(self.path).name}")
+            return state
+        raise StateCorrupt(f"{self.path.name} 及其全部备份都无法读取，为避免覆盖已停止写入该存档")
+
+    def save(self, state: dict, keys: Iterable) -> int:
+        data = seal(codec.dumps(state))
+        atomic_write_bytes(self.path, data, keep=self.keep)
+        return len(data)
+
+    def backup(self, dest: Path) -> None:
+        shutil.copyfile(self.path, dest)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteBackend:
+    """
+    SQLite（WAL）：
+    - users：一行一个用户，常用字段独立成列
+    - egg_collected / achievements：(user_id, id) 主键，彩蛋与成就只追加不删除
+    - daily_sign：当日签到顺序 (day, rank) → user_id，只追加，跨日清理旧日期
+    - meta：其它顶层键（JSON 文本）
+    save() 只写 keys 中列出的用户；彩蛋/成就条数没有增加时不写。
+    按需加载用的读取（fetch_user / scan_scores / signed_on / iter_users）走另一条只读连接，
+    事件循环与 IO 线程都可能调用，用锁串行；WAL 下读连接看到的是已提交的数据，不受正在进行的写入影响。
+    返回的字节数是写入行的数据量（文本按 UTF-8 长度、整数按 8 字节估算），不含 SQLite 自身的页与日志开销。
+    """
+
+    name = "sqlite"
+    incremental = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id TEXT PRIMARY KEY,
+        favor INTEGER NOT NULL DEFAULT 0,
+        marbles INTEGER NOT NULL DEFAULT 0,
+        last_sign TEXT,
+        last_divine TEXT,
+        last_extra_sign TEXT,
+        last_feed_ts INTEGER,
+        extra TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_users_last_sign ON users(last_sign);
+    CREATE TABLE IF NOT EXISTS egg_collected (
+        user_id TEXT NOT NULL,
+        egg_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        special INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, egg_id)
+    );
+    CREATE TABLE IF NOT EXISTS achievements (
+        user_id TEXT NOT NULL,
+        ach_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (user_id, ach_id)
+    );
+    CREATE TABLE IF NOT EXISTS daily_sign (
+        day TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        user_id TEXT NOT NULL,
+        PRIMARY KEY (day, rank)
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 落盘是批量合并的，每批一次 fsync 的代价可以接受；FULL 保证提交返回时已经落到磁盘
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(self.SCHEMA)
+        # 每个用户已落盘的 (collected, special, achievements) 条数，没有新增就跳过
+        self._persisted: dict[str, tuple[int, int, int]] = {}
+        # 已落盘的签到顺序 (day, 条数)
+        self._sign_persisted: tuple[str | None, int] = (None, 0)
+        self._reader: sqlite3.Connection | None = None
+        self._read_lock = threading.Lock()
+
+    def is_empty(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+    def load(self) -> dict:
+        users, eggs = self._load_users(self._conn)
+        for uid, u in eggs.items():
+            self._persisted[uid] = (len(u["collected"]), len(u["special_collected"]), len(u["achievements"]))
+        return {"users": users, "eggs": eggs, **self.load_meta()}
+
+    @staticmethod
+    def _load_users(conn: sqlite3.Connection) -> tuple[dict, dict]:
+        users: dict[str, dict] = {}
+        cur = conn.execute(f"SELECT user_id, {', '.join(_USER_COLUMNS)}, extra FROM users")
+        for row in cur:
+            users[row[0]] = _user_from_row(row)
+
+        eggs: dict[str, dict] = {}
+
+        def egg_state(uid: str) -> dict:
+            return eggs.setdefault(uid, {"collected": [], "achievements": [], "special_collected": []})
+
+        for uid, egg_id, special in conn.execute(
+            "SELECT user_id, egg_id, special FROM egg_collected ORDER BY user_id, seq"
+        ):
+            u = egg_state(uid)
+            u["collected"].append(egg_id)
+            if special:
+                u["special_collected"].append(egg_id)
+        for uid, ach_id in conn.execute("SELECT user_id, ach_id FROM achievements ORDER BY user_id, seq"):
+            egg_state(uid)["achievements"].append(ach_id)
+        return users, eggs
+
+    def load_meta(self) -> dict:
+        """除用户记录以外的顶层状态（今日签到顺序、meta 表）"""
+        state = {}
+        row = self._conn.execute("SELECT MAX(day) FROM daily_sign").fetchone()
+        if row and row[0]:
+            order = [r[0] for r in self._conn.execute(
+                "SELECT user_id FROM daily_sign WHERE day = ? ORDER BY rank", (row[0],)
+            )]
+            state["signin"] = {"day": row[0], "order": order}
+            self._sign_persisted = (row[0], len(order))
+        for key, value in self._conn.execute("SELECT key, value FROM meta"):
+            state[key] = json.loads(value)
+        return state
+
+    def save(self, state: dict, keys: Iterable) -> int:
+        keys = set(keys)
+        users = state.get("users", {})
+        uids = users.keys() if None in keys else [k for k in keys if isinstance(k, str)]
+        written = 0
+        with self._conn:
+            for uid in uids:
+                written += self._write_user(uid, users.get(uid), state.get("eggs", {}).get(uid))
+            if "signin" in state:
+                written += self._write_signin(state["signin"])
+            for key, value in state.items():
+                if key not in ("users", "eggs", "signin"):
+                    text = json.dumps(value, ensure_ascii=False)
+                    self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, text))
+                    written += _row_bytes((key, text))
+        return written
+
+    def _write_user(self, uid: str, rec: dict | None, egg: dict | None) -> int:
+        if rec is None and egg is None:
+            # 用户已从内存状态移除（如昵称兜底记录被合并）：删除对应行
+            for table in ("users", "egg_collected", "achievements"):
+                self._conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (uid,))
+            self._persisted.pop(uid, None)
+            return 0
+        written = 0
+        if rec is not None:
+            extra = {k: v for k, v in rec.items() if k not in _USER_COLUMNS}
+            row = (uid, *(rec.get(c) for c in _USER_COLUMNS), json.dumps(extra, ensure_ascii=False) if extra else None)
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO users(user_id, {', '.join(_USER_COLUMNS)}, extra) "
+                f"VALUES (?, {', '.join('?' * len(_USER_COLUMNS))}, ?)",
+                row,
+            )
+            written += _row_bytes(row)
+        if not egg:
+            return written
+        collected = egg.get("collected", [])
+        specials = egg.get("special_collected", [])
+        achievements = egg.get("achievements", [])
+        n_col, n_sp, n_ach = self._persisted.get(uid, (0, 0, 0))
+        # 列表只增不减，条数没变就什么都不写；变了就整组 INSERT OR IGNORE（每人至多几十条，
+        # 且导出顺序按位号而非收集先后，新增项不一定在末尾）
+        if len(collected) > n_col:
+            rows = [(uid, e, i) for i, e in enumerate(collected)]
+            self._conn.executemany("INSERT OR IGNORE INTO egg_collected(user_id, egg_id, seq) VALUES (?, ?, ?)", rows)
+            written += sum(map(_row_bytes, rows))
+        if len(specials) > n_sp:
+            rows = [(uid, e) for e in specials]
+            self._conn.executemany("UPDATE egg_collected SET special = 1 WHERE user_id = ? AND egg_id = ?", rows)
+            written += sum(map(_row_bytes, rows))
+        if len(achievements) > n_ach:
+            rows = [(uid, a, i) for i, a in enumerate(achievements)]
+            self._conn.executemany("INSERT OR IGNORE INTO achievements(user_id, ach_id, seq) VALUES (?, ?, ?)", rows)
+            written += sum(map(_row_bytes, rows))
+        self._persisted[uid] = (len(collected), len(specials), len(achievements))
+        return written
+
+    def _write_signin(self, idx: dict) -> int:
+        day, order = idx.get("day"), idx.get("order", [])
+        done_day, done = self._sign_persisted
+        if day != done_day:
+            self._conn.execute("DELETE FROM daily_sign WHERE day <> ?", (day,))
+            done = 0
+        rows = [(day, i, uid) for i, uid in enumerate(order[done:], start=done + 1)]
+        if rows:
+            self._conn.executemany("INSERT OR REPLACE INTO daily_sign(day, rank, user_id) VALUES (?, ?, ?)", rows)
+        self._sign_persisted = (day, len(order))
+        return sum(map(_row_bytes, rows))
+
+    # ---- 按需加载 ----
+    def _read(self) -> sqlite3.Connection:
+        if self._reader is None:
+            self._reader = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._reader.execute("PRAGMA query_only=1")
+        return self._reader
+
+    def count_users(self) -> int:
+        with self._read_lock:
+            return self._read().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def fetch_user(self, user_id: str) -> tuple[dict | None, dict | None]:
+        """按主键取一位用户的 (user, egg)，与 load() 里的结构相同；没有时为 (None, None)"""
+        with self._read_lock:
+            conn = self._read()
+            row = conn.execute(
+                f"SELECT user_id, {', '.join(_USER_COLUMNS)}, extra FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            eggs = conn.execute(
+                "SELECT egg_id, special FROM egg_collected WHERE user_id = ? ORDER BY seq", (user_id,)
+            ).fetchall()
+            achs = conn.execute(
+                "SELECT ach_id FROM achievements WHERE user_id = ? ORDER BY seq", (user_id,)
+            ).fetchall()
+        user = _user_from_row(row) if row else None
+        egg = None
+        if eggs or achs:
+            egg = {"collected": [e for e, _ in eggs], "achievements": [a for a, in achs],
+                   "special_collected": [e for e, sp in eggs if sp]}
+            self._persisted[user_id] = (len(eggs), len(egg["special_collected"]), len(achs))
+        return user, egg
+
+    def scan_scores(self):
+        """
+        逐行产出 (user_id, 好感, 玻璃珠, 彩蛋数, 群列表)，建排行榜用（不建完整记录）。
+        用单独的连接：整表扫描期间这条连接一直停在扫描开始时的快照上，不能让 fetch_user 也读到它
+        """
+        conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        try:
+            cur = conn.execute(
+                "SELECT u.user_id, u.favor, u.marbles, u.extra, "
+                "(SELECT COUNT(*) FROM egg_collected e WHERE e.user_id = u.user_id) FROM users u"
+            )
+            for rows in iter(lambda: cur.fetchmany(4096), []):
+                for uid, favor, marbles, extra, eggs in rows:
+                    groups = json.loads(extra).get("groups") if extra and '"groups"' in extra else None
+                    yield uid, favor or 0, marbles or 0, eggs, groups
+        finally:
+            conn.close()
+
+    def signed_on(self, day: str) -> list[str]:
+        with self._read_lock:
+            return [r[0] for r in self._read().execute("SELECT user_id FROM users WHERE last_sign = ?", (day,))]
+
+    def iter_users(self):
+        """逐个产出 (user_id, user, egg)：整表读取（只用于拆分群存档等少见的全量操作）"""
+        with self._read_lock:
+            users, eggs = self._load_users(self._read())
+        for uid, user in users.items():
+            yield uid, user, eggs.get(uid)
+
+    def backup(self, dest: Path) -> None:
+        """在线备份（sqlite3 backup API），得到一份一致的独立库文件"""
+        out = sqlite3.connect(str(dest))
+        try:
+            self._conn.backup(out)
+        finally:
+            out.close()
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+        self._conn.close()
+
+
+def migrate_json_to_sqlite(json_path: Path, backend: SqliteBackend) -> int:
+    """
+    一次性迁移：仅当 SQLite 库为空且旧 JSON 文件存在时执行。
+    旧文件原样保留作备份；返回迁移的用户数。
+    """
+    if not json_path.exists() or not backend.is_empty():
+        return 0
+    state = JsonBackend(json_path).load()
+    state.setdefault("users", {})
+    backend.save(state, {None})
+    return len(state["users"])
+
+
+def _open_sqlite(data_dir: Path) -> SqliteBackend:
+    """打开并读一次库；库文件损坏时挪开，退回最近一份通过校验的每日备份"""
+    path = data_dir / "xiaosui_state.db"
+    try:
+        backend = SqliteBackend(path)
+        backend.is_empty()
+        return backend
+    except sqlite3.DatabaseError as e:
+        logger.error(f"读取 {path.name} 失败：{e}")
+    for suffix in ("-wal", "-shm"):
+        side = path.with_name(path.name + suffix)
+        if side.exists():
+            quarantine(side)
+    logger.warning(f"损坏的存档已改名为 {quarantine(path).name}")
+    for backup in daily_backups(data_dir, path.name):
+        if not verify_backup(backup):
+            logger.error(f"备份 {backup.name} 校验和不一致，跳过")
+            continue
+        shutil.copyfile(backup, path)
+        logger.warning(f"已从 {backup.name} 恢复 {path.name}")
+        return SqliteBackend(path)
+    raise StateCorrupt(f"{path.name} 已损坏且没有可用的备份，为避免覆盖已停止写入该存档")
+
+
+def open_backend(kind: str, data_dir: Path, keep: int = 3) -> JsonBackend | SqliteBackend:
+    """按配置选择后端；sqlite 首次启用时自动从 xiaosui_state.json 迁移"""
+    json_path = data_dir / "xiaosui_state.json"
+    if kind == "sqlite":
+        backend = _open_sqlite(data_dir)
+        migrated = migrate_json_to_sqlite(json_path, backend)
+        if migrated:
+            logger.info(f"已从 {json_path.name} 迁移 {migrated} 位用户到 SQLite")
+        return backend
+    return JsonBackend(json_path, keep)
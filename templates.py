@@ -0,0 +1,88 @@
+"""
+回复模板
+
+- Template：str.format 风格的模板（{name}、{favor:+d} 之类），构建时预编译成一个 f-string 函数，
+  渲染就是一次函数调用，不再每次解析格式串；占位符只允许普通标识符（不支持位置参数、属性与下标）
+- 先选模板、再渲染：候选模板只存未格式化的 Template，选中哪条才渲染哪条
+- cache=N 时对相同参数的渲染结果做 LRU 缓存：只在参数常常完全相同的模板上开（如同一人反复发指令时的
+  “今天已经签过到啦”），参数每次都不同的模板开了只会多一次查表
+- 各指令共用的固定片段（背包余额行等）与主要指令的回复在本模块构建一次
+"""
+import keyword
+import string
+from functools import lru_cache
+from typing import Callable
+
+_PARSER = string.Formatter()
+
+
+class TemplateError(ValueError):
+    """模板格式有误（占位符不合法、花括号不配对……）"""
+
+
+def _compile(source: str) -> tuple[Callable[..., str], tuple[str, ...]]:
+    body, fields = [], []
+    try:
+        parsed = list(_PARSER.parse(source))
+    except ValueError as e:
+        raise TemplateError(f"模板格式有误：{e}：{source!r}") from None
+    for literal, field, spec, conv in parsed:
+        body.append(literal.replace("{", "{{").replace("}", "}}"))
+        if field is None:
+            continue
+        if not field.isidentifier() or keyword.iskeyword(field) or "{" in (spec or ""):
+            raise TemplateError(f"不支持的占位符 {{{field}}}：{source!r}")
+        if field not in fields:
+            fields.append(field)
+        body.append("{" + field + (f"!{conv}" if conv else "") + (f":{spec}" if spec else "") + "}")
+    code = f"lambda {''.join(f + ', ' for f in fields)}**_: f{''.join(body)!r}"
+    try:
+        # 只拼入原文字面量（repr 转义）与校验过的标识符，且不给内置函数
+        return eval(code, {"__builtins__": {}}), tuple(fields)
+    except SyntaxError as e:
+        raise TemplateError(f"模板无法编译：{e.msg}：{source!r}") from None
+
+
+class Template:
+    __slots__ = ("source", "fields", "render")
+
+    def __init__(self, source: str, cache: int = 0):
+        self.source = source
+        fn, self.fields = _compile(source)
+        # render(**values)：多余的参数忽略，缺少占位符对应的参数时抛 TypeError
+        self.render: Callable[..., str] = lru_cache(maxsize=cache)(fn) if cache else fn
+
+    def __repr__(self) -> str:
+        return f"Template({self.source!r})"
+
+
+# ==== 共用片段 ========================================================
+BAG = Template("📦 当前背包｜好感度：{favor}｜玻璃珠：{marbles}")
+BALANCE = Template("当前好感度：{favor}｜玻璃珠：{marbles}")
+
+
+def bag(user) -> str:
+    """背包余额行（user 为 records.UserRecord）"""
+    return BAG.render(favor=user.favor, marbles=user.marbles)
+
+
+# ==== 指令回复 ========================================================
+SIGN_IN_DONE = Template("{name}，今天已经签过到啦～\n" + BALANCE.source, cache=256)
+SIGN_IN_OK = Template(
+    "{greet}\n"
+    "签到成功啦～小碎好感度 +{favor_inc}，小碎赠予你 {marbles_inc} 颗玻璃珠。\n"
+    + BALANCE.source
+)
+SIGN_IN_STREAK = Template("🔥 连续签到第 {streak} 天，额外奖励 好感+{favor}、玻璃珠+{marbles}（已计入上面的余额）")
+DIVINE_DONE = Template("🔒 {name}，今天已经占卜过啦～明天再来试试吧！\n" + BAG.source, cache=256)
+DIVINE_RESULT = Template(
+    "🔮 我收取了 **{fee}** 枚玻璃珠作为占卜费用……\n"
+    "✨ 本次是 **{card}·{orient}**\n"
+    "等级：**{rating}（{rating_word}）**\n"
+    "核心：**{core}**｜其它：{keywords}\n"
+    "🔎 解析：{interp}\n"
+    "{mood}\n"
+    "💗 小碎好感度 {favor_inc:+d}，"
+    "🫧 玻璃珠 {marble_delta:+d}{bonus_text}\n"
+    + BAG.source
+)